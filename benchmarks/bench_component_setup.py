@@ -0,0 +1,96 @@
+"""
+Micro-benchmark of per-request component setup, with and without the registry.
+
+Compares building the LLM client, prompt template, document processor and
+text splitter on every request (the old behaviour) against fetching them
+from the process-wide ComponentRegistry. Runs offline: the LLM client is
+built with a dummy API key and never called.
+
+Usage:
+    python -m benchmarks.bench_component_setup [--iterations 200]
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-dummy-key")
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from src.config import get_settings
+from src.services.document_processor import DocumentProcessor
+from src.services.rag_engine import PROMPT_TEMPLATE
+from src.services.registry import ComponentRegistry
+
+EXTENSIONS = [".py", ".js", ".java", ".go", ".rs", ".md"]
+
+
+def _measure(fn, iterations: int) -> dict:
+    """Time `fn` over a number of iterations and summarize in microseconds."""
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - started) * 1_000_000)
+    samples.sort()
+    return {
+        "mean_us": round(statistics.fmean(samples), 2),
+        "p50_us": round(samples[len(samples) // 2], 2),
+        "p99_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 2),
+    }
+
+
+def run(iterations: int) -> dict:
+    """Run all setup benchmarks and return the results."""
+    settings = get_settings()
+    registry = ComponentRegistry()
+
+    def query_setup_per_request(_):
+        ChatGoogleGenerativeAI(
+            model=settings.llm_model,
+            temperature=settings.llm_temperature,
+            google_api_key=settings.google_api_key,
+        )
+        ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+
+    def query_setup_registry(_):
+        registry.llm
+        registry.prompt_template(PROMPT_TEMPLATE)
+
+    def upload_setup_per_request(i):
+        DocumentProcessor().get_text_splitter(EXTENSIONS[i % len(EXTENSIONS)])
+
+    def upload_setup_registry(i):
+        registry.document_processor.get_text_splitter(EXTENSIONS[i % len(EXTENSIONS)])
+
+    results = {}
+    for name, per_request, shared in [
+        ("query_setup", query_setup_per_request, query_setup_registry),
+        ("upload_setup", upload_setup_per_request, upload_setup_registry),
+    ]:
+        # Warm up imports and first-time construction outside the timed runs
+        per_request(0)
+        shared(0)
+
+        before = _measure(per_request, iterations)
+        after = _measure(shared, iterations)
+        results[name] = {
+            "per_request": before,
+            "registry": after,
+            "speedup": round(before["mean_us"] / after["mean_us"], 1) if after["mean_us"] else None,
+        }
+    return {"iterations": iterations, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.iterations), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Benchmark of context packing: retrieved chunks joined verbatim vs. packed.
+
+Chunks a code corpus, retrieves the top-k chunks of each query by
+cosine similarity of feature-hashing embeddings (so no model is loaded),
+then builds the prompt context both ways and reports, per k and budget:
+
+- tokens: mean context tokens joined verbatim and packed, and the share saved
+- spans: how many chunks were merged with an overlapping neighbour or
+  dropped as near-duplicates, and how many spans the budget cut or left out
+- coverage: the share of retrieved chunks whose text is in the packed context
+- pack_ms: p50/p99 time to pack one query's chunks
+
+The synthetic corpus is made of small functions, which the code splitters
+keep whole, so its chunks rarely overlap. Pass `--source` to chunk a real
+source tree instead (e.g. `--source src`), with queries about the functions
+and classes defined in it.
+
+Usage:
+    python -m benchmarks.bench_context_packing [--files 40] [--source DIR] [--queries 200]
+        [--k 4 10] [--budgets 3000 1000]
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.corpus import Corpus, CorpusFile, generate_corpus, generate_queries
+from benchmarks.stubs import HashEmbeddings
+from src.config import get_settings
+from src.services.context_builder import SEPARATOR, ContextBuilder
+from src.services.document_processor import DocumentProcessor
+
+DEFINITION_PATTERN = re.compile(r"\b(?:def|class|function|func|fn)\s+([A-Za-z_]\w{3,})")
+
+
+def _percentiles(samples: list[float]) -> dict:
+    """Get the p50 and p99 of latency samples in milliseconds."""
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+    }
+
+
+def _source_corpus(directory: str, extensions: set[str]) -> Corpus:
+    """Collect the source files under a directory, and the functions and classes they define."""
+    corpus = Corpus()
+    seen = set()
+    for root, _, filenames in os.walk(directory):
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() not in extensions:
+                continue
+            path = os.path.join(root, filename)
+            with open(path, encoding="utf-8", errors="replace") as f:
+                text = f.read()
+            corpus.files.append(CorpusFile(path=path, filename=filename, size=len(text)))
+            for name in DEFINITION_PATTERN.findall(text):
+                if name not in seen:
+                    seen.add(name)
+                    corpus.identifiers.append(name)
+    return corpus
+
+
+def _normalize(text: str) -> str:
+    """Collapse whitespace, which merging may change at chunk boundaries."""
+    return " ".join(text.split())
+
+
+def run(files: int, source: str | None, queries: int, ks: list[int], budgets: list[int]) -> dict:
+    """Run the benchmark for each k and token budget."""
+    settings = get_settings()
+    processor = DocumentProcessor()
+    if source:
+        corpus = _source_corpus(source, set(processor.language_map))
+    else:
+        corpus = generate_corpus(os.path.join(tempfile.mkdtemp(prefix="context-packing-"), "corpus"), files)
+    chunks = []
+    for number, file in enumerate(corpus.files):
+        for chunk in processor.process_file(file.path, file.filename):
+            chunk.metadata["document_id"] = f"document-{number}"
+            chunks.append(chunk)
+
+    embeddings = HashEmbeddings()
+    chunk_vectors = np.asarray(embeddings.embed_documents([chunk.page_content for chunk in chunks]))
+    query_texts = generate_queries(corpus, queries)
+    query_vectors = np.asarray(embeddings.embed_documents(query_texts))
+    similarities = query_vectors @ chunk_vectors.T
+
+    results = []
+    for k in ks:
+        top = np.argsort(-similarities, axis=1)[:, :k]
+        for budget in budgets:
+            builder = ContextBuilder(
+                token_budget=budget,
+                encoding_name=settings.context_encoding,
+                dedup_threshold=settings.context_dedup_threshold,
+                max_overlap_chars=settings.chunk_overlap,
+            )
+            unpacked, packed, coverage, samples = [], [], [], []
+            totals = {"merged_chunks": 0, "duplicates_dropped": 0, "truncated_spans": 0, "over_budget_spans": 0}
+            for row, indices in enumerate(top):
+                docs = []
+                for i in indices:
+                    chunk = chunks[i].model_copy(deep=True)
+                    chunk.metadata["score"] = float(similarities[row, i])
+                    docs.append(chunk)
+
+                started = time.perf_counter()
+                context = builder.build(docs)
+                samples.append((time.perf_counter() - started) * 1000)
+
+                unpacked.append(builder.count_tokens(SEPARATOR.join(doc.page_content for doc in docs)))
+                packed.append(context.stats["tokens"])
+                text = _normalize(context.text)
+                coverage.append(np.mean([_normalize(doc.page_content) in text for doc in docs]))
+                for key in totals:
+                    totals[key] += context.stats[key]
+
+            results.append({
+                "k": k,
+                "token_budget": budget,
+                "tokens": {
+                    "unpacked_mean": round(float(np.mean(unpacked)), 1),
+                    "packed_mean": round(float(np.mean(packed)), 1),
+                    "saved": round(1 - float(np.sum(packed)) / float(np.sum(unpacked)), 4),
+                },
+                "spans": totals,
+                "coverage": round(float(np.mean(coverage)), 4),
+                "pack_ms": _percentiles(samples),
+            })
+
+    return {
+        "source": source or "synthetic",
+        "files": len(corpus.files),
+        "chunks": len(chunks),
+        "queries": len(query_texts),
+        "chunk_size": settings.chunk_size,
+        "chunk_overlap": settings.chunk_overlap,
+        "encoding": settings.context_encoding if builder.encoding is not None else "estimate",
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=40, help="Files in the synthetic corpus")
+    parser.add_argument("--source", help="Chunk this source tree instead of a synthetic corpus")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, nargs="+", default=[4, 10])
+    parser.add_argument("--budgets", type=int, nargs="+", default=[3000, 1000])
+    args = parser.parse_args()
+    print(json.dumps(run(args.files, args.source, args.queries, args.k, args.budgets), indent=2))
+
+
+if __name__ == "__main__":
+    main()
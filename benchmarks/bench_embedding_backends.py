@@ -0,0 +1,174 @@
+"""
+Benchmark of the embedding backends: PyTorch, ONNX Runtime and int8 ONNX.
+
+Chunks a synthetic code corpus, then, for each backend in a fresh process so
+load time and memory are measured in isolation:
+
+- load_s: time to import the runtime and load the model
+- peak_rss_mb: peak resident memory of the process
+- documents: throughput embedding every chunk in batches of `--batch-size`
+- queries: p50/p99 latency embedding one query at a time
+- quality: against the first backend listed, the mean cosine similarity of
+  chunk vectors and recall@k, the share of each query's top-k chunks that
+  the backend also ranks in its top-k
+
+A backend that cannot load (no ONNX export, runtime not installed) reports
+its error instead.
+
+Usage:
+    python -m benchmarks.bench_embedding_backends [--backends torch onnx onnx-int8]
+        [--model sentence-transformers/all-MiniLM-L6-v2] [--threads 0] [--files 40]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from benchmarks.corpus import generate_corpus, generate_queries
+from src.services.document_processor import DocumentProcessor
+from src.services.embedding_backends import EMBEDDING_BACKENDS
+
+
+def _percentiles(samples: list[float]) -> dict:
+    """Get the p50 and p99 of latency samples in milliseconds."""
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+    }
+
+
+def _measure_backend(
+    model_name: str,
+    backend: str,
+    threads: int,
+    onnx_directory: str,
+    texts: list[str],
+    queries: list[str],
+    batch_size: int,
+) -> dict:
+    """Load one backend and time it; runs in its own process."""
+    from src.services.embedding_backends import load_embedding_model
+
+    started = time.perf_counter()
+    model = load_embedding_model(model_name, backend=backend, threads=threads, onnx_directory=onnx_directory)
+    load_seconds = time.perf_counter() - started
+    model.embed_documents(texts[:batch_size])
+
+    started = time.perf_counter()
+    document_vectors = []
+    for start in range(0, len(texts), batch_size):
+        document_vectors.extend(model.embed_documents(texts[start:start + batch_size]))
+    document_seconds = time.perf_counter() - started
+
+    query_vectors = []
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        query_vectors.append(model.embed_query(query))
+        samples.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "load_s": round(load_seconds, 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "documents": {
+            "chunks": len(texts),
+            "seconds": round(document_seconds, 3),
+            "chunks_per_s": round(len(texts) / document_seconds, 2),
+        },
+        "queries": _percentiles(samples),
+        "document_vectors": np.asarray(document_vectors, dtype=np.float32),
+        "query_vectors": np.asarray(query_vectors, dtype=np.float32),
+    }
+
+
+def _quality(reference: dict, candidate: dict, k: int) -> dict:
+    """Compare a backend's vectors and rankings with the reference backend's."""
+    cosine = np.sum(reference["document_vectors"] * candidate["document_vectors"], axis=1)
+    reference_top = np.argsort(-(reference["query_vectors"] @ reference["document_vectors"].T), axis=1)[:, :k]
+    candidate_top = np.argsort(-(candidate["query_vectors"] @ candidate["document_vectors"].T), axis=1)[:, :k]
+    recall = [len(set(expected) & set(found)) / k for expected, found in zip(reference_top, candidate_top)]
+    return {
+        "cosine_mean": round(float(cosine.mean()), 6),
+        "cosine_min": round(float(cosine.min()), 6),
+        f"recall_at_{k}": round(float(np.mean(recall)), 4),
+    }
+
+
+def run(
+    model_name: str,
+    backends: list[str],
+    threads: int,
+    files: int,
+    queries: int,
+    k: int,
+    batch_size: int,
+) -> dict:
+    """Run the benchmark for each backend."""
+    work_directory = tempfile.mkdtemp(prefix="embedding-backends-")
+    corpus = generate_corpus(os.path.join(work_directory, "corpus"), files)
+    processor = DocumentProcessor()
+    texts = [
+        chunk.page_content
+        for file in corpus.files
+        for chunk in processor.process_file(file.path, file.filename)
+    ]
+    query_texts = generate_queries(corpus, queries)
+
+    results = {}
+    # A fresh process per backend, so neither imports nor memory carry over
+    context = multiprocessing.get_context("spawn")
+    for backend in backends:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            try:
+                results[backend] = executor.submit(
+                    _measure_backend,
+                    model_name, backend, threads, os.path.join(work_directory, "onnx_models"),
+                    texts, query_texts, batch_size,
+                ).result()
+            except Exception as e:
+                results[backend] = {"error": f"{type(e).__name__}: {e}"}
+
+    measured = [backend for backend in backends if "error" not in results[backend]]
+    if measured:
+        reference = results[measured[0]]
+        for backend in measured:
+            results[backend]["quality"] = _quality(reference, results[backend], k)
+    for backend in measured:
+        del results[backend]["document_vectors"], results[backend]["query_vectors"]
+
+    return {
+        "model": model_name,
+        "reference": measured[0] if measured else None,
+        "threads": threads,
+        "chunks": len(texts),
+        "queries": len(query_texts),
+        "k": k,
+        "batch_size": batch_size,
+        "backends": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--backends", nargs="+", choices=EMBEDDING_BACKENDS, default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads; 0 keeps the runtime's default")
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+    print(json.dumps(run(
+        args.model, args.backends, args.threads, args.files, args.queries, args.k, args.batch_size
+    ), indent=2))
+
+
+if __name__ == "__main__":
+    main()
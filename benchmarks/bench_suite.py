@@ -0,0 +1,414 @@
+"""
+Offline benchmark suite for the upload, query and auth paths.
+
+Generates a synthetic code corpus across the supported extensions and
+measures, in order:
+
+- startup: time from application startup until warm-up reports ready
+- chunking: DocumentProcessor throughput, overall and per extension
+- embedding: embedding model throughput over the corpus chunks (cold cache)
+- index_build: time to write N chunks to a user's vector and BM25 indexes,
+  for each corpus size; the previous stage leaves every chunk in the
+  embedding cache, so this times storage rather than the model
+- retrieval: hybrid, vector-only and BM25-only search p50/p99 per corpus size
+- end_to_end: `/auth/login`, `/auth/me`, `/upload` and `/query` latency at
+  each concurrency level, through the full ASGI app in-process
+
+Gemini is replaced by a stub chat model answering after `--llm-latency-ms`,
+and all state lives in a temporary directory. With `--embeddings hash` the
+sentence-transformers model is replaced by feature-hashing embeddings, for
+machines that don't have it. Results are written as JSON; compare two runs
+with `python -m benchmarks.compare`.
+
+Usage:
+    python -m benchmarks.bench_suite [--files 120] [--sizes 500 2000 8000]
+        [--concurrency 1 8 32] [--embeddings model|hash] [--output results.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+WORK_DIRECTORY = tempfile.mkdtemp(prefix="rag-benchmark-")
+
+# Keep all state out of the working copy, and fix settings that change what is measured
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{WORK_DIRECTORY}/benchmark.db",
+    "CHROMA_PERSIST_DIRECTORY": os.path.join(WORK_DIRECTORY, "chroma"),
+    "LEXICAL_INDEX_DIRECTORY": os.path.join(WORK_DIRECTORY, "lexical_index"),
+    "UPLOAD_DIRECTORY": os.path.join(WORK_DIRECTORY, "uploads"),
+    "EMBEDDING_CACHE_DIRECTORY": os.path.join(WORK_DIRECTORY, "embedding_cache"),
+    "ANSWER_CACHE_ENABLED": "false",  # Every query should reach the LLM
+    "GC_INTERVAL_SECONDS": "0",
+})
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-dummy-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")  # Per-request logs would drown the progress output
+os.environ.setdefault("SLOW_REQUEST_THRESHOLD_MS", "60000")
+
+import httpx
+from langchain_core.documents import Document
+
+from benchmarks.corpus import Corpus, generate_corpus, generate_queries
+from benchmarks.stubs import HashEmbeddings, StubChatModel
+from src.config import get_settings
+from src.main import app
+from src.services.document_processor import DocumentProcessor
+from src.services.ingestion import get_ingestion_service
+from src.services.rag_engine import get_rag_engine
+from src.services.registry import get_component_registry
+from src.services.vector_store import get_vector_store_service
+from src.services.warmup import get_warmup_service
+
+PASSWORD = "benchmark-password"
+INDEX_USER_ID_BASE = 1_000_000  # Index and retrieval stages use users no account can have
+
+
+def _log(message: str) -> None:
+    """Report progress on stderr, keeping stdout for the JSON results."""
+    print(f"[benchmark] {message}", file=sys.stderr, flush=True)
+
+
+def _summarize(samples_ms: list[float]) -> dict:
+    """Summarize latency samples in milliseconds."""
+    if not samples_ms:
+        return {"count": 0}
+    samples = sorted(samples_ms)
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples), 3),
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+def _time_calls(fn, inputs: list) -> dict:
+    """Time `fn` on each input."""
+    samples = []
+    for value in inputs:
+        started = time.perf_counter()
+        fn(value)
+        samples.append((time.perf_counter() - started) * 1000)
+    return _summarize(samples)
+
+
+def _install_stubs(embeddings: str, llm_latency_ms: float) -> None:
+    """Swap Gemini, and optionally the embedding model, for offline stand-ins."""
+    if embeddings == "hash":
+        get_vector_store_service()._load_embedding_model = HashEmbeddings
+    get_component_registry()._llm = StubChatModel(latency_ms=llm_latency_ms)
+
+
+def bench_chunking(corpus: Corpus) -> tuple[dict, list[Document]]:
+    """Chunk every corpus file, returning the throughput and the chunks."""
+    processor = DocumentProcessor()
+    chunks = []
+    by_extension: dict[str, dict] = {}
+    total_seconds = 0.0
+
+    for file in corpus.files:
+        started = time.perf_counter()
+        file_chunks = processor.process_file(file.path, file.filename)
+        seconds = time.perf_counter() - started
+        total_seconds += seconds
+
+        for chunk in file_chunks:
+            chunk.metadata["document_id"] = file.filename
+        chunks.extend(file_chunks)
+
+        extension = os.path.splitext(file.filename)[1]
+        stats = by_extension.setdefault(extension, {"files": 0, "bytes": 0, "chunks": 0, "seconds": 0.0})
+        stats["files"] += 1
+        stats["bytes"] += file.size
+        stats["chunks"] += len(file_chunks)
+        stats["seconds"] += seconds
+
+    for stats in by_extension.values():
+        stats["mb_per_s"] = round(stats["bytes"] / (1024 * 1024) / stats["seconds"], 3)
+        stats["seconds"] = round(stats["seconds"], 4)
+
+    return {
+        "files": len(corpus.files),
+        "bytes": corpus.total_bytes,
+        "chunks": len(chunks),
+        "seconds": round(total_seconds, 4),
+        "files_per_s": round(len(corpus.files) / total_seconds, 2),
+        "mb_per_s": round(corpus.total_bytes / (1024 * 1024) / total_seconds, 3),
+        "chunks_per_s": round(len(chunks) / total_seconds, 2),
+        "by_extension": dict(sorted(by_extension.items())),
+    }, chunks
+
+
+def bench_embedding(chunks: list[Document]) -> dict:
+    """Embed every distinct chunk text with the configured model."""
+    vector_store = get_vector_store_service()
+    started = time.perf_counter()
+    embeddings = vector_store.embeddings
+    embeddings.embed_query("warm up")
+    load_seconds = time.perf_counter() - started
+
+    texts = list(dict.fromkeys(chunk.page_content for chunk in chunks))
+    batch_size = get_settings().ingestion_batch_size
+    started = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        embeddings.embed_documents(texts[start:start + batch_size])
+    seconds = time.perf_counter() - started
+
+    return {
+        "texts": len(texts),
+        "model_load_s": round(load_seconds, 3),
+        "seconds": round(seconds, 4),
+        "chunks_per_s": round(len(texts) / seconds, 2),
+    }
+
+
+def _sized_chunks(chunks: list[Document], size: int, label: str) -> list[Document]:
+    """Repeat the corpus chunks up to `size`, each repetition as a separate document."""
+    sized = []
+    for number in range(size):
+        chunk = chunks[number % len(chunks)]
+        repetition = number // len(chunks)
+        metadata = dict(chunk.metadata, document_id=f"{label}-{repetition}-{chunk.metadata['document_id']}")
+        sized.append(Document(page_content=chunk.page_content, metadata=metadata))
+    return sized
+
+
+def bench_index_build(chunks: list[Document], sizes: list[int]) -> list[dict]:
+    """Write each corpus size to a fresh user's indexes, in ingestion-sized batches."""
+    vector_store = get_vector_store_service()
+    batch_size = get_settings().ingestion_batch_size
+    results = []
+    for user_id, size in enumerate(sizes, start=INDEX_USER_ID_BASE):
+        documents = _sized_chunks(chunks, size, f"size{size}")
+        started = time.perf_counter()
+        for start in range(0, len(documents), batch_size):
+            vector_store.add_documents(documents[start:start + batch_size], user_id)
+        vector_store.lexical_index(user_id).flush()
+        seconds = time.perf_counter() - started
+        results.append({
+            "chunks": size,
+            "seconds": round(seconds, 4),
+            "chunks_per_s": round(size / seconds, 2),
+        })
+    return results
+
+
+def bench_retrieval(queries: list[str], sizes: list[int], k: int) -> list[dict]:
+    """Time each retrieval mode against the indexes built for each corpus size."""
+    vector_store = get_vector_store_service()
+    rag_engine = get_rag_engine()
+    query_embeddings = [vector_store.embed_query(query) for query in queries]
+    results = []
+    for user_id, size in enumerate(sizes, start=INDEX_USER_ID_BASE):
+        # First searches load the collection and index
+        rag_engine.query_without_llm(queries[0], user_id, k=k)
+        results.append({
+            "chunks": size,
+            "hybrid": _time_calls(lambda query: rag_engine.query_without_llm(query, user_id, k=k), queries),
+            "vector": _time_calls(
+                lambda embedding: vector_store.similarity_search_by_vector(embedding, user_id, k=k),
+                query_embeddings,
+            ),
+            "lexical": _time_calls(lambda query: vector_store.lexical_search(query, user_id, k=k), queries),
+        })
+    return results
+
+
+async def _run_concurrently(send, count: int, concurrency: int) -> dict:
+    """Send `count` requests from `concurrency` concurrent clients and time each one."""
+    samples, errors = [], 0
+    numbers = iter(range(count))
+
+    async def client():
+        nonlocal errors
+        for number in numbers:
+            started = time.perf_counter()
+            response = await send(number)
+            samples.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    seconds = time.perf_counter() - started
+    return {
+        **_summarize(samples),
+        "errors": errors,
+        "requests_per_s": round(count / seconds, 2),
+    }
+
+
+async def _wait_for_ingestion(timeout: float = 600.0) -> float:
+    """Wait until every queued upload is indexed, returning how long it took."""
+    started = time.perf_counter()
+    while not get_ingestion_service().is_idle():
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError("Ingestion did not finish")
+        await asyncio.sleep(0.05)
+    return time.perf_counter() - started
+
+
+async def bench_end_to_end(
+    client: httpx.AsyncClient,
+    corpus: Corpus,
+    queries: list[str],
+    concurrency: int,
+    requests: int,
+    k: int,
+) -> dict:
+    """Exercise the HTTP endpoints as a fresh user at one concurrency level."""
+    email = f"benchmark-{concurrency}@example.com"
+    await client.post("/auth/register", json={"email": email, "password": PASSWORD})
+
+    async def login(_):
+        return await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+
+    login_result = await _run_concurrently(login, requests, concurrency)
+    token = (await login(0)).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def me(_):
+        return await client.get("/auth/me", headers=headers)
+
+    async def upload(number):
+        file = corpus.files[number % len(corpus.files)]
+        with open(file.path, "rb") as f:
+            # Make every upload distinct so none is deduplicated
+            content = f.read() + f"\nbenchmark upload {concurrency}-{number}\n".encode("utf-8")
+        return await client.post("/upload", files={"file": (file.filename, content)}, headers=headers)
+
+    async def query(number):
+        return await client.post(
+            "/query",
+            json={"query": queries[number % len(queries)], "k": k},
+            headers=headers,
+        )
+
+    me_result = await _run_concurrently(me, requests, concurrency)
+    upload_result = await _run_concurrently(upload, requests, concurrency)
+    indexing_seconds = await _wait_for_ingestion()
+    query_result = await _run_concurrently(query, requests, concurrency)
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "login": login_result,
+        "me": me_result,
+        "upload": upload_result,
+        "indexing_after_upload_s": round(indexing_seconds, 3),
+        "query": query_result,
+    }
+
+
+def _metadata(args: argparse.Namespace) -> dict:
+    """Describe the run, so results can be matched to code and machine."""
+    settings = get_settings()
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "embeddings": args.embeddings,
+        "embedding_model": settings.embedding_model if args.embeddings == "model" else "hash",
+        "llm_latency_ms": args.llm_latency_ms,
+        "files": args.files,
+        "sizes": args.sizes,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "queries": args.queries,
+        "k": args.k,
+        "chunk_size": settings.chunk_size,
+        "chunk_overlap": settings.chunk_overlap,
+        "hybrid_search_enabled": settings.hybrid_search_enabled,
+        "embedding_cache_enabled": settings.embedding_cache_enabled,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    """Run every stage and collect the results."""
+    results = {"meta": _metadata(args)}
+    _install_stubs(args.embeddings, args.llm_latency_ms)
+
+    _log(f"Generating {args.files} files")
+    corpus = generate_corpus(os.path.join(WORK_DIRECTORY, "corpus"), args.files, seed=args.seed)
+    queries = generate_queries(corpus, args.queries, seed=args.seed)
+
+    started = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        # Warm-up runs in the background; let it finish so it doesn't overlap the timed stages
+        _log("Waiting for warm-up")
+        warmup_service = get_warmup_service()
+        while warmup_service.status()["state"] == "warming":
+            await asyncio.sleep(0.01)
+        results["startup"] = {
+            "ready_s": round(time.perf_counter() - started, 3),
+            "steps_ms": warmup_service.status()["steps_ms"],
+        }
+
+        _log("Chunking")
+        results["chunking"], chunks = bench_chunking(corpus)
+        _log("Embedding")
+        results["embedding"] = bench_embedding(chunks)
+        _log(f"Building indexes of {args.sizes} chunks")
+        results["index_build"] = bench_index_build(chunks, args.sizes)
+        _log("Retrieval")
+        results["retrieval"] = bench_retrieval(queries, args.sizes, args.k)
+
+        results["end_to_end"] = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for concurrency in args.concurrency:
+                _log(f"End to end at concurrency {concurrency}")
+                results["end_to_end"].append(
+                    await bench_end_to_end(client, corpus, queries, concurrency, args.requests, args.k)
+                )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=120, help="Synthetic files to generate")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 8000], help="Corpus sizes in chunks")
+    parser.add_argument("--queries", type=int, default=200, help="Queries timed per corpus size")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--embeddings", choices=["model", "hash"], default="model")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    try:
+        # The app logs with print; keep stdout clean for the results
+        with contextlib.redirect_stdout(sys.stderr):
+            results = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(WORK_DIRECTORY, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        _log(f"Results written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark of per-user retrieval: one shared collection vs. one collection per user.
+
+Every user owns the same number of chunks while the number of users grows.
+For each global corpus size the benchmark times top-k searches for a single
+user against:
+
+- shared_filtered: one collection holding everyone's chunks, restricted with
+  a `user_id` metadata filter (the pre-filter alternative)
+- per_user: the user's own collection, as VectorStoreService now does
+
+Random unit vectors stand in for embeddings, so no model is loaded and the
+benchmark runs offline.
+
+Usage:
+    python -m benchmarks.bench_tenant_search [--chunks-per-user 2000] [--users 1 5 20]
+"""
+import argparse
+import json
+import time
+
+import chromadb
+import numpy as np
+from chromadb.config import Settings as ChromaSettings
+
+DIMENSIONS = 384  # all-MiniLM-L6-v2
+
+
+def _random_unit_vectors(rng: np.random.Generator, count: int) -> np.ndarray:
+    """Generate random unit-length vectors."""
+    vectors = rng.standard_normal((count, DIMENSIONS)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _add(collection, vectors: np.ndarray, user_id: int, batch_size: int = 5000) -> None:
+    """Add vectors owned by a user to a collection in batches."""
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        collection.add(
+            ids=[f"u{user_id}-{start + i}" for i in range(len(batch))],
+            embeddings=batch.tolist(),
+            metadatas=[{"user_id": user_id} for _ in range(len(batch))],
+        )
+
+
+def _time_queries(search, queries: np.ndarray) -> dict:
+    """Time a search function over a set of query vectors."""
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+    }
+
+
+def run(chunks_per_user: int, user_counts: list[int], queries: int, k: int) -> dict:
+    """Run the benchmark for each global corpus size."""
+    rng = np.random.default_rng(0)
+    query_vectors = _random_unit_vectors(rng, queries)
+    results = []
+
+    for users in user_counts:
+        client = chromadb.EphemeralClient(settings=ChromaSettings(anonymized_telemetry=False))
+        shared = client.create_collection(f"shared_{users}")
+        per_user = {}
+        for user_id in range(users):
+            vectors = _random_unit_vectors(rng, chunks_per_user)
+            _add(shared, vectors, user_id)
+            per_user[user_id] = client.create_collection(f"user_{users}_{user_id}")
+            _add(per_user[user_id], vectors, user_id)
+
+        target_user = 0
+        results.append({
+            "users": users,
+            "global_chunks": users * chunks_per_user,
+            "user_chunks": chunks_per_user,
+            "shared_filtered": _time_queries(
+                lambda q: shared.query(
+                    query_embeddings=[q.tolist()], n_results=k, where={"user_id": target_user}
+                ),
+                query_vectors,
+            ),
+            "per_user": _time_queries(
+                lambda q: per_user[target_user].query(query_embeddings=[q.tolist()], n_results=k),
+                query_vectors,
+            ),
+        })
+
+    return {"k": k, "queries": queries, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks-per-user", type=int, default=2000)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+    print(json.dumps(run(args.chunks_per_user, args.users, args.queries, args.k), indent=2))
+
+
+if __name__ == "__main__":
+    main()
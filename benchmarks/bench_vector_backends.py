@@ -0,0 +1,159 @@
+"""
+Benchmark of the vector index backends: Chroma vs. the native index.
+
+For each corpus size, one user's chunks are stored in each backend and
+top-k searches are run through the backend interface, so every search also
+reads the texts and metadata of its results. The backends are:
+
+- chroma: ChromaDB's persistent client, as with VECTOR_BACKEND=chroma
+- native: memory-mapped vectors searched exhaustively with NumPy
+- native_hnsw: the native backend searching an HNSW graph (needs the
+  `hnsw` extra; skipped without it)
+
+and for each one the benchmark reports:
+
+- build_s: time to add every chunk, in batches as ingestion does, and run
+  the first search (which opens the collection and builds any HNSW graph)
+- search: p50/p99 latency of one top-k search
+- recall: share of the exact top-k (by cosine similarity) that was returned
+- disk_bytes: size of the backend's files
+
+Random vectors stand in for embeddings, so no model is loaded and the
+benchmark runs offline. They are drawn around a few hundred random centres,
+as embeddings of related code cluster; uniformly random vectors in 384
+dimensions would have no meaningful nearest neighbours for an approximate
+index to find.
+
+Usage:
+    python -m benchmarks.bench_vector_backends [--sizes 1000 10000 50000] [--queries 200] [--k 4]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from src.services.garbage_collector import _directory_size
+from src.services.vector_backends import ChromaBackend, NativeBackend, VectorBackend
+
+DIMENSIONS = 384  # all-MiniLM-L6-v2
+BATCH_SIZE = 256  # Default INGESTION_BATCH_SIZE
+USER_ID = 1
+CLUSTERS = 500
+SPREAD = 1.0  # Length of the noise added to a centre; cosine to the centre is about 0.7
+
+
+def _unit_vectors(vectors: np.ndarray) -> np.ndarray:
+    """Scale vectors to unit length."""
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _clustered_vectors(rng: np.random.Generator, centres: np.ndarray, count: int) -> np.ndarray:
+    """Generate unit vectors scattered around randomly chosen centres."""
+    noise = rng.standard_normal((count, DIMENSIONS)) * SPREAD / np.sqrt(DIMENSIONS)
+    return _unit_vectors(centres[rng.integers(len(centres), size=count)] + noise)
+
+
+def _hnsw_available() -> bool:
+    """Check whether hnswlib is installed."""
+    try:
+        import hnswlib  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _backends(directory: str) -> dict[str, VectorBackend]:
+    """Create each backend under a directory."""
+    backends = {
+        "chroma": ChromaBackend(os.path.join(directory, "chroma"), "documents"),
+        "native": NativeBackend(os.path.join(directory, "native"), hnsw_threshold=0),
+    }
+    if _hnsw_available():
+        backends["native_hnsw"] = NativeBackend(os.path.join(directory, "native_hnsw"), hnsw_threshold=1)
+    return backends
+
+
+def _build(backend: VectorBackend, vectors: np.ndarray, query: np.ndarray, k: int) -> float:
+    """Add every vector to a backend in batches and search once, returning the time taken in seconds."""
+    started = time.perf_counter()
+    for start in range(0, len(vectors), BATCH_SIZE):
+        batch = vectors[start:start + BATCH_SIZE]
+        backend.add(
+            USER_ID,
+            [f"chunk-{start + i}" for i in range(len(batch))],
+            batch.tolist(),
+            [f"text of chunk {start + i}" for i in range(len(batch))],
+            [{"document_id": f"document-{(start + i) // 20}", "chunk_index": (start + i) % 20} for i in range(len(batch))],
+        )
+    backend.query(USER_ID, query.tolist(), k)
+    return time.perf_counter() - started
+
+
+def _search(backend: VectorBackend, queries: np.ndarray, exact: list[set[str]], k: int) -> dict:
+    """Time searches and measure their recall against the exact top-k."""
+    samples, recalls = [], []
+    for query, expected in zip(queries, exact):
+        started = time.perf_counter()
+        result = backend.query(USER_ID, query.tolist(), k)
+        samples.append((time.perf_counter() - started) * 1000)
+        recalls.append(len(expected & set(result.ids)) / k)
+    samples.sort()
+    return {
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+        "recall": round(float(np.mean(recalls)), 4),
+    }
+
+
+def run(sizes: list[int], queries: int, k: int) -> dict:
+    """Run the benchmark for each corpus size."""
+    rng = np.random.default_rng(0)
+    centres = _unit_vectors(rng.standard_normal((CLUSTERS, DIMENSIONS)))
+    query_vectors = _clustered_vectors(rng, centres, queries)
+    results = []
+
+    for size in sizes:
+        vectors = _clustered_vectors(rng, centres, size)
+        similarities = query_vectors @ vectors.T
+        exact = [
+            {f"chunk-{i}" for i in np.argpartition(-row, k - 1)[:k]}
+            for row in similarities
+        ]
+
+        directory = tempfile.mkdtemp(prefix="vector-backends-")
+        backends = _backends(directory)
+        result = {"chunks": size}
+        for name, backend in backends.items():
+            build_s = _build(backend, vectors, query_vectors[0], k)
+            result[name] = {
+                "build_s": round(build_s, 3),
+                "search": _search(backend, query_vectors, exact, k),
+                "disk_bytes": _directory_size(backend.directory),
+            }
+            backend.close()
+        results.append(result)
+
+    return {
+        "dimensions": DIMENSIONS,
+        "clusters": CLUSTERS,
+        "k": k,
+        "queries": queries,
+        "hnsw": _hnsw_available(),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+    print(json.dumps(run(args.sizes, args.queries, args.k), indent=2))
+
+
+if __name__ == "__main__":
+    main()
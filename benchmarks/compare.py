@@ -0,0 +1,97 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+Walks both JSON documents and compares every metric they share: latencies
+(`*_ms`, `*_s`, `seconds`) regress when they grow, throughputs (`*_per_s`)
+when they shrink. Exits with status 1 if any metric regressed by more than
+the threshold, so it can gate CI.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 0.10]
+"""
+import argparse
+import json
+import sys
+
+
+def _flatten(value, path: str = "") -> dict[str, float]:
+    """Map each numeric leaf to a dotted path; list items are keyed by their size or concurrency."""
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            if "." in key:
+                key_path = f"{path}[{key}]"
+            else:
+                key_path = f"{path}.{key}" if path else key
+            flat.update(_flatten(item, key_path))
+        return flat
+    if isinstance(value, list):
+        flat = {}
+        for index, item in enumerate(value):
+            label = index
+            if isinstance(item, dict):
+                label = item.get("chunks", item.get("concurrency", index))
+            flat.update(_flatten(item, f"{path}[{label}]"))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {path: float(value)}
+    return {}
+
+
+def _direction(path: str) -> int:
+    """Get +1 if a metric should be low, -1 if it should be high, 0 if it isn't a metric."""
+    name = path.rsplit(".", 1)[-1]
+    if name.endswith("_per_s"):
+        return -1
+    if name.endswith("_ms") or name.endswith("_s") or name == "seconds":
+        return 1
+    return 0
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list[dict]:
+    """Get the relative change of every shared metric, worst regression first."""
+    before = _flatten({key: value for key, value in baseline.items() if key != "meta"})
+    after = _flatten({key: value for key, value in candidate.items() if key != "meta"})
+    changes = []
+    for path in sorted(before.keys() & after.keys()):
+        direction = _direction(path)
+        if direction == 0 or before[path] == 0:
+            continue
+        change = (after[path] - before[path]) / before[path]
+        changes.append({
+            "metric": path,
+            "baseline": before[path],
+            "candidate": after[path],
+            "change": round(change, 4),
+            "regressed": change * direction > threshold,
+        })
+    changes.sort(key=lambda item: item["change"] * _direction(item["metric"]), reverse=True)
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    changes = compare(baseline, candidate, args.threshold)
+    regressions = [change for change in changes if change["regressed"]]
+    print(json.dumps({
+        "threshold": args.threshold,
+        "baseline_commit": baseline.get("meta", {}).get("git_commit"),
+        "candidate_commit": candidate.get("meta", {}).get("git_commit"),
+        "regressions": regressions,
+        "changes": changes,
+    }, indent=2))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
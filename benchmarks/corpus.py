@@ -0,0 +1,182 @@
+"""
+Deterministic synthetic code corpus for benchmarks.
+
+Generates source files across the supported extensions, built from a small
+vocabulary of verbs and nouns so identifiers repeat across files the way they
+do in a real repository. The same seed always yields the same bytes.
+"""
+import os
+import random
+from dataclasses import dataclass, field
+
+EXTENSIONS = [".py", ".js", ".ts", ".java", ".go", ".rs", ".cpp", ".c", ".cs", ".rb", ".php", ".md"]
+
+VERBS = [
+    "load", "parse", "build", "render", "fetch", "store", "merge", "split", "index", "resolve",
+    "validate", "encode", "decode", "compute", "flush", "refresh", "schedule", "register",
+]
+NOUNS = [
+    "config", "document", "chunk", "token", "user", "session", "query", "result", "cache",
+    "vector", "record", "request", "response", "payload", "manifest", "segment", "batch", "report",
+]
+WORDS = [
+    "the", "value", "is", "returned", "when", "every", "item", "has", "been", "checked", "against",
+    "current", "state", "before", "writing", "it", "back", "to", "storage", "and", "errors", "are",
+    "reported", "with", "context", "so", "callers", "can", "retry", "later",
+]
+
+
+@dataclass
+class CorpusFile:
+    """A generated file on disk."""
+    path: str
+    filename: str
+    size: int
+
+
+@dataclass
+class Corpus:
+    """Generated files and the identifiers defined in them."""
+    files: list[CorpusFile] = field(default_factory=list)
+    identifiers: list[str] = field(default_factory=list)
+
+    @property
+    def total_bytes(self) -> int:
+        """Get the size of all files."""
+        return sum(file.size for file in self.files)
+
+
+def _snake(verb: str, noun: str) -> str:
+    """Name a function in snake_case."""
+    return f"{verb}_{noun}"
+
+
+def _camel(verb: str, noun: str) -> str:
+    """Name a function in camelCase."""
+    return verb + noun.capitalize()
+
+
+def _pascal(verb: str, noun: str) -> str:
+    """Name a function in PascalCase."""
+    return verb.capitalize() + noun.capitalize()
+
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    """Generate a filler sentence for comments and prose."""
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _body_lines(rng: random.Random, noun: str, style: str) -> list[str]:
+    """Generate a few statements that reference the function's noun."""
+    lines = []
+    for i in range(rng.randint(3, 8)):
+        other = rng.choice(NOUNS)
+        if style == "python":
+            lines.append(f"{other}_{i} = {noun}.get('{other}', {i}) + len({noun})")
+        elif style == "ruby":
+            lines.append(f"{other}_{i} = {noun}.fetch(:{other}, {i}) + {noun}.size")
+        elif style == "php":
+            lines.append(f"${other}{i} = ${noun}['{other}'] ?? {i};")
+        elif style == "go":
+            lines.append(f"{other}{i} := {noun}.{other} + {i}")
+        else:
+            lines.append(f"var {other}{i} = {noun}.{other} + {i};")
+    return lines
+
+
+def _function(rng: random.Random, extension: str) -> tuple[str, str]:
+    """Generate one function in the language of an extension, returning its name and source."""
+    verb, noun = rng.choice(VERBS), rng.choice(NOUNS)
+    doc = _sentence(rng)
+
+    if extension == ".py":
+        name = _snake(verb, noun)
+        body = "\n".join(f"    {line}" for line in _body_lines(rng, noun, "python"))
+        return name, f'def {name}({noun}, retries=3):\n    """{doc}"""\n{body}\n    return {noun}\n'
+    if extension == ".rb":
+        name = _snake(verb, noun)
+        body = "\n".join(f"  {line}" for line in _body_lines(rng, noun, "ruby"))
+        return name, f"# {doc}\ndef {name}({noun})\n{body}\n  {noun}\nend\n"
+    if extension == ".php":
+        name = _camel(verb, noun)
+        body = "\n".join(f"    {line}" for line in _body_lines(rng, noun, "php"))
+        return name, f"/** {doc} */\nfunction {name}(${noun}) {{\n{body}\n    return ${noun};\n}}\n"
+    if extension == ".go":
+        name = _pascal(verb, noun)
+        body = "\n".join(f"\t{line}" for line in _body_lines(rng, noun, "go"))
+        return name, f"// {name} does this: {doc}\nfunc {name}({noun} *{noun.capitalize()}) error {{\n{body}\n\treturn nil\n}}\n"
+    if extension == ".rs":
+        name = _snake(verb, noun)
+        body = "\n".join(f"    {line}" for line in _body_lines(rng, noun, "c"))
+        return name, f"/// {doc}\npub fn {name}({noun}: &mut {noun.capitalize()}) -> Result<(), Error> {{\n{body}\n    Ok(())\n}}\n"
+    if extension in (".js", ".ts"):
+        name = _camel(verb, noun)
+        signature = f"{noun}: {noun.capitalize()}" if extension == ".ts" else noun
+        body = "\n".join(f"  {line}" for line in _body_lines(rng, noun, "c"))
+        return name, f"/** {doc} */\nexport function {name}({signature}) {{\n{body}\n  return {noun};\n}}\n"
+    if extension == ".md":
+        name = _snake(verb, noun)
+        paragraphs = "\n\n".join(_sentence(rng, rng.randint(20, 40)) for _ in range(rng.randint(2, 4)))
+        return name, f"## `{name}`\n\n{paragraphs}\n\n```\n{name}({noun})\n```\n"
+
+    # Java, C#, C and C++
+    name = _camel(verb, noun) if extension in (".java", ".cs") else _snake(verb, noun)
+    body = "\n".join(f"    {line}" for line in _body_lines(rng, noun, "c"))
+    modifiers = "public static " if extension in (".java", ".cs") else "static "
+    return name, f"/* {doc} */\n{modifiers}int {name}({noun.capitalize()} *{noun}) {{\n{body}\n    return 0;\n}}\n"
+
+
+def _wrap(extension: str, module: str, functions: str) -> str:
+    """Wrap generated functions in the boilerplate their language needs."""
+    if extension in (".java", ".cs"):
+        indented = "\n".join(f"    {line}" if line else "" for line in functions.splitlines())
+        return f"public class {module.capitalize()} {{\n{indented}\n}}\n"
+    if extension == ".go":
+        return f"package {module}\n\n{functions}"
+    if extension == ".php":
+        return f"<?php\n\n{functions}"
+    if extension == ".md":
+        return f"# {module}\n\n{functions}"
+    return functions
+
+
+def generate_corpus(directory: str, files: int, seed: int = 0, functions_per_file: int = 24) -> Corpus:
+    """Write `files` generated files, cycling through EXTENSIONS, into a directory."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    corpus = Corpus()
+    seen = set()
+
+    for number in range(files):
+        extension = EXTENSIONS[number % len(EXTENSIONS)]
+        module = f"{rng.choice(NOUNS)}{number}"
+        sources = []
+        for _ in range(rng.randint(functions_per_file // 2, functions_per_file)):
+            name, source = _function(rng, extension)
+            sources.append(source)
+            if name not in seen:
+                seen.add(name)
+                corpus.identifiers.append(name)
+
+        filename = f"{module}{extension}"
+        path = os.path.join(directory, filename)
+        content = _wrap(extension, module, "\n".join(sources)).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(content)
+        corpus.files.append(CorpusFile(path=path, filename=filename, size=len(content)))
+
+    return corpus
+
+
+def generate_queries(corpus: Corpus, count: int, seed: int = 0) -> list[str]:
+    """Generate a mix of natural-language and bare-identifier queries about a corpus."""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        identifier = rng.choice(corpus.identifiers)
+        if i % 4 == 0:
+            queries.append(identifier)
+        else:
+            verb, noun = rng.choice(VERBS), rng.choice(NOUNS)
+            queries.append(f"how does {identifier} {verb} the {noun} and what does it return")
+    return queries
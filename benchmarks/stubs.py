@@ -0,0 +1,118 @@
+"""
+Offline stand-ins for the LLM and, optionally, the embedding model.
+
+StubChatModel replaces Gemini with a fixed answer delivered after a
+configurable latency, streamed word by word. HashEmbeddings replaces the
+sentence-transformers model on machines without it: tokens are hashed into a
+fixed number of signed buckets, so chunks sharing identifiers still land
+near each other, at a tiny fraction of the model's cost.
+"""
+import asyncio
+import hashlib
+import time
+from typing import Any, AsyncIterator, Iterator, List
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.services.lexical_index import tokenize
+
+STUB_ANSWER = (
+    "Based on the retrieved context, the function validates its input, "
+    "updates the stored state and returns the result to the caller."
+)
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model answering every prompt with STUB_ANSWER after `latency_ms`."""
+
+    latency_ms: float = 50.0
+    answer: str = STUB_ANSWER
+
+    @property
+    def _llm_type(self) -> str:
+        """Name the model type for LangChain callbacks."""
+        return "benchmark-stub"
+
+    def _words(self) -> List[str]:
+        """Split the answer into the pieces a stream yields."""
+        words = self.answer.split(" ")
+        return [word + " " for word in words[:-1]] + words[-1:]
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: List[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        """Answer after the configured latency."""
+        time.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: List[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        """Answer after the configured latency without blocking the event loop."""
+        await asyncio.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: List[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        """Stream the answer word by word, spread over the configured latency."""
+        words = self._words()
+        for word in words:
+            time.sleep(self.latency_ms / 1000 / len(words))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: List[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        """Stream the answer word by word without blocking the event loop."""
+        words = self._words()
+        for word in words:
+            await asyncio.sleep(self.latency_ms / 1000 / len(words))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+class HashEmbeddings(Embeddings):
+    """Feature-hashing embeddings over the lexical tokenizer's terms."""
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts."""
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query."""
+        return self._embed(text)
+
+    def _embed(self, text: str) -> List[float]:
+        """Hash each term into a signed bucket and normalize."""
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for term in tokenize(text):
+            digest = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dimensions] += 1.0 if digest & (1 << 63) else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
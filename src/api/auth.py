@@ -1,13 +1,13 @@
 """Authentication API endpoints."""
 from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database import get_db
+from src.database import get_async_db
 from src.models.user import User
 from src.models.auth_schemas import UserCreate, UserLogin, Token, UserResponse
 from src.services.security import (
-    get_password_hash,
+    aget_password_hash,
     authenticate_user,
     create_access_token,
     get_current_active_user,
@@ -18,10 +18,10 @@ router = APIRouter(prefix="/auth")
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: Annotated[Session, Depends(get_db)]):
+async def register(user_data: UserCreate, db: Annotated[AsyncSession, Depends(get_async_db)]):
     """Register a new user."""
     # Check if user already exists
-    existing_user = get_user_by_email(db, user_data.email)
+    existing_user = await get_user_by_email(db, user_data.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -29,22 +29,22 @@ async def register(user_data: UserCreate, db: Annotated[Session, Depends(get_db)
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await aget_password_hash(user_data.password)
     db_user = User(
         email=user_data.email,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return db_user
 
 
 @router.post("/login", response_model=Token)
-async def login(user_credentials: UserLogin, db: Annotated[Session, Depends(get_db)]):
+async def login(user_credentials: UserLogin, db: Annotated[AsyncSession, Depends(get_async_db)]):
     """Login and get JWT token."""
-    user = authenticate_user(db, user_credentials.email, user_credentials.password)
+    user = await authenticate_user(db, user_credentials.email, user_credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,59 @@
+"""Document management endpoints."""
+import asyncio
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.user import User
+from src.models.history import Document, DocumentStatus
+from src.models.schemas import DocumentDeleteResponse
+from src.services.content_store import delete_freed_content, release_document
+from src.services.security import get_current_active_user
+from src.database import get_async_db
+
+router = APIRouter(prefix="/documents")
+
+
+@router.delete("/{document_id}", response_model=DocumentDeleteResponse)
+async def delete_document(
+    document_id: str,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Delete a document.
+    
+    Removes the document's row and, once no other document of the user shares
+    the same bytes, its chunks in the vector store, its stored file and any
+    cached answers built from it.
+    """
+    result = await db.execute(
+        select(Document).where(
+            Document.document_id == document_id,
+            Document.user_id == current_user.id
+        )
+    )
+    document = result.scalars().first()
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    # A running ingestion job would write chunks after they were deleted
+    if document.status not in (DocumentStatus.INDEXED.value, DocumentStatus.FAILED.value):
+        raise HTTPException(
+            status_code=409,
+            detail="Document is still being indexed. Please retry once it is done."
+        )
+    
+    # Vectors and the file are removed once the row changes are committed
+    freed = await db.run_sync(release_document, document)
+    if freed is not None:
+        await asyncio.to_thread(delete_freed_content, freed)
+    content_freed = freed is not None
+    
+    return DocumentDeleteResponse(
+        document_id=document_id,
+        content_freed=content_freed,
+        message="Document deleted." if content_freed
+        else "Document deleted; its chunks are kept for other documents with the same content."
+    )
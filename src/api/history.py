@@ -1,39 +1,143 @@
 """History API endpoints for fetching user's documents and query history."""
+import asyncio
+import base64
 from typing import Annotated
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.config import get_settings
 from src.models.user import User
 from src.models.history import Document, QueryHistory
-from src.models.history_schemas import DocumentResponse, QueryHistoryResponse
+from src.models.history_schemas import DocumentPage, DocumentResponse, QueryHistoryPage, QueryHistoryResponse
 from src.services.security import get_current_active_user
-from src.database import get_db
+from src.services.vector_store import get_vector_store_service
+from src.database import get_async_db
 
 router = APIRouter(prefix="/history")
+settings = get_settings()
 
 
-@router.get("/documents", response_model=list[DocumentResponse])
+def _encode_cursor(row_id: int) -> str:
+    """Encode the position after a row as an opaque cursor."""
+    return base64.urlsafe_b64encode(str(row_id).encode("ascii")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> int:
+    """Decode a cursor into the id of the last row of the previous page."""
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _page_size(limit: int | None) -> int:
+    """Get the page size for a request, capped at the configured maximum."""
+    if limit is None:
+        return settings.history_page_size
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    return min(limit, settings.history_max_page_size)
+
+
+async def _fetch_page(db: AsyncSession, model, timestamp, user_id: int, limit: int, cursor: str | None):
+    """
+    Fetch one page of a user's rows, newest first, and the cursor of the next page.
+
+    Keyset pagination on (timestamp, id): each page seeks straight to its first
+    row through the (user_id, timestamp, id) index, so deep pages cost the same
+    as the first one. The cursor holds only the id of the previous page's last
+    row, and its timestamp is read back from the table as stored, since a round
+    trip through Python can change its text form on SQLite. If that row was
+    deleted meanwhile, the next older row of the user anchors the page instead.
+    """
+    query = select(model).where(model.user_id == user_id)
+    if cursor is not None:
+        cursor_id = _decode_cursor(cursor)
+        anchor = select(timestamp).where(
+            model.user_id == user_id, model.id <= cursor_id
+        ).order_by(model.id.desc()).limit(1).scalar_subquery()
+        query = query.where(tuple_(timestamp, model.id) < tuple_(anchor, cursor_id))
+
+    result = await db.execute(query.order_by(timestamp.desc(), model.id.desc()).limit(limit + 1))
+    rows = result.scalars().all()
+    if len(rows) <= limit:
+        return rows, None
+    return rows[:limit], _encode_cursor(rows[limit - 1].id)
+
+
+async def _hydrate_sources(items: list[QueryHistoryResponse], user_id: int) -> None:
+    """Fill in the content and metadata of the page's source chunks from the vector store."""
+    chunk_ids = list(dict.fromkeys(
+        source.id
+        for item in items
+        for source in item.sources or []
+        if source.id is not None and source.content is None
+    ))
+    if not chunk_ids:
+        return
+
+    # One lookup for the whole page; chunks deleted since the query stay empty
+    docs = await asyncio.to_thread(get_vector_store_service().get_documents, chunk_ids, user_id)
+    chunks = {doc.id: doc for doc in docs}
+    for item in items:
+        for source in item.sources or []:
+            doc = chunks.get(source.id)
+            if doc is not None and source.content is None:
+                source.content = doc.page_content
+                source.metadata = {key: value for key, value in doc.metadata.items() if key != "score"}
+
+
+@router.get("/documents", response_model=list[DocumentResponse] | DocumentPage)
 async def get_user_documents(
     current_user: Annotated[User, Depends(get_current_active_user)],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    limit: int | None = None,
+    cursor: str | None = None,
+    paginated: bool = False
 ):
-    """Get all documents uploaded by the current user."""
-    documents = db.query(Document).filter(
-        Document.user_id == current_user.id
-    ).order_by(Document.uploaded_at.desc()).all()
-    
-    return documents
+    """
+    Get the documents uploaded by the current user, newest first.
+
+    With `paginated`, returns one page and the cursor of the next one;
+    otherwise returns a list of the latest `limit` documents.
+    """
+    documents, next_cursor = await _fetch_page(
+        db, Document, Document.uploaded_at, current_user.id, _page_size(limit),
+        cursor if paginated else None
+    )
 
+    if not paginated:
+        return documents
+    return DocumentPage(items=documents, next_cursor=next_cursor)
 
-@router.get("/queries", response_model=list[QueryHistoryResponse])
+
+@router.get("/queries", response_model=list[QueryHistoryResponse] | QueryHistoryPage)
 async def get_user_query_history(
     current_user: Annotated[User, Depends(get_current_active_user)],
-    db: Session = Depends(get_db),
-    limit: int = 50
+    db: AsyncSession = Depends(get_async_db),
+    limit: int | None = None,
+    cursor: str | None = None,
+    include_sources: bool = False,
+    paginated: bool = False
 ):
-    """Get query history for the current user."""
-    history = db.query(QueryHistory).filter(
-        QueryHistory.user_id == current_user.id
-    ).order_by(QueryHistory.created_at.desc()).limit(limit).all()
-    
-    return history
+    """
+    Get the current user's query history, newest first.
+
+    With `paginated`, returns one page and the cursor of the next one;
+    otherwise returns a list of the latest `limit` queries.
+
+    Sources are stored as chunk ids and scores. With `include_sources`, their
+    content and metadata are loaded from the vector store.
+    """
+    history, next_cursor = await _fetch_page(
+        db, QueryHistory, QueryHistory.created_at, current_user.id, _page_size(limit),
+        cursor if paginated else None
+    )
+    items = [QueryHistoryResponse.model_validate(row) for row in history]
+    if include_sources:
+        await _hydrate_sources(items, current_user.id)
+
+    if not paginated:
+        return items
+    return QueryHistoryPage(items=items, next_cursor=next_cursor)
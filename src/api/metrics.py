@@ -0,0 +1,52 @@
+"""Prometheus metrics endpoint."""
+from typing import List
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.services.answer_cache import get_answer_cache
+from src.services.history_writer import get_history_writer
+from src.services.ingestion import get_ingestion_service
+from src.services.metrics import MetricFamily, get_metrics
+from src.services.token_cache import get_token_cache
+from src.services.vector_store import get_vector_store_service
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _collect_service_metrics() -> List[MetricFamily]:
+    """Read cache and queue statistics from the services at scrape time."""
+    vector_store_service = get_vector_store_service()
+    caches = {
+        "answer": get_answer_cache().stats(),
+        "auth": get_token_cache().stats(),
+    }
+    embedding_cache_stats = vector_store_service.embedding_cache_stats()
+    if embedding_cache_stats is not None:
+        caches["embedding"] = embedding_cache_stats
+
+    lookups = MetricFamily("rag_cache_lookups_total", "counter", "Cache lookups by result.")
+    entries = MetricFamily("rag_cache_entries", "gauge", "Entries currently held by each cache.")
+    for cache, stats in caches.items():
+        lookups.samples.append(({"cache": cache, "result": "hit"}, stats["hits"]))
+        lookups.samples.append(({"cache": cache, "result": "miss"}, stats["misses"]))
+        entries.samples.append(({"cache": cache}, stats["entries"]))
+
+    queue_depth = MetricFamily("rag_queue_depth", "gauge", "Work waiting in background queues.")
+    queue_depth.samples.append(({"queue": "ingestion"}, get_ingestion_service().queue_depth()))
+    queue_depth.samples.append(({"queue": "history"}, get_history_writer().queue_depth()))
+    embedding_stats = vector_store_service.embedding_stats()
+    if embedding_stats is not None:
+        queue_depth.samples.append(({"queue": "embedding"}, embedding_stats["queue_depth"]))
+
+    return [lookups, entries, queue_depth]
+
+
+get_metrics().register_collector(_collect_service_metrics)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """Export metrics in the Prometheus text exposition format."""
+    return PlainTextResponse(get_metrics().render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,23 +1,51 @@
 """Query endpoint for RAG."""
+import contextlib
+import json
 from typing import Annotated
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
 
-from src.models.schemas import QueryRequest, QueryResponse, Source
+from src.config import get_settings
+from src.models.schemas import BatchQueryRequest, BatchQueryResult, QueryRequest, QueryResponse, Source
 from src.models.user import User
-from src.models.history import QueryHistory
+from src.services.history_writer import get_history_writer
 from src.services.rag_engine import get_rag_engine
 from src.services.security import get_current_active_user
-from src.database import get_db
 
 router = APIRouter()
 
 
+def _sources_json(docs) -> list[dict]:
+    """Serialize source documents for streaming."""
+    return [
+        {
+            "content": doc.page_content,
+            "metadata": doc.metadata
+        }
+        for doc in docs
+    ]
+
+
+def _source_refs(docs) -> list[dict]:
+    """Reference source chunks by id and score for history; the text stays in the vector store."""
+    return [
+        {
+            "id": doc.id,
+            "score": doc.metadata.get("score")
+        }
+        for doc in docs
+    ]
+
+
+def _sse_event(event: str, data) -> str:
+    """Format a Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @router.post("/query", response_model=QueryResponse)
 async def query_documents(
     request: QueryRequest,
-    current_user: Annotated[User, Depends(get_current_active_user)] = None,
-    db: Session = Depends(get_db)
+    current_user: Annotated[User, Depends(get_current_active_user)] = None
 ):
     """
     Query the document store using RAG.
@@ -33,7 +61,7 @@ async def query_documents(
         rag_engine = get_rag_engine()
         
         # Query
-        result = rag_engine.query(request.query, k=request.k)
+        result = await rag_engine.aquery(request.query, current_user.id, k=request.k)
         
         # Format sources
         sources = [
@@ -44,29 +72,135 @@ async def query_documents(
             for doc in result["source_documents"]
         ]
         
-        # Save query history to database
-        sources_json = [
-            {
-                "content": doc.page_content,
-                "metadata": doc.metadata
-            }
-            for doc in result["source_documents"]
-        ]
-        
-        db_history = QueryHistory(
-            user_id=current_user.id,
-            query=request.query,
-            answer=result["answer"],
-            sources=sources_json
+        # Queue query history; it is written to the database in the background
+        await get_history_writer().record(
+            current_user.id, request.query, result["answer"], _source_refs(result["source_documents"])
         )
-        db.add(db_history)
-        db.commit()
         
         return QueryResponse(
             query=request.query,
             answer=result["answer"],
-            sources=sources
+            sources=sources,
+            cached=result["cached"],
+            context=result["context"]
         )
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+
+
+@router.post("/query/stream")
+async def stream_query_documents(
+    request: QueryRequest,
+    current_user: Annotated[User, Depends(get_current_active_user)] = None
+):
+    """
+    Query the document store using RAG, streaming the answer as Server-Sent Events.
+    
+    Events, in order:
+    - `sources`: list of `{content, metadata}` for the retrieved chunks
+    - `token`: `{"text": ...}` for each piece of the answer as it is generated
+    - `done`: `{"answer": ..., "cached": ..., "context": ...}` with the full answer and
+      the context packing stats, after history is queued
+    - `error`: `{"detail": ...}` if the query fails part-way
+    """
+    rag_engine = get_rag_engine()
+    user_id = current_user.id
+    
+    async def event_stream():
+        source_refs = []
+        answer_parts = []
+        cached = False
+        context = None
+        try:
+            async for event, data in rag_engine.astream(request.query, user_id, k=request.k):
+                if event == "sources":
+                    source_refs = _source_refs(data)
+                    yield _sse_event("sources", _sources_json(data))
+                elif event == "cached":
+                    cached = True
+                elif event == "context":
+                    context = data
+                else:
+                    answer_parts.append(data)
+                    yield _sse_event("token", {"text": data})
+            
+            answer = "".join(answer_parts)
+            
+            await get_history_writer().record(user_id, request.query, answer, source_refs)
+            
+            yield _sse_event("done", {"answer": answer, "cached": cached, "context": context})
+        
+        except Exception as e:
+            yield _sse_event("error", {"detail": f"Error processing query: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/query/batch")
+async def batch_query_documents(
+    request: BatchQueryRequest,
+    current_user: Annotated[User, Depends(get_current_active_user)] = None
+):
+    """
+    Query the document store with many questions in one call, streaming answers as NDJSON.
+    
+    All questions are embedded together and retrieved in one pass, then
+    answered with up to `QUERY_BATCH_LLM_CONCURRENCY` concurrent LLM calls.
+    Each line is a `BatchQueryResult`, written as soon as its answer is ready,
+    so lines arrive in completion order; `index` gives the question's position
+    in the request. A question that fails gets a line with `error` set.
+    """
+    settings = get_settings()
+    if len(request.queries) > settings.query_batch_max_queries:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch is limited to {settings.query_batch_max_queries} queries"
+        )
+    
+    rag_engine = get_rag_engine()
+    user_id = current_user.id
+    queries = [item.query for item in request.queries]
+    
+    # Retrieve before responding, so a failure here is still an HTTP error
+    try:
+        retrieved = await rag_engine.aretrieve_many([(item.query, item.k) for item in request.queries], user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing queries: {str(e)}")
+    
+    async def result_lines():
+        # Closing the answers on disconnect cancels the LLM calls still running
+        async with contextlib.aclosing(rag_engine.aanswer_many(queries, retrieved)) as answers:
+            async for index, result in answers:
+                if isinstance(result, Exception):
+                    line = BatchQueryResult(
+                        index=index,
+                        query=queries[index],
+                        error=f"Error processing query: {str(result)}"
+                    )
+                else:
+                    await get_history_writer().record(
+                        user_id, queries[index], result["answer"], _source_refs(result["source_documents"])
+                    )
+                    line = BatchQueryResult(
+                        index=index,
+                        query=queries[index],
+                        answer=result["answer"],
+                        sources=[
+                            Source(content=doc.page_content, metadata=doc.metadata)
+                            for doc in result["source_documents"]
+                        ],
+                        cached=result["cached"],
+                        context=result["context"]
+                    )
+                yield line.model_dump_json() + "\n"
+    
+    return StreamingResponse(
+        result_lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,99 @@
+"""Runtime statistics endpoints for tuning."""
+import asyncio
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException
+
+from src.config import get_settings
+from src.models.schemas import (
+    EmbeddingStatsResponse,
+    EmbeddingCacheStatsResponse,
+    AnswerCacheStatsResponse,
+    AuthCacheStatsResponse,
+    GarbageCollectionResponse,
+    SlowRequestsResponse,
+)
+from src.models.user import User
+from src.services.answer_cache import get_answer_cache
+from src.services.garbage_collector import get_garbage_collector
+from src.services.metrics import get_metrics
+from src.services.security import get_current_active_user
+from src.services.token_cache import get_token_cache
+from src.services.vector_store import get_vector_store_service
+
+router = APIRouter(prefix="/stats")
+settings = get_settings()
+
+
+@router.get("/embeddings", response_model=EmbeddingStatsResponse)
+async def get_embedding_stats():
+    """Get throughput and latency statistics of the embedding micro-batcher."""
+    stats = get_vector_store_service().embedding_stats()
+    if stats is None:
+        return EmbeddingStatsResponse(
+            loaded=False,
+            max_batch_size=settings.embedding_max_batch_size,
+            max_wait_ms=settings.embedding_max_wait_ms,
+        )
+    
+    return EmbeddingStatsResponse(loaded=True, **stats)
+
+
+@router.get("/embedding-cache", response_model=EmbeddingCacheStatsResponse)
+async def get_embedding_cache_stats():
+    """Get hit rate and bytes saved by the persistent embedding cache."""
+    stats = get_vector_store_service().embedding_cache_stats()
+    if stats is None:
+        return EmbeddingCacheStatsResponse(
+            enabled=settings.embedding_cache_enabled,
+            max_bytes=settings.embedding_cache_max_bytes,
+        )
+    
+    return EmbeddingCacheStatsResponse(enabled=True, **stats)
+
+
+@router.get("/answer-cache", response_model=AnswerCacheStatsResponse)
+async def get_answer_cache_stats():
+    """Get hit/miss statistics of the semantic answer cache."""
+    return AnswerCacheStatsResponse(
+        enabled=settings.answer_cache_enabled,
+        **get_answer_cache().stats()
+    )
+
+
+@router.get("/auth-cache", response_model=AuthCacheStatsResponse)
+async def get_auth_cache_stats():
+    """Get hit/miss statistics of the authenticated token cache."""
+    return AuthCacheStatsResponse(
+        enabled=settings.auth_cache_enabled,
+        **get_token_cache().stats()
+    )
+
+
+@router.get("/slow-requests", response_model=SlowRequestsResponse)
+async def get_slow_requests():
+    """Get the stage breakdown of recent sampled slow requests."""
+    metrics = get_metrics()
+    return SlowRequestsResponse(
+        threshold_ms=metrics.slow_request_threshold_ms,
+        sample_rate=metrics.slow_request_sample_rate,
+        traces=metrics.slow_requests(),
+    )
+
+
+@router.get("/gc", response_model=GarbageCollectionResponse)
+async def get_gc_report():
+    """Get what the latest garbage collection run freed."""
+    report = get_garbage_collector().last_report()
+    if report is None:
+        raise HTTPException(status_code=404, detail="Garbage collection has not run yet")
+    
+    return report
+
+
+@router.post("/gc", response_model=GarbageCollectionResponse)
+async def run_gc(current_user: Annotated[User, Depends(get_current_active_user)]):
+    """Run garbage collection and compaction now."""
+    if current_user.email not in settings.gc_operator_emails:
+        raise HTTPException(status_code=403, detail="Only operators can run garbage collection")
+    
+    return await asyncio.to_thread(get_garbage_collector().collect)
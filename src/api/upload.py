@@ -1,47 +1,212 @@
 """File upload endpoint."""
+import asyncio
+import hashlib
 import os
+import posixpath
+import tarfile
 import uuid
-from typing import Annotated
+import zipfile
+from typing import IO, Annotated, Callable, Iterator
 from pathlib import Path
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.config import get_settings
-from src.models.schemas import UploadResponse
+from src.models.schemas import (
+    UploadResponse,
+    DocumentStatusResponse,
+    BatchUploadResult,
+    BatchUploadResponse,
+)
 from src.models.user import User
-from src.models.history import Document
-from src.services.document_processor import DocumentProcessor
-from src.services.vector_store import get_vector_store_service
+from src.models.history import Document, DocumentStatus
+from src.services.content_store import (
+    PendingUpload,
+    delete_freed_content,
+    register_upload,
+    register_uploads,
+    find_indexed_copy,
+)
+from src.services.registry import get_component_registry
+from src.services.ingestion import IngestionBatch, IngestionJob, get_ingestion_service
+from src.services.metrics import get_metrics
 from src.services.security import get_current_active_user
-from src.database import get_db
+from src.database import get_async_db
 
 router = APIRouter()
 settings = get_settings()
 
+UPLOAD_READ_SIZE = 1024 * 1024  # Bytes read from the request per iteration
+ARCHIVE_SUFFIXES = (".zip", ".tar.gz", ".tgz", ".tar")
+MULTIPART_OVERHEAD = 64 * 1024  # Room for boundaries, headers and form fields around the files
 
-@router.post("/upload", response_model=UploadResponse)
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware rejecting upload requests whose declared body is too large.
+
+    Request bodies are parsed before the endpoint runs, so without it an
+    oversize upload would be received and spooled to disk in full before
+    being rejected. Bodies sent without a Content-Length are still checked
+    by the endpoints as they are saved.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.limits = {
+            "/upload": settings.max_file_size,
+            "/upload/batch": settings.batch_upload_max_archive_size,
+        }
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is not None:
+            content_length = dict(scope["headers"]).get(b"content-length")
+            if content_length is not None and content_length.isdigit() and int(content_length) > limit + MULTIPART_OVERHEAD:
+                max_mb = limit / (1024 * 1024)
+                response = JSONResponse(
+                    status_code=413,
+                    content={"detail": f"Upload exceeds maximum allowed size of {max_mb}MB"},
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+def _write_file(read: Callable[[int], bytes], file_path: str, max_size: int) -> tuple[int, str]:
+    """
+    Write what `read` returns to disk piece by piece, returning its size and sha256.
+    
+    Stops reading as soon as more than `max_size` bytes were received, so the
+    returned size then exceeds the limit and the file on disk is partial.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with get_metrics().span("file_save"), open(file_path, "wb") as f:
+        while piece := read(UPLOAD_READ_SIZE):
+            size += len(piece)
+            if size > max_size:
+                break
+            hasher.update(piece)
+            f.write(piece)
+    return size, hasher.hexdigest()
+
+
+async def _save_upload(file: UploadFile, file_path: str, max_size: int) -> tuple[int, str]:
+    """Write an upload to disk with _write_file, off the event loop."""
+    return await asyncio.to_thread(_write_file, file.file.read, file_path, max_size)
+
+
+def _is_archive(filename: str) -> bool:
+    """Check whether an upload is a supported archive."""
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _iter_archive(archive_path: str, filename: str) -> Iterator[tuple[str, int, IO[bytes]]]:
+    """Yield the path, declared size and contents of each regular file in a zip or tar archive."""
+    if filename.lower().endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as member:
+                    yield info.filename, info.file_size, member
+    else:
+        with tarfile.open(archive_path, "r:*") as archive:
+            for info in archive:
+                if not info.isfile():
+                    continue
+                yield info.name, info.size, archive.extractfile(info)
+
+
+def _skipped(filename: str, message: str) -> BatchUploadResult:
+    """Report a file of a batch that was not uploaded."""
+    return BatchUploadResult(filename=filename, status="skipped", message=message)
+
+
+def _logical_path(path_prefix: str | None, name: str) -> str | None:
+    """Get the logical path of a batch member, if the batch is keyed by a prefix."""
+    if path_prefix is None:
+        return None
+    return posixpath.join(path_prefix.strip("/"), name)
+
+
+def _stage_archive(
+    archive_path: str,
+    archive_name: str,
+    supported: set[str],
+    path_prefix: str | None = None,
+) -> tuple[list[PendingUpload], list[BatchUploadResult]]:
+    """
+    Save the supported members of an archive as individual uploads.
+    
+    Members are saved under fresh document ids rather than their archive
+    paths, so entries like `../../etc/passwd` cannot escape the upload directory.
+    """
+    staged, skipped = [], []
+    for name, declared_size, member in _iter_archive(archive_path, archive_name):
+        name = posixpath.normpath("/" + name).lstrip("/")
+        file_extension = Path(name).suffix
+        if file_extension.lower() not in supported:
+            skipped.append(_skipped(name, f"File type {file_extension or '(none)'} not supported"))
+            continue
+        if len(staged) >= settings.batch_upload_max_files:
+            skipped.append(_skipped(name, f"Batch is limited to {settings.batch_upload_max_files} files"))
+            continue
+        if declared_size > settings.max_file_size:
+            skipped.append(_skipped(name, "File exceeds the maximum file size"))
+            continue
+        
+        document_id = str(uuid.uuid4())
+        file_path = os.path.join(settings.upload_directory, f"{document_id}{file_extension}")
+        file_size, content_hash = _write_file(member.read, file_path, settings.max_file_size)
+        if file_size > settings.max_file_size:
+            os.remove(file_path)
+            skipped.append(_skipped(name, "File exceeds the maximum file size"))
+            continue
+        
+        staged.append(PendingUpload(
+            document_id=document_id,
+            filename=name,
+            file_size=file_size,
+            content_hash=content_hash,
+            file_type=file_extension.lower(),
+            file_path=file_path,
+            path=_logical_path(path_prefix, name),
+        ))
+    return staged, skipped
+
+
+@router.post("/upload", response_model=UploadResponse, status_code=202)
 async def upload_file(
     file: UploadFile = File(...),
+    path: str | None = Form(None),
     current_user: Annotated[User, Depends(get_current_active_user)] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload a file for processing and storage in the vector database.
     
+    The file is saved and queued for chunking and embedding in the background.
+    Poll `GET /upload/{document_id}/status` to follow its progress. Files whose
+    bytes the user uploaded before are linked to the existing chunks instead, and
+    bytes another user already indexed are copied without re-embedding.
+    
+    Pass a logical `path` (e.g. `src/app.py`) to update a file in place: a later
+    upload to the same path keeps the document_id, and only chunks that changed
+    since the previous version are embedded.
+    
     Supported file types: .py, .js, .java, .cpp, .c, .go, .rs, .txt, .md
     Maximum file size: 10MB
     """
     try:
-        # Get file size
-        file.file.seek(0, 2)  # Seek to end
-        file_size = file.file.tell()
-        file.file.seek(0)  # Reset to beginning
+        # Get shared processor
+        processor = get_component_registry().document_processor
         
-        # Initialize processor
-        processor = DocumentProcessor()
-        
-        # Validate file
-        is_valid, message = processor.validate_file(file.filename, file_size)
+        # Validate file type before reading the body
+        is_valid, message = processor.validate_file(file.filename, 0)
         if not is_valid:
             raise HTTPException(status_code=400, detail=message)
         
@@ -56,41 +221,255 @@ async def upload_file(
         saved_filename = f"{document_id}{file_extension}"
         file_path = os.path.join(settings.upload_directory, saved_filename)
         
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        file_size, content_hash = await _save_upload(file, file_path, settings.max_file_size)
         
-        # Process file into chunks
-        chunks = processor.process_file(file_path, file.filename)
-        
-        # Add document ID to metadata
-        for chunk in chunks:
-            chunk.metadata["document_id"] = document_id
-        
-        # Store in vector database
-        vector_store = get_vector_store_service()
-        vector_store.add_documents(chunks)
+        # Validate size, rejecting oversize files as soon as the limit was crossed
+        is_valid, message = processor.validate_file(file.filename, file_size)
+        if not is_valid:
+            os.remove(file_path)
+            raise HTTPException(status_code=400, detail=message)
         
-        # Save document metadata to database
-        db_document = Document(
+        # Save document metadata, linking to existing content for duplicate bytes
+        registration = await db.run_sync(
+            register_upload,
             user_id=current_user.id,
             document_id=document_id,
             filename=file.filename,
             file_size=file_size,
-            chunks_created=len(chunks)
+            content_hash=content_hash,
+            file_type=file_extension.lower(),
+            file_path=file_path,
+            path=path,
         )
-        db.add(db_document)
-        db.commit()
+        db_document, content = registration.document, registration.content
+        if content.file_path != file_path:
+            os.remove(file_path)
+        if registration.freed is not None:
+            await asyncio.to_thread(delete_freed_content, registration.freed)
+        
+        if not registration.needs_ingestion:
+            return UploadResponse(
+                status=db_document.status,
+                filename=file.filename,
+                document_id=db_document.document_id,
+                chunks_created=db_document.chunks_created or 0,
+                message="Identical file already uploaded; reusing its chunks."
+            )
+        
+        # Another user may already have these bytes indexed
+        indexed_copy = await db.run_sync(find_indexed_copy, content)
+        copy_from = (
+            (indexed_copy.user_id, indexed_copy.vector_document_id)
+            if indexed_copy is not None else None
+        )
+        
+        # Hand off chunking and embedding to the background workers
+        try:
+            get_ingestion_service().submit(IngestionJob(
+                content.id,
+                current_user.id,
+                content.vector_document_id,
+                content.file_path,
+                file.filename,
+                retry=content.vector_document_id != document_id,
+                copy_from=copy_from,
+                previous_content_id=registration.previous.id if registration.previous else None,
+            ))
+        except asyncio.QueueFull:
+            await db.execute(
+                update(Document).where(Document.content_id == content.id).values(
+                    status=DocumentStatus.FAILED.value,
+                    error="Ingestion queue is full"
+                )
+            )
+            await db.commit()
+            raise HTTPException(
+                status_code=503,
+                detail="Too many uploads are being processed. Please retry shortly."
+            )
         
         return UploadResponse(
-            status="success",
+            status=DocumentStatus.QUEUED.value,
             filename=file.filename,
-            document_id=document_id,
-            chunks_created=len(chunks),
-            message=f"File uploaded and processed successfully. Created {len(chunks)} chunks."
+            document_id=db_document.document_id,
+            chunks_created=0,
+            message="File uploaded and queued for processing."
         )
     
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+
+
+@router.post("/upload/batch", response_model=BatchUploadResponse, status_code=202)
+async def upload_batch(
+    files: list[UploadFile] = File(...),
+    path_prefix: str | None = Form(None),
+    current_user: Annotated[User, Depends(get_current_active_user)] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Upload many files, or a single .zip/.tar.gz archive, in one request.
+    
+    Files whose type is not supported are skipped and reported. The rest are
+    recorded in one transaction and indexed as a single background batch:
+    chunked in parallel processes, then embedded and stored in large batches.
+    Each result carries a `document_id` to poll `GET /upload/{document_id}/status`.
+    
+    With a `path_prefix` (e.g. the repository name), each file is stored at the
+    logical path `<path_prefix>/<name>`, so re-uploading the batch only
+    re-embeds the chunks of files that changed.
+    """
+    try:
+        # Get shared processor
+        processor = get_component_registry().document_processor
+        supported = set(processor.language_map)
+        
+        # Create upload directory if it doesn't exist
+        os.makedirs(settings.upload_directory, exist_ok=True)
+        
+        if len(files) == 1 and _is_archive(files[0].filename):
+            archive_path = os.path.join(settings.upload_directory, f"{uuid.uuid4()}.archive")
+            try:
+                archive_size, _ = await _save_upload(
+                    files[0], archive_path, settings.batch_upload_max_archive_size
+                )
+                if archive_size > settings.batch_upload_max_archive_size:
+                    max_mb = settings.batch_upload_max_archive_size / (1024 * 1024)
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Archive exceeds maximum allowed size of {max_mb}MB"
+                    )
+                # Extraction is blocking file I/O, so keep it off the event loop
+                staged, results = await asyncio.to_thread(
+                    _stage_archive, archive_path, files[0].filename, supported, path_prefix
+                )
+            except (zipfile.BadZipFile, tarfile.TarError):
+                raise HTTPException(status_code=400, detail="Invalid or corrupt archive")
+            finally:
+                if os.path.exists(archive_path):
+                    os.remove(archive_path)
+        else:
+            if len(files) > settings.batch_upload_max_files:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Batch is limited to {settings.batch_upload_max_files} files"
+                )
+            staged, results = [], []
+            for file in files:
+                file_extension = Path(file.filename).suffix
+                if file_extension.lower() not in supported:
+                    results.append(_skipped(file.filename, f"File type {file_extension or '(none)'} not supported"))
+                    continue
+                
+                document_id = str(uuid.uuid4())
+                file_path = os.path.join(settings.upload_directory, f"{document_id}{file_extension}")
+                file_size, content_hash = await _save_upload(file, file_path, settings.max_file_size)
+                if file_size > settings.max_file_size:
+                    os.remove(file_path)
+                    results.append(_skipped(file.filename, "File exceeds the maximum file size"))
+                    continue
+                
+                staged.append(PendingUpload(
+                    document_id=document_id,
+                    filename=file.filename,
+                    file_size=file_size,
+                    content_hash=content_hash,
+                    file_type=file_extension.lower(),
+                    file_path=file_path,
+                    path=_logical_path(path_prefix, file.filename),
+                ))
+        skipped = len(results)
+        
+        # Record every file in one transaction
+        jobs = []
+        registrations = await db.run_sync(register_uploads, current_user.id, staged)
+        for upload, registration in zip(staged, registrations):
+            db_document, content = registration.document, registration.content
+            if content.file_path != upload.file_path:
+                os.remove(upload.file_path)
+            if registration.freed is not None:
+                await asyncio.to_thread(delete_freed_content, registration.freed)
+            
+            if not registration.needs_ingestion:
+                results.append(BatchUploadResult(
+                    filename=upload.filename,
+                    document_id=db_document.document_id,
+                    status=db_document.status,
+                    chunks_created=db_document.chunks_created or 0,
+                    message="Identical file already uploaded; reusing its chunks."
+                ))
+                continue
+            
+            indexed_copy = await db.run_sync(find_indexed_copy, content)
+            jobs.append(IngestionJob(
+                content.id,
+                current_user.id,
+                content.vector_document_id,
+                content.file_path,
+                upload.filename,
+                retry=content.vector_document_id != upload.document_id,
+                copy_from=(
+                    (indexed_copy.user_id, indexed_copy.vector_document_id)
+                    if indexed_copy is not None else None
+                ),
+                previous_content_id=registration.previous.id if registration.previous else None,
+            ))
+            results.append(BatchUploadResult(
+                filename=upload.filename,
+                document_id=db_document.document_id,
+                status=DocumentStatus.QUEUED.value,
+                message="File uploaded and queued for processing."
+            ))
+        
+        # Hand off the whole batch to the background workers
+        if jobs:
+            try:
+                get_ingestion_service().submit(IngestionBatch(jobs))
+            except asyncio.QueueFull:
+                await db.execute(
+                    update(Document).where(
+                        Document.content_id.in_([job.content_id for job in jobs])
+                    ).values(
+                        status=DocumentStatus.FAILED.value,
+                        error="Ingestion queue is full"
+                    ).execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many uploads are being processed. Please retry shortly."
+                )
+        
+        return BatchUploadResponse(
+            total=len(results),
+            queued=len(jobs),
+            skipped=skipped,
+            results=results,
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing files: {str(e)}")
+
+
+@router.get("/upload/{document_id}/status", response_model=DocumentStatusResponse)
+async def get_upload_status(
+    document_id: str,
+    current_user: Annotated[User, Depends(get_current_active_user)] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the ingestion status of an uploaded document."""
+    result = await db.execute(
+        select(Document).where(
+            Document.document_id == document_id,
+            Document.user_id == current_user.id
+        )
+    )
+    document = result.scalars().first()
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    return document
@@ -8,16 +8,44 @@ class Settings(BaseSettings):
     # API Settings
     app_name: str = "RAG FastAPI"
     debug: bool = True
+    log_level: str = "INFO"
+    
+    # Observability Settings
+    slow_request_threshold_ms: float = 2000.0  # Requests slower than this are traced
+    slow_request_sample_rate: float = 1.0  # Fraction of slow requests whose trace is kept
+    slow_request_traces_max: int = 100  # Latest traces kept for /stats/slow-requests
     
     # Google Gemini Settings
     google_api_key: str | None = None
     
     # Embedding Settings
     embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embedding_backend: str = "torch"  # "torch", "onnx" or "onnx-int8"
+    embedding_threads: int = 0  # Intra-op threads of the model runtime; 0 keeps its default
+    embedding_onnx_file: str | None = None  # ONNX file in the model repo; default picks one for the backend
+    onnx_model_directory: str = "./onnx_models"  # Where locally quantized models are kept
+    embedding_server_socket: str | None = None  # Unix socket of a shared embedding server; unset loads the model in-process
+    embedding_server_connect_timeout: float = 30.0  # How long a worker waits for the server to come up
+    embedding_max_batch_size: int = 64  # Max texts per model forward pass
+    embedding_max_wait_ms: float = 5.0  # How long a batch waits for more callers
+    embedding_cache_enabled: bool = True
+    embedding_cache_directory: str = "./embedding_cache"
+    embedding_cache_max_bytes: int = 256 * 1024 * 1024  # 256MB of float32 vectors
+    warmup_enabled: bool = True  # Load the model and stores at startup; /ready waits for it
     
     # Vector Store Settings
+    vector_backend: str = "chroma"  # "chroma" or "native"
     chroma_persist_directory: str = "./chroma_data"
     collection_name: str = "documents"
+    native_vector_directory: str = "./native_vectors"  # Memory-mapped vector files of the native backend
+    native_hnsw_threshold: int = 20000  # Chunks of a user above which native searches use HNSW; 0 never does
+    native_hnsw_ef_search: int = 64  # HNSW candidate list size; higher is more accurate and slower
+    
+    # Hybrid Retrieval Settings
+    lexical_index_directory: str = "./lexical_index"
+    hybrid_search_enabled: bool = True  # Fuse BM25 and vector results
+    hybrid_candidate_k: int = 20  # Candidates taken from each retriever before fusion
+    rrf_k: int = 60  # Reciprocal rank fusion smoothing constant
     
     # File Upload Settings
     upload_directory: str = "./uploads"
@@ -27,16 +55,67 @@ class Settings(BaseSettings):
     chunk_size: int = 1000
     chunk_overlap: int = 200
     
+    # Ingestion Settings
+    ingestion_workers: int = 2  # Threads chunking and embedding uploads
+    ingestion_queue_size: int = 100  # Max uploads waiting for a worker
+    ingestion_batch_size: int = 256  # Chunks embedded and stored per vector store write
+    chunking_processes: int = 0  # Processes chunking batch uploads; 0 uses every CPU core
+    
+    # Batch Upload Settings
+    batch_upload_max_files: int = 10000
+    batch_upload_max_archive_size: int = 512 * 1024 * 1024  # 512MB
+    
+    # Garbage Collection Settings
+    gc_interval_seconds: float = 3600.0  # How often to reclaim space; 0 disables
+    gc_grace_seconds: float = 3600.0  # Min age of an unreferenced upload file before removal
+    gc_vacuum: bool = False  # Also VACUUM the SQLite database, which blocks its writers meanwhile
+    gc_operator_emails: list[str] = []  # Users allowed to run collection through POST /stats/gc
+    
     # RAG Settings
     retrieval_k: int = 4  # Number of documents to retrieve
     llm_model: str = "gemini-2.5-flash"
     llm_temperature: float = 0.0
+    context_token_budget: int = 3000  # Max tokens of retrieved context in the prompt
+    context_encoding: str = "cl100k_base"  # tiktoken encoding estimating prompt tokens
+    context_dedup_threshold: float = 0.9  # Share of a chunk's shingles found in a better one that makes it a duplicate
+    
+    # Batch Query Settings
+    query_batch_max_queries: int = 500  # Max questions in one /query/batch request
+    query_batch_llm_concurrency: int = 8  # LLM calls a batch runs at once
+    
+    # Answer Cache Settings
+    answer_cache_enabled: bool = True
+    answer_cache_similarity_threshold: float = 0.95  # Min cosine similarity between queries
+    answer_cache_ttl_seconds: float = 3600.0
+    answer_cache_max_entries: int = 1000
+    
+    # History Settings
+    history_page_size: int = 50  # Default page size of the history endpoints
+    history_max_page_size: int = 200
+    history_write_behind_enabled: bool = True  # Queue history rows and insert them in batches
+    history_queue_size: int = 10000  # Rows waiting for a flush before queries wait for room
+    history_flush_max_rows: int = 500  # Rows inserted per transaction
+    history_flush_interval_ms: float = 200.0  # Max time a row waits for more to batch with
+    
+    # Database Settings
+    database_url: str = "sqlite:///./rag_users.db"  # Also accepts postgresql:// DSNs
+    database_pool_size: int = 5  # Connections kept open per engine
+    database_max_overflow: int = 10  # Extra connections allowed under load
+    database_pool_timeout: float = 30.0  # Seconds to wait for a free connection
+    database_pool_recycle: int = 1800  # Reopen connections older than this many seconds
+    sqlite_journal_mode: str = "WAL"  # Lets readers proceed while a write is in progress
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000  # How long a writer waits for the lock
+    sqlite_cache_size_kb: int = 64 * 1024  # Page cache per connection
     
     # Authentication Settings
-    database_url: str = "sqlite:///./rag_users.db"
     jwt_secret_key: str = "your-secret-key-change-in-production-please-use-a-random-string"
     jwt_algorithm: str = "HS256"
     jwt_expiration_minutes: int = 60 * 24 * 7  # 7 days
+    auth_cache_enabled: bool = True  # Skip the user lookup for recently validated tokens
+    auth_cache_ttl_seconds: float = 60.0  # Max time a user change takes to apply to cached tokens
+    auth_cache_max_entries: int = 10000
+    password_hash_workers: int = 2  # Threads hashing and verifying passwords off the event loop
     
     class Config:
         env_file = ".env"
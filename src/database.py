@@ -1,23 +1,148 @@
 """Database configuration and session management."""
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from src.config import get_settings
 
 settings = get_settings()
 
-# Create SQLAlchemy engine
+# Drivers used by background workers and by request handlers, per backend
+SYNC_DRIVERS = {
+    "sqlite": "sqlite",
+    "postgresql": "postgresql+psycopg2",
+}
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+ASYNC_DRIVER_NAMES = {"aiosqlite", "asyncpg", "psycopg"}
+
+
+def _parse_url(database_url: str) -> URL:
+    """Parse a database URL, accepting the `postgres://` scheme used by many hosts."""
+    if database_url.startswith("postgres://"):
+        database_url = "postgresql://" + database_url[len("postgres://"):]
+    return make_url(database_url)
+
+
+def _explicit_driver(url: URL) -> str:
+    """Get the driver named in a URL, or "" when it relies on the backend's default."""
+    return url.drivername.partition("+")[2]
+
+
+def sync_database_url(database_url: str) -> URL:
+    """Get the URL the synchronous engine (background workers) connects with."""
+    url = _parse_url(database_url)
+    driver = _explicit_driver(url)
+    if driver and driver not in ASYNC_DRIVER_NAMES - {"psycopg"}:
+        return url
+    return url.set(drivername=SYNC_DRIVERS.get(url.get_backend_name(), url.get_backend_name()))
+
+
+def async_database_url(database_url: str) -> URL:
+    """Get the URL the async engine (request handlers) connects with."""
+    url = _parse_url(database_url)
+    if _explicit_driver(url) in ASYNC_DRIVER_NAMES:
+        return url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend}'")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def _engine_options(url: URL) -> dict:
+    """Get pool options for an engine, which in-memory SQLite databases can't use."""
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    options = {
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_timeout": settings.database_pool_timeout,
+        "pool_recycle": settings.database_pool_recycle,
+    }
+    if url.get_backend_name() != "sqlite":
+        options["pool_pre_ping"] = True
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune each new SQLite connection so readers don't block the writer."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.sqlite_cache_size_kb}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+# Create SQLAlchemy engine (used by background workers in threads)
+sync_url = sync_database_url(settings.database_url)
 engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False}  # Needed for SQLite
+    sync_url,
+    connect_args={"check_same_thread": False} if sync_url.get_backend_name() == "sqlite" else {},
+    **_engine_options(sync_url),
 )
 
-# Create SessionLocal class
+# Create async engine (used by request handlers on the event loop)
+async_url = async_database_url(settings.database_url)
+async_engine = create_async_engine(async_url, **_engine_options(async_url))
+
+if sync_url.get_backend_name() == "sqlite":
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Create Base class for models
 Base = declarative_base()
 
+# Columns added to tables that already existed in deployed databases, as
+# (table, column, column DDL, statement backfilling existing rows or None)
+COLUMN_MIGRATIONS = [
+    # Documents uploaded before the ingestion pipeline were indexed during the upload
+    ("documents", "status", "VARCHAR NOT NULL DEFAULT 'indexed'", None),
+    ("documents", "error", "TEXT", None),
+    ("documents", "content_id", "INTEGER REFERENCES document_contents (id)", None),
+    ("documents", "path", "VARCHAR", None),
+    (
+        "document_contents", "user_id", "INTEGER REFERENCES users (id)",
+        "UPDATE document_contents SET user_id = (SELECT documents.user_id FROM documents"
+        " WHERE documents.content_id = document_contents.id LIMIT 1) WHERE user_id IS NULL",
+    ),
+]
+
+
+def _migrate_columns():
+    """Add the columns of COLUMN_MIGRATIONS that an existing database lacks."""
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table, column, ddl, backfill in COLUMN_MIGRATIONS:
+            if not inspector.has_table(table):
+                continue
+            if column in {existing["name"] for existing in inspector.get_columns(table)}:
+                continue
+            connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+            if backfill is not None:
+                connection.exec_driver_sql(backfill)
+            inspector.clear_cache()
+
+
+def create_tables():
+    """
+    Create missing tables, add columns introduced since an existing table was
+    created, then create indexes added to the models since.
+    """
+    Base.metadata.create_all(bind=engine)
+    _migrate_columns()
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
 
 def get_db():
     """Dependency for getting database session."""
@@ -26,3 +151,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Dependency for getting an async database session."""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,19 +1,55 @@
 """FastAPI application main entry point."""
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
 
 from src.config import get_settings
-from src.models.schemas import HealthResponse
-from src.api import upload, query, auth, history
-from src.database import engine, Base
+from src.models.schemas import HealthResponse, ReadinessResponse
+from src.api import upload, query, auth, history, stats, documents, metrics
+from src.api.upload import UploadSizeLimitMiddleware
+from src.database import async_engine, create_tables
+from src.services.garbage_collector import get_garbage_collector
+from src.services.history_writer import get_history_writer
+from src.services.ingestion import get_ingestion_service
+from src.services.metrics import MetricsMiddleware
+from src.services.vector_store import get_vector_store_service
+from src.services.warmup import get_warmup_service
 
 # Get settings
 settings = get_settings()
 
+# Configure logging
+logging.basicConfig(
+    level=settings.log_level.upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+
 # Create database tables
-Base.metadata.create_all(bind=engine)
+create_tables()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background services on startup and stop them on shutdown."""
+    warmup_service = get_warmup_service()
+    ingestion_service = get_ingestion_service()
+    garbage_collector = get_garbage_collector()
+    history_writer = get_history_writer()
+    await warmup_service.start()
+    await history_writer.start()
+    await ingestion_service.start()
+    await garbage_collector.start()
+    yield
+    await warmup_service.stop()
+    await garbage_collector.stop()
+    await ingestion_service.stop()
+    await history_writer.stop()
+    get_vector_store_service().close()
+    await async_engine.dispose()
+
 
 # Create FastAPI app
 app = FastAPI(
@@ -22,6 +58,7 @@ app = FastAPI(
     version="0.1.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -33,6 +70,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversize uploads before their body is received
+app.add_middleware(UploadSizeLimitMiddleware)
+
+# Time every request and trace its pipeline stages
+app.add_middleware(MetricsMiddleware)
+
 # Mount static files (dashboard)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -41,6 +84,9 @@ app.include_router(auth.router, tags=["Authentication"])
 app.include_router(upload.router, tags=["Upload"])
 app.include_router(query.router, tags=["Query"])
 app.include_router(history.router, tags=["History"])
+app.include_router(documents.router, tags=["Documents"])
+app.include_router(stats.router, tags=["Stats"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 
 @app.get("/")
@@ -51,7 +97,7 @@ async def root():
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Health check endpoint."""
+    """Health check endpoint (liveness: the process is up)."""
     return HealthResponse(
         status="healthy",
         app_name=settings.app_name,
@@ -59,6 +105,15 @@ async def health_check():
     )
 
 
+@app.get("/ready", response_model=ReadinessResponse)
+async def readiness_check(response: Response):
+    """Readiness endpoint: 200 once startup warm-up finished, 503 until then."""
+    status = get_warmup_service().status()
+    if not status["ready"]:
+        response.status_code = 503
+    return ReadinessResponse(**status)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,37 +1,79 @@
 """Database models for chat history and documents."""
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
+from enum import Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, UniqueConstraint, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from src.database import Base
 
 
+class DocumentStatus(str, Enum):
+    """Lifecycle states of an uploaded document in the ingestion pipeline."""
+    
+    QUEUED = "queued"
+    CHUNKING = "chunking"
+    EMBEDDING = "embedding"
+    INDEXED = "indexed"
+    FAILED = "failed"
+
+
+class DocumentContent(Base):
+    """Model for deduplicated file contents shared by one or more of a user's documents."""
+    
+    __tablename__ = "document_contents"
+    __table_args__ = (UniqueConstraint("user_id", "content_hash", "file_type"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # Owner of the vector collection
+    content_hash = Column(String, index=True, nullable=False)  # sha256 of the file bytes
+    file_type = Column(String, nullable=False)  # Chunking depends on the extension
+    vector_document_id = Column(String, nullable=False)  # document_id on the chunks in the vector store
+    file_path = Column(String, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationship
+    documents = relationship("Document", back_populates="content")
+
+
 class Document(Base):
     """Model for tracking uploaded documents per user."""
     
     __tablename__ = "documents"
+    __table_args__ = (
+        Index("ix_documents_user_id_path", "user_id", "path"),
+        Index("ix_documents_user_id_uploaded_at", "user_id", "uploaded_at", "id"),  # Keyset pagination
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    content_id = Column(Integer, ForeignKey("document_contents.id"), index=True)
     document_id = Column(String, unique=True, index=True, nullable=False)
+    path = Column(String)  # Optional logical path; re-uploads to it update this document
     filename = Column(String, nullable=False)
     file_size = Column(Integer)
     chunks_created = Column(Integer)
+    status = Column(String, nullable=False, default=DocumentStatus.QUEUED.value)
+    error = Column(Text)
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    # Relationship
+    # Relationships
     user = relationship("User", back_populates="documents")
+    content = relationship("DocumentContent", back_populates="documents")
 
 
 class QueryHistory(Base):
     """Model for storing query/chat history per user."""
     
     __tablename__ = "query_history"
+    __table_args__ = (
+        Index("ix_query_history_user_id_created_at", "user_id", "created_at", "id"),  # Keyset pagination
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     query = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
-    sources = Column(JSON)  # Store source documents as JSON
+    sources = Column(JSON)  # [{"id", "score"}] per source chunk; older rows hold {"content", "metadata"}
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationship
@@ -7,22 +7,44 @@ class DocumentResponse(BaseModel):
     """Schema for document information."""
     id: int
     document_id: str
+    path: str | None = None
     filename: str
     file_size: int | None
     chunks_created: int | None
+    status: str | None = None
     uploaded_at: datetime
     
     class Config:
         from_attributes = True
 
 
+class DocumentPage(BaseModel):
+    """Schema for a page of documents, newest first."""
+    items: list[DocumentResponse]
+    next_cursor: str | None = None  # Pass as `cursor` to get the next page; None on the last page
+
+
+class HistorySource(BaseModel):
+    """Schema for a source chunk of a past query."""
+    id: str | None = None  # Chunk id in the vector store
+    score: float | None = None  # Retrieval score the chunk was ranked by
+    content: str | None = None  # Only with include_sources, and None once the chunk was deleted
+    metadata: dict | None = None
+
+
 class QueryHistoryResponse(BaseModel):
     """Schema for query history."""
     id: int
     query: str
     answer: str
-    sources: list | None
+    sources: list[HistorySource] | None
     created_at: datetime
     
     class Config:
         from_attributes = True
+
+
+class QueryHistoryPage(BaseModel):
+    """Schema for a page of query history, newest first."""
+    items: list[QueryHistoryResponse]
+    next_cursor: str | None = None  # Pass as `cursor` to get the next page; None on the last page
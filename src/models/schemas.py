@@ -1,4 +1,5 @@
 """Pydantic models for request and response validation."""
+from datetime import datetime
 from pydantic import BaseModel, Field
 
 
@@ -11,27 +12,198 @@ class UploadResponse(BaseModel):
     message: str
 
 
+class BatchUploadResult(BaseModel):
+    """Outcome of one file in a batch upload."""
+    filename: str
+    document_id: str | None = None
+    status: str
+    chunks_created: int = 0
+    message: str
+
+
+class BatchUploadResponse(BaseModel):
+    """Response model for batch upload."""
+    total: int
+    queued: int
+    skipped: int
+    results: list[BatchUploadResult]
+
+
+class DocumentStatusResponse(BaseModel):
+    """Response model for document ingestion status."""
+    document_id: str
+    path: str | None = None
+    filename: str
+    status: str
+    chunks_created: int | None = None
+    error: str | None = None
+    uploaded_at: datetime | None = None
+    
+    class Config:
+        from_attributes = True
+
+
+class DocumentDeleteResponse(BaseModel):
+    """Response model for document deletion."""
+    document_id: str
+    content_freed: bool  # False while other documents share the same bytes
+    message: str
+
+
 class QueryRequest(BaseModel):
     """Request model for RAG query."""
     query: str = Field(..., min_length=1, description="The question to ask")
     k: int = Field(default=4, ge=1, le=10, description="Number of documents to retrieve")
 
 
+class BatchQueryRequest(BaseModel):
+    """Request model for batch RAG queries."""
+    queries: list[QueryRequest] = Field(..., min_length=1, description="The questions to ask")
+
+
 class Source(BaseModel):
     """Source document information."""
     content: str
     metadata: dict
 
 
+class ContextStats(BaseModel):
+    """How the retrieved chunks were packed into the prompt."""
+    chunks: int  # Chunks retrieved
+    spans: int  # Spans of text in the prompt
+    merged_chunks: int  # Chunks merged into an overlapping chunk of the same document
+    duplicates_dropped: int  # Spans left out as near-duplicates of a better one
+    truncated_spans: int  # Spans cut to fit the budget
+    over_budget_spans: int  # Spans left out for lack of budget
+    unpacked_tokens: int  # Tokens the chunks would take joined as retrieved
+    tokens: int  # Tokens of the packed context
+    token_budget: int
+
+
 class QueryResponse(BaseModel):
     """Response model for RAG query."""
     query: str
     answer: str
     sources: list[Source]
+    cached: bool = False
+    context: ContextStats | None = None  # None when no prompt was built (cached answer or no LLM)
+
+
+class BatchQueryResult(BaseModel):
+    """One answered question of a batch query, streamed as an NDJSON line."""
+    index: int  # Position of the question in the request
+    query: str
+    answer: str | None = None
+    sources: list[Source] = []
+    cached: bool = False
+    context: ContextStats | None = None
+    error: str | None = None  # Set when this question failed; the others still get answers
     
 
+class LatencySummary(BaseModel):
+    """Latency percentiles in milliseconds."""
+    p50: float
+    p99: float
+
+
+class EmbeddingStatsResponse(BaseModel):
+    """Micro-batching statistics of the embedding service."""
+    loaded: bool
+    max_batch_size: int
+    max_wait_ms: float
+    batches: int = 0
+    texts: int = 0
+    queue_depth: int = 0
+    avg_batch_size: float = 0.0
+    throughput_per_sec: float = 0.0
+    model_throughput_per_sec: float = 0.0
+    request_latency_ms: LatencySummary = LatencySummary(p50=0.0, p99=0.0)
+    batch_latency_ms: LatencySummary = LatencySummary(p50=0.0, p99=0.0)
+
+
+class EmbeddingCacheStatsResponse(BaseModel):
+    """Statistics of the persistent embedding cache."""
+    enabled: bool
+    hits: int = 0
+    misses: int = 0
+    hit_rate: float = 0.0
+    bytes_saved: int = 0
+    entries: int = 0
+    capacity: int = 0
+    size_bytes: int = 0
+    max_bytes: int = 0
+
+
+class AnswerCacheStatsResponse(BaseModel):
+    """Statistics of the semantic answer cache."""
+    enabled: bool
+    hits: int
+    misses: int
+    hit_rate: float
+    entries: int
+    max_entries: int
+    invalidations: int
+    expirations: int
+    evictions: int
+
+
+class AuthCacheStatsResponse(BaseModel):
+    """Statistics of the authenticated token cache."""
+    enabled: bool
+    hits: int
+    misses: int
+    hit_rate: float
+    entries: int
+    max_entries: int
+    ttl_seconds: float
+    invalidations: int
+    expirations: int
+    evictions: int
+
+
+class GarbageCollectionResponse(BaseModel):
+    """Report of a garbage collection and compaction run."""
+    ran_at: datetime
+    skipped: str | None = None
+    contents_freed: int
+    orphan_chunks_deleted: int
+    orphan_files_deleted: int
+    upload_bytes_freed: int
+    database_bytes_freed: int
+    vector_store_bytes_before: int
+    vector_store_bytes_after: int
+    duration_ms: float
+
+
+class SlowRequestTrace(BaseModel):
+    """Stage breakdown of a sampled slow request."""
+    at: datetime
+    method: str
+    route: str
+    status: int
+    duration_ms: float
+    stages_ms: dict[str, float]
+
+
+class SlowRequestsResponse(BaseModel):
+    """Sampled slow requests, newest first."""
+    threshold_ms: float
+    sample_rate: float
+    traces: list[SlowRequestTrace]
+
+
 class HealthResponse(BaseModel):
     """Health check response."""
     status: str
     app_name: str
     version: str
+
+
+class ReadinessResponse(BaseModel):
+    """Readiness probe response with the state of startup warm-up."""
+    ready: bool
+    state: str
+    started_at: datetime | None = None
+    duration_ms: float | None = None
+    steps_ms: dict[str, float] = {}
+    error: str | None = None
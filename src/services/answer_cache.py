@@ -0,0 +1,169 @@
+"""Semantic cache of LLM answers for repeated and near-duplicate queries."""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List
+
+import numpy as np
+
+from src.config import get_settings
+
+
+@dataclass
+class _AnswerEntry:
+    """A cached answer and what it was generated from."""
+    embedding: np.ndarray  # Unit-length query embedding
+    document_ids: frozenset[str]
+    answer: str
+    expires_at: float
+
+
+class AnswerCache:
+    """
+    Cache LLM answers keyed by query embedding and retrieved documents.
+
+    A lookup hits when an unexpired entry was generated from exactly the same
+    set of document ids and its query embedding has cosine similarity of at
+    least `similarity_threshold` with the new query. Entries are evicted in LRU
+    order beyond `max_entries`, expire after `ttl_seconds` and are dropped as
+    soon as any document they were built from is re-indexed or deleted.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, similarity_threshold: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: OrderedDict[int, _AnswerEntry] = OrderedDict()
+        self._by_scope: dict[frozenset[str], set[int]] = {}
+        self._by_document: dict[str, set[int]] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+        # Statistics
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._expirations = 0
+        self._evictions = 0
+
+    def lookup(self, embedding: List[float], document_ids: Iterable[str]) -> str | None:
+        """Get a cached answer for a similar query over the same documents."""
+        scope = frozenset(document_ids)
+        query = self._normalize(embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            best_id, best_score = None, self.similarity_threshold
+            for entry_id in list(self._by_scope.get(scope, ())):
+                entry = self._entries[entry_id]
+                if entry.expires_at <= now:
+                    self._remove(entry_id)
+                    self._expirations += 1
+                    continue
+                score = float(np.dot(query, entry.embedding))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self._misses += 1
+                return None
+
+            self._hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id].answer
+
+    def store(self, embedding: List[float], document_ids: Iterable[str], answer: str) -> None:
+        """Cache an answer generated for a query over the given documents."""
+        if self.max_entries <= 0:
+            return
+        scope = frozenset(document_ids)
+        entry = _AnswerEntry(
+            embedding=self._normalize(embedding),
+            document_ids=scope,
+            answer=answer,
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = entry
+            self._by_scope.setdefault(scope, set()).add(entry_id)
+            for document_id in scope:
+                self._by_document.setdefault(document_id, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def invalidate_documents(self, document_ids: Iterable[str]) -> int:
+        """Drop every answer built from any of the given documents."""
+        with self._lock:
+            entry_ids = set()
+            for document_id in document_ids:
+                entry_ids |= self._by_document.get(document_id, set())
+            for entry_id in entry_ids:
+                self._remove(entry_id)
+            self._invalidations += len(entry_ids)
+            return len(entry_ids)
+
+    def clear(self) -> None:
+        """Drop all cached answers."""
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+            self._by_document.clear()
+
+    def stats(self) -> dict:
+        """Get hit/miss and eviction statistics."""
+        lookups = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "invalidations": self._invalidations,
+            "expirations": self._expirations,
+            "evictions": self._evictions,
+        }
+
+    def _remove(self, entry_id: int) -> None:
+        """Remove an entry from all indexes; caller must hold the lock."""
+        entry = self._entries.pop(entry_id)
+        scope_ids = self._by_scope.get(entry.document_ids)
+        if scope_ids is not None:
+            scope_ids.discard(entry_id)
+            if not scope_ids:
+                del self._by_scope[entry.document_ids]
+        for document_id in entry.document_ids:
+            document_ids = self._by_document.get(document_id)
+            if document_ids is not None:
+                document_ids.discard(entry_id)
+                if not document_ids:
+                    del self._by_document[document_id]
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """Scale an embedding to unit length so dot products are cosines."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+# Global instance
+_answer_cache = None
+
+
+def get_answer_cache() -> AnswerCache:
+    """Get singleton instance of answer cache."""
+    global _answer_cache
+    if _answer_cache is None:
+        settings = get_settings()
+        _answer_cache = AnswerCache(
+            max_entries=settings.answer_cache_max_entries if settings.answer_cache_enabled else 0,
+            ttl_seconds=settings.answer_cache_ttl_seconds,
+            similarity_threshold=settings.answer_cache_similarity_threshold,
+        )
+    return _answer_cache
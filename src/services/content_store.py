@@ -0,0 +1,253 @@
+"""Reference-counted storage of deduplicated upload contents."""
+import os
+from dataclasses import dataclass
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.models.history import Document, DocumentContent, DocumentStatus
+from src.services.answer_cache import get_answer_cache
+from src.services.vector_store import get_vector_store_service
+
+
+@dataclass
+class PendingUpload:
+    """A file saved to disk and waiting to be recorded."""
+    document_id: str
+    filename: str
+    file_size: int
+    content_hash: str
+    file_type: str
+    file_path: str
+    path: str | None = None  # Logical path; re-uploads to it replace the document in place
+
+
+@dataclass
+class FreedContent:
+    """A content whose row was deleted, and whose vectors and file await removal."""
+    user_id: int
+    vector_document_id: str
+    file_path: str
+
+
+@dataclass
+class Registration:
+    """Outcome of recording an upload."""
+    document: Document
+    content: DocumentContent
+    needs_ingestion: bool  # Whether the content still has to be chunked and embedded
+    previous: DocumentContent | None = None  # Earlier version to diff against when re-indexing
+    freed: FreedContent | None = None  # Replaced version to pass to delete_freed_content
+
+
+def get_content(db: Session, user_id: int, content_hash: str, file_type: str) -> DocumentContent | None:
+    """Get a user's stored content by file hash and type."""
+    return db.query(DocumentContent).filter(
+        DocumentContent.user_id == user_id,
+        DocumentContent.content_hash == content_hash,
+        DocumentContent.file_type == file_type
+    ).first()
+
+
+def get_document_at_path(db: Session, user_id: int, path: str) -> Document | None:
+    """Get the user's document currently stored at a logical path."""
+    return db.query(Document).filter(
+        Document.user_id == user_id,
+        Document.path == path
+    ).order_by(Document.id.desc()).first()
+
+
+def find_indexed_copy(db: Session, content: DocumentContent) -> DocumentContent | None:
+    """Find the same bytes already indexed in another user's collection."""
+    return db.query(DocumentContent).join(Document).filter(
+        DocumentContent.id != content.id,
+        DocumentContent.content_hash == content.content_hash,
+        DocumentContent.file_type == content.file_type,
+        Document.status == DocumentStatus.INDEXED.value
+    ).first()
+
+
+def register_upload(
+    db: Session,
+    user_id: int,
+    document_id: str,
+    filename: str,
+    file_size: int,
+    content_hash: str,
+    file_type: str,
+    file_path: str,
+    path: str | None = None,
+) -> Registration:
+    """
+    Record an upload, linking it to existing content when the user uploaded the bytes before.
+
+    When the content already existed, the caller's copy of the file at
+    `file_path` is redundant and `content.file_path` points to the stored one.
+    A replaced version nothing references any more is returned as `freed`.
+
+    With a logical `path` the user already has a document at, that document is
+    updated in place and keeps its document_id. Unchanged bytes need no work;
+    otherwise the previous content is returned so ingestion can re-embed only
+    the chunks that changed.
+    """
+    registration = _register(db, user_id, PendingUpload(
+        document_id, filename, file_size, content_hash, file_type, file_path, path
+    ))
+    db.commit()
+    return registration
+
+
+def register_uploads(db: Session, user_id: int, uploads: list[PendingUpload]) -> list[Registration]:
+    """
+    Record many uploads in a single transaction.
+
+    Returns one registration per upload, as register_upload does. Duplicate
+    bytes within the batch share one content. If a concurrent upload races on
+    the same bytes, the batch is rolled back and recorded one upload at a time
+    instead.
+    """
+    try:
+        registrations = [_register(db, user_id, upload, retry_race=False) for upload in uploads]
+        db.commit()
+        return registrations
+    except IntegrityError:
+        db.rollback()
+
+    registrations = []
+    for upload in uploads:
+        registrations.append(_register(db, user_id, upload))
+        db.commit()
+    return registrations
+
+
+def _register(db: Session, user_id: int, upload: PendingUpload, retry_race: bool = True) -> Registration:
+    """Add the document (and content if new) to the session without committing."""
+    content = get_content(db, user_id, upload.content_hash, upload.file_type)
+    if content is None:
+        content = DocumentContent(
+            user_id=user_id,
+            content_hash=upload.content_hash,
+            file_type=upload.file_type,
+            vector_document_id=upload.document_id,
+            file_path=upload.file_path,
+            ref_count=0,
+        )
+        db.add(content)
+        try:
+            db.flush()
+        except IntegrityError:
+            if not retry_race:
+                raise
+            # A concurrent upload of the same bytes won the race
+            db.rollback()
+            content = get_content(db, user_id, upload.content_hash, upload.file_type)
+
+    # A re-upload of unchanged bytes to the same path is a no-op
+    current = get_document_at_path(db, user_id, upload.path) if upload.path is not None else None
+    if (
+        current is not None
+        and current.content_id == content.id
+        and current.status != DocumentStatus.FAILED.value
+    ):
+        return Registration(current, content, needs_ingestion=False)
+
+    sibling = db.query(Document).filter(Document.content_id == content.id).first()
+    if sibling is None:
+        needs_ingestion = True
+        status, chunks_created = DocumentStatus.QUEUED.value, 0
+    elif sibling.status == DocumentStatus.FAILED.value:
+        # Retry failed content for everyone who uploaded it
+        needs_ingestion = True
+        status, chunks_created = DocumentStatus.QUEUED.value, 0
+        db.query(Document).filter(Document.content_id == content.id).update(
+            {"status": status, "error": None}
+        )
+    else:
+        needs_ingestion = False
+        status, chunks_created = sibling.status, sibling.chunks_created
+
+    previous, freed = None, None
+    if current is None:
+        content.ref_count += 1
+        document = Document(
+            user_id=user_id,
+            content_id=content.id,
+            document_id=upload.document_id,
+            path=upload.path,
+            filename=upload.filename,
+            file_size=upload.file_size,
+            chunks_created=chunks_created,
+            status=status,
+        )
+        db.add(document)
+    else:
+        # Point the existing document at the new version
+        document = current
+        if current.content_id != content.id:
+            previous = current.content
+            content.ref_count += 1
+            if previous is not None:
+                previous.ref_count -= 1
+            document.content = content
+        document.filename = upload.filename
+        document.file_size = upload.file_size
+        document.chunks_created = chunks_created
+        document.status = status
+        document.error = None
+
+    if previous is not None and not needs_ingestion:
+        # The new version is already indexed, so there is nothing to diff against
+        if previous.ref_count <= 0:
+            freed = _free_content(db, previous)
+        previous = None
+
+    db.flush()
+    return Registration(document, content, needs_ingestion, previous, freed)
+
+
+def release_document(db: Session, document: Document) -> FreedContent | None:
+    """
+    Delete a document and drop its reference to the shared content.
+
+    Once no document references the content any more, its row is deleted too
+    and the content is returned, so the caller can remove its vectors and
+    stored file with delete_freed_content after the commit.
+    """
+    content = document.content
+    db.delete(document)
+
+    if content is None:
+        db.commit()
+        return None
+
+    content.ref_count -= 1
+    if content.ref_count > 0:
+        db.commit()
+        return None
+
+    freed = _free_content(db, content)
+    db.commit()
+    return freed
+
+
+def free_unreferenced_contents(db: Session) -> int:
+    """Free every content no document references any more, returning how many were freed."""
+    contents = db.query(DocumentContent).filter(~DocumentContent.documents.any()).all()
+    freed = [_free_content(db, content) for content in contents]
+    db.commit()
+    for content in freed:
+        delete_freed_content(content)
+    return len(freed)
+
+
+def delete_freed_content(content: FreedContent) -> None:
+    """Remove the vectors, cached answers and stored file of a freed content."""
+    get_vector_store_service().delete_document(content.vector_document_id, content.user_id)
+    get_answer_cache().invalidate_documents([content.vector_document_id])
+    if os.path.exists(content.file_path):
+        os.remove(content.file_path)
+
+
+def _free_content(db: Session, content: DocumentContent) -> FreedContent:
+    """Delete an unreferenced content's row without committing; its data is removed after the commit."""
+    db.delete(content)
+    return FreedContent(content.user_id, content.vector_document_id, content.file_path)
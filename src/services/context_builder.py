@@ -0,0 +1,217 @@
+"""Token-budgeted packing of retrieved chunks into the LLM context."""
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List
+
+from langchain_core.documents import Document
+
+if TYPE_CHECKING:
+    from tiktoken import Encoding
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "\n\n"
+MIN_OVERLAP_CHARS = 32  # Shorter shared text between chunks may be coincidence
+MIN_TRUNCATED_TOKENS = 64  # Smaller remainders of the budget aren't worth a cut-off span
+CHARS_PER_TOKEN = 4  # Estimate used when the tiktoken encoding can't be loaded
+SHINGLE_SIZE = 5  # Tokens per shingle when comparing spans for near-duplicates
+
+_WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def find_overlap(left: str, right: str, max_chars: int, min_chars: int = MIN_OVERLAP_CHARS) -> int:
+    """Get the length of the longest end of `left` that `right` starts with, or 0 if under `min_chars`."""
+    if min(len(left), len(right)) < min_chars:
+        return 0
+    probe = right[:min_chars]
+    position = left.find(probe, max(0, len(left) - max_chars))
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(probe, position + 1)
+    return 0
+
+
+def _shingles(text: str) -> set[int]:
+    """Hash the overlapping runs of words and symbols in a text."""
+    words = _WORD_PATTERN.findall(text)
+    if len(words) <= SHINGLE_SIZE:
+        return {hash(tuple(words))}
+    return {hash(tuple(words[i:i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+@dataclass
+class _Span:
+    """Contiguous text of one document, built from one or more chunks."""
+    document_id: str | None
+    text: str
+    score: float
+
+
+@dataclass
+class PackedContext:
+    """Context text for the prompt and what packing did to the retrieved chunks."""
+    text: str
+    stats: dict = field(default_factory=dict)
+
+
+class ContextBuilder:
+    """
+    Pack retrieved chunks into a context of at most `token_budget` tokens.
+
+    Chunks are split with overlap, so neighbouring chunks of a file repeat
+    text. Chunks of the same document whose text overlaps, or that contain
+    one another, are merged into one span. A span sharing at least
+    `dedup_threshold` of its word shingles with a better span, as with a copy
+    of the same code in another file, is dropped as a near-duplicate. The remaining spans go in by score, best first, while they
+    fit the budget; the first span that doesn't fit is cut to the remaining
+    budget if enough of it is left.
+
+    Tokens are counted with tiktoken's `encoding_name`. Gemini tokenizes
+    differently, so counts are estimates; if the encoding can't be loaded
+    (e.g. offline on first use), four characters are counted as a token.
+    """
+
+    def __init__(self, token_budget: int, encoding_name: str, dedup_threshold: float, max_overlap_chars: int):
+        self.token_budget = token_budget
+        self.encoding_name = encoding_name
+        self.dedup_threshold = dedup_threshold
+        self.max_overlap_chars = max_overlap_chars
+        self._encoding: "Encoding | None" = None
+        self._encoding_loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def encoding(self) -> "Encoding | None":
+        """Get the tiktoken encoding, loading it on first use; None if it can't be loaded."""
+        if not self._encoding_loaded:
+            with self._lock:
+                if not self._encoding_loaded:
+                    try:
+                        import tiktoken
+
+                        self._encoding = tiktoken.get_encoding(self.encoding_name)
+                    except Exception as e:
+                        logger.warning(
+                            "Can't load tiktoken encoding %s, estimating %d characters per token: %s",
+                            self.encoding_name, CHARS_PER_TOKEN, e,
+                        )
+                    self._encoding_loaded = True
+        return self._encoding
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens of a text."""
+        encoding = self.encoding
+        if encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(encoding.encode_ordinary(text))
+
+    def truncate(self, text: str, tokens: int) -> str:
+        """Cut a text to its first `tokens` tokens."""
+        encoding = self.encoding
+        if encoding is None:
+            return text[:tokens * CHARS_PER_TOKEN]
+        return encoding.decode(encoding.encode_ordinary(text)[:tokens])
+
+    def build(self, docs: List[Document]) -> PackedContext:
+        """Pack chunks, ranked best first, into the context text."""
+        spans = self._merge(docs)
+        merged_chunks = len(docs) - len(spans)
+        spans = self._deduplicate(spans)
+        duplicates_dropped = len(docs) - merged_chunks - len(spans)
+        spans.sort(key=lambda span: span.score, reverse=True)
+
+        separator_tokens = self.count_tokens(SEPARATOR)
+        parts: List[str] = []
+        used = 0
+        truncated = 0
+        over_budget = 0
+        for span in spans:
+            cost = self.count_tokens(span.text) + (separator_tokens if parts else 0)
+            if used + cost <= self.token_budget:
+                parts.append(span.text)
+                used += cost
+                continue
+            remaining = self.token_budget - used - (separator_tokens if parts else 0)
+            if remaining >= MIN_TRUNCATED_TOKENS and not truncated:
+                parts.append(self.truncate(span.text, remaining))
+                used = self.token_budget
+                truncated += 1
+            else:
+                over_budget += 1
+
+        text = SEPARATOR.join(parts)
+        return PackedContext(text, {
+            "chunks": len(docs),
+            "spans": len(parts),
+            "merged_chunks": merged_chunks,
+            "duplicates_dropped": duplicates_dropped,
+            "truncated_spans": truncated,
+            "over_budget_spans": over_budget,
+            "unpacked_tokens": self.count_tokens(SEPARATOR.join(doc.page_content for doc in docs)),
+            "tokens": self.count_tokens(text),
+            "token_budget": self.token_budget,
+        })
+
+    def _merge(self, docs: List[Document]) -> List[_Span]:
+        """Merge chunks of the same document that overlap or contain one another into spans."""
+        spans: List[_Span] = []
+        for rank, doc in enumerate(docs):
+            score = doc.metadata.get("score")
+            # Chunks without a retrieval score keep their rank order
+            span = _Span(
+                doc.metadata.get("document_id"),
+                doc.page_content,
+                score if score is not None else -float(rank),
+            )
+            if span.document_id is not None:
+                # A new chunk can bridge two spans, so keep merging until nothing joins
+                while (other := self._find_mergeable(spans, span)) is not None:
+                    spans.remove(other)
+                    span = self._join(other, span)
+            spans.append(span)
+        return spans
+
+    def _find_mergeable(self, spans: List[_Span], span: _Span) -> _Span | None:
+        """Find a span of the same document that joins with `span`."""
+        for other in spans:
+            if other.document_id == span.document_id and self._joined_text(other.text, span.text) is not None:
+                return other
+        return None
+
+    def _joined_text(self, first: str, second: str) -> str | None:
+        """Get the text of two pieces of one document joined, or None if they don't overlap."""
+        if second in first:
+            return first
+        if first in second:
+            return second
+        overlap = find_overlap(first, second, self.max_overlap_chars)
+        if overlap:
+            return first + second[overlap:]
+        overlap = find_overlap(second, first, self.max_overlap_chars)
+        if overlap:
+            return second + first[overlap:]
+        return None
+
+    def _join(self, first: _Span, second: _Span) -> _Span:
+        """Join two overlapping spans, keeping the better score."""
+        return _Span(
+            first.document_id,
+            self._joined_text(first.text, second.text),
+            max(first.score, second.score),
+        )
+
+    def _deduplicate(self, spans: List[_Span]) -> List[_Span]:
+        """Drop spans that are mostly contained in a better-scored span."""
+        kept: List[tuple[_Span, set[int]]] = []
+        for span in sorted(spans, key=lambda span: span.score, reverse=True):
+            shingles = _shingles(span.text)
+            if any(
+                len(shingles & other) / len(shingles) >= self.dedup_threshold
+                for _, other in kept
+            ):
+                continue
+            kept.append((span, shingles))
+        return [span for span, _ in kept]
@@ -1,20 +1,29 @@
 """Document processing service for chunking and text extraction."""
+import codecs
 import os
+import time
 from pathlib import Path
-from langchain_text_splitters import (
-    RecursiveCharacterTextSplitter,
-    Language,
-)
+from typing import TYPE_CHECKING, Iterator
 from langchain_core.documents import Document
 
 from src.config import get_settings
+from src.services.metrics import get_metrics
+
+if TYPE_CHECKING:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 
 class DocumentProcessor:
     """Handle document loading and chunking."""
     
+    READ_BLOCK_SIZE = 64 * 1024  # Bytes read per block when sniffing the encoding
+    
     def __init__(self):
+        # Deferred: the splitters package is slow to import and only needed once chunking starts
+        from langchain_text_splitters import Language
+        
         self.settings = get_settings()
+        self._splitters: dict[str, "RecursiveCharacterTextSplitter"] = {}
         self.language_map = {   
                 # Python
                 ".py": Language.PYTHON,
@@ -116,57 +125,112 @@ class DocumentProcessor:
 
     
     
-    def read_file(self, file_path: str) -> str:
-        """Read file content as text."""
+    def detect_encoding(self, file_path: str) -> str:
+        """Detect whether a file is UTF-8, falling back to latin-1, without loading it whole."""
+        decoder = codecs.getincrementaldecoder("utf-8")()
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return f.read()
+            with open(file_path, "rb") as f:
+                while block := f.read(self.READ_BLOCK_SIZE):
+                    decoder.decode(block)
+                decoder.decode(b"", final=True)
         except UnicodeDecodeError:
-            # Try with latin-1 as fallback
-            with open(file_path, "r", encoding="latin-1") as f:
-                return f.read()
+            return "latin-1"
+        return "utf-8"
     
-    def get_text_splitter(self, file_extension: str) -> RecursiveCharacterTextSplitter:
-        """Get appropriate text splitter based on file type."""
+    def iter_text_windows(self, file_path: str, window_size: int) -> Iterator[str]:
+        """Yield the text of a file in windows of at most `window_size` characters."""
+        encoding = self.detect_encoding(file_path)
+        with open(file_path, "r", encoding=encoding) as f:
+            while window := f.read(window_size):
+                yield window
+    
+    def get_text_splitter(self, file_extension: str) -> "RecursiveCharacterTextSplitter":
+        """Get appropriate text splitter based on file type, built once per extension."""
+        splitter = self._splitters.get(file_extension)
+        if splitter is not None:
+            return splitter
+        
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        
         language = self.language_map.get(file_extension)
         
         if language:
             # Use language-specific splitter for code
-            return RecursiveCharacterTextSplitter.from_language(
+            splitter = RecursiveCharacterTextSplitter.from_language(
                 language=language,
                 chunk_size=self.settings.chunk_size,
                 chunk_overlap=self.settings.chunk_overlap,
             )
         else:
             # Use generic splitter for text files
-            return RecursiveCharacterTextSplitter(
+            splitter = RecursiveCharacterTextSplitter(
                 chunk_size=self.settings.chunk_size,
                 chunk_overlap=self.settings.chunk_overlap,
                 separators=["\n\n", "\n", " ", ""],
             )
+        
+        # Splitters hold no per-call state, so one instance can serve every thread
+        self._splitters[file_extension] = splitter
+        return splitter
     
-    def process_file(self, file_path: str, filename: str) -> list[Document]:
-        """Process a file into chunks."""
-        # Read file content
-        content = self.read_file(file_path)
+    def iter_chunks(self, file_path: str, filename: str) -> Iterator[Document]:
+        """
+        Lazily split a file into chunks, holding only one text window in memory.
         
+        Each window is split together with the unfinished tail of the previous
+        one, so chunks never end at an arbitrary window boundary. Time spent
+        reading and splitting is recorded as the "read" and "split" stages.
+        """
         # Get file extension
         file_extension = Path(filename).suffix.lower()
         
         # Get appropriate splitter
         text_splitter = self.get_text_splitter(file_extension)
         
-        # Create chunks
-        chunks = text_splitter.create_documents(
-            texts=[content],
-            metadatas=[{
-                "filename": filename,
-                "source": file_path,
-                "file_type": file_extension,
-            }]
-        )
+        metadata = {
+            "filename": filename,
+            "source": file_path,
+            "file_type": file_extension,
+        }
+        window_size = self.settings.chunk_size * 64
+        
+        read_seconds, split_seconds = 0.0, 0.0
+        windows = self.iter_text_windows(file_path, window_size)
+        carry = ""
+        while True:
+            started = time.perf_counter()
+            window = next(windows, None)
+            read_seconds += time.perf_counter() - started
+            if window is None:
+                break
+            
+            text = carry + window
+            started = time.perf_counter()
+            pieces = text_splitter.split_text(text)
+            split_seconds += time.perf_counter() - started
+            if not pieces:
+                carry = ""
+                continue
+            
+            for piece in pieces[:-1]:
+                yield Document(page_content=piece, metadata=dict(metadata))
+            
+            # Re-split the last piece with the next window, keeping its raw whitespace
+            carry = text[text.rfind(pieces[-1]):]
+        
+        started = time.perf_counter()
+        pieces = text_splitter.split_text(carry)
+        split_seconds += time.perf_counter() - started
         
-        return chunks
+        metrics = get_metrics()
+        metrics.record_stage("read", read_seconds)
+        metrics.record_stage("split", split_seconds)
+        for piece in pieces:
+            yield Document(page_content=piece, metadata=dict(metadata))
+    
+    def process_file(self, file_path: str, filename: str) -> list[Document]:
+        """Process a file into chunks."""
+        return list(self.iter_chunks(file_path, filename))
     
     def validate_file(self, filename: str, file_size: int) -> tuple[bool, str]:
         """Validate file extension and size."""
@@ -182,3 +246,23 @@ class DocumentProcessor:
             return False, f"File size exceeds maximum allowed size of {max_mb}MB"
         
         return True, "Valid"
+
+
+# Processor of the current chunking worker process
+_worker_processor = None
+
+
+def chunk_file(file_path: str, filename: str) -> tuple[list[Document], str | None]:
+    """
+    Chunk a file inside a worker process.
+    
+    Returns the chunks, or no chunks and the error message if the file could
+    not be processed, so one bad file does not fail the rest of its batch.
+    """
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+    try:
+        return _worker_processor.process_file(file_path, filename), None
+    except Exception as e:
+        return [], str(e)
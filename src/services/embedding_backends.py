@@ -0,0 +1,263 @@
+"""
+Embedding model backends.
+
+`torch` runs the model with sentence-transformers on PyTorch. `onnx` runs the
+model's ONNX export with ONNX Runtime instead, so PyTorch is never loaded.
+`onnx-int8` does the same with int8-quantized weights, which are about a
+quarter of the size and faster on CPU at a small cost in accuracy. The ONNX
+backends need the `onnx` extra.
+"""
+import json
+import logging
+import os
+import platform
+import re
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+ONNX_MODEL_FILES = ("onnx/model.onnx", "model.onnx")
+
+# Pre-quantized exports published with many sentence-transformers models, by CPU feature
+QUANTIZED_ONNX_FILES = {
+    "avx512_vnni": "onnx/model_qint8_avx512_vnni.onnx",
+    "avx512": "onnx/model_qint8_avx512.onnx",
+    "avx2": "onnx/model_quint8_avx2.onnx",
+    "arm64": "onnx/model_qint8_arm64.onnx",
+}
+
+
+def _model_file(model_name: str, filename: str) -> str | None:
+    """Get the local path of a model file, downloading it if needed; None if the model has no such file."""
+    if os.path.isdir(model_name):
+        path = os.path.join(model_name, filename)
+        return path if os.path.exists(path) else None
+
+    from huggingface_hub import hf_hub_download
+    from huggingface_hub.errors import EntryNotFoundError
+
+    try:
+        return hf_hub_download(model_name, filename)
+    except EntryNotFoundError:
+        return None
+
+
+def _read_json(model_name: str, filename: str) -> dict:
+    """Read a JSON config file of the model, or an empty dict if it has none."""
+    path = _model_file(model_name, filename)
+    if path is None:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _cpu_features() -> List[str]:
+    """Get the quantized kernel families this CPU runs, fastest first."""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return ["arm64"]
+
+    flags: set[str] = set()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    flags = set(line.split(":", 1)[1].split())
+                    break
+    except OSError:
+        pass
+
+    features = []
+    if "avx512_vnni" in flags:
+        features.append("avx512_vnni")
+    if "avx512f" in flags:
+        features.append("avx512")
+    features.append("avx2")
+    return features
+
+
+def _quantize(model_path: str, model_name: str, directory: str) -> str:
+    """Quantize an ONNX model's weights to int8, once; later calls reuse the file."""
+    output = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name), "model_qint8.onnx")
+    if os.path.exists(output):
+        return output
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    logger.info("Quantizing %s to int8", model_path)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    temporary = f"{output}.{os.getpid()}.tmp"
+    quantize_dynamic(model_path, temporary, weight_type=QuantType.QInt8)
+    os.replace(temporary, output)
+    return output
+
+
+def resolve_onnx_file(model_name: str, quantized: bool, onnx_file: str | None, directory: str) -> str:
+    """
+    Find the ONNX file to run for a model.
+
+    An explicit `onnx_file` wins. For int8, the pre-quantized export matching
+    this CPU is used if the model publishes one. Otherwise the full-precision
+    export is quantized locally into `directory`.
+    """
+    if onnx_file:
+        path = _model_file(model_name, onnx_file)
+        if path is None:
+            raise ValueError(f"Embedding model {model_name} has no file {onnx_file}")
+        return path
+
+    if quantized:
+        for feature in _cpu_features():
+            path = _model_file(model_name, QUANTIZED_ONNX_FILES[feature])
+            if path is not None:
+                return path
+
+    for filename in ONNX_MODEL_FILES:
+        path = _model_file(model_name, filename)
+        if path is not None:
+            return _quantize(path, model_name, directory) if quantized else path
+
+    raise ValueError(
+        f"Embedding model {model_name} has no ONNX export. "
+        "Export one with sentence-transformers or use EMBEDDING_BACKEND=torch."
+    )
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    A sentence-transformers model run with ONNX Runtime.
+
+    Reproduces what sentence-transformers does around the transformer:
+    tokenize with the model's tokenizer, truncate to its `max_seq_length`,
+    pool the token embeddings as its pooling config says, then normalize.
+    """
+
+    BATCH_SIZE = 32  # Texts per forward pass, like SentenceTransformer.encode
+
+    def __init__(self, model_name: str, model_path: str, threads: int = 0):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError(
+                "The ONNX embedding backends need onnxruntime: install the onnx extra"
+            ) from e
+        from tokenizers import Tokenizer
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self._session = onnxruntime.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+        output_names = [output.name for output in self._session.get_outputs()]
+        self._output_name = "last_hidden_state" if "last_hidden_state" in output_names else output_names[0]
+
+        tokenizer_path = _model_file(model_name, "tokenizer.json")
+        if tokenizer_path is None:
+            raise ValueError(f"Embedding model {model_name} has no tokenizer.json")
+        self._tokenizer = Tokenizer.from_file(tokenizer_path)
+        tokenizer_config = _read_json(model_name, "tokenizer_config.json")
+        max_length = _read_json(model_name, "sentence_bert_config.json").get("max_seq_length")
+        if max_length is None:
+            # Like sentence-transformers: the tokenizer's limit, capped by the model's positions
+            limits = [
+                tokenizer_config.get("model_max_length"),
+                _read_json(model_name, "config.json").get("max_position_embeddings"),
+            ]
+            max_length = min((int(limit) for limit in limits if limit), default=512)
+        self._tokenizer.enable_truncation(max_length)
+        pad_token = (
+            _read_json(model_name, "special_tokens_map.json").get("pad_token")
+            or tokenizer_config.get("pad_token")
+            or "[PAD]"
+        )
+        if isinstance(pad_token, dict):
+            pad_token = pad_token["content"]
+        self._tokenizer.enable_padding(pad_id=self._tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+
+        pooling = _read_json(model_name, "1_Pooling/config.json")
+        # Newer sentence-transformers name the mode; older ones set one flag per mode
+        self._pooling = pooling.get("pooling_mode")
+        if self._pooling is None:
+            if pooling.get("pooling_mode_cls_token"):
+                self._pooling = "cls"
+            elif pooling.get("pooling_mode_max_tokens"):
+                self._pooling = "max"
+            else:
+                self._pooling = "mean"
+        if self._pooling not in ("mean", "cls", "max"):
+            raise ValueError(f"Pooling mode {self._pooling!r} of {model_name} is not supported by the ONNX backends")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts."""
+        # Like HuggingFaceEmbeddings, which embeds newlines as spaces
+        texts = [text.replace("\n", " ") for text in texts]
+        # Batch texts of similar length together so little compute goes to padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        vectors: List[List[float] | None] = [None] * len(texts)
+        for start in range(0, len(order), self.BATCH_SIZE):
+            batch = order[start:start + self.BATCH_SIZE]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query."""
+        return self.embed_documents([text])[0]
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Run one forward pass and pool its token embeddings into normalized vectors."""
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+
+        hidden = self._session.run([self._output_name], feeds)[0]
+        if self._pooling == "cls":
+            pooled = hidden[:, 0]
+        elif self._pooling == "max":
+            pooled = np.where(attention_mask[..., None] > 0, hidden, -np.inf).max(axis=1)
+        else:
+            mask = attention_mask[..., None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32).tolist()
+
+
+def load_embedding_model(
+    model_name: str,
+    backend: str = "torch",
+    threads: int = 0,
+    onnx_file: str | None = None,
+    onnx_directory: str = "./onnx_models",
+) -> Embeddings:
+    """Load an embedding model with the given backend; `threads` of 0 keeps the runtime's default."""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; use one of {', '.join(EMBEDDING_BACKENDS)}")
+
+    if backend == "torch":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        if threads:
+            import torch
+
+            torch.set_num_threads(threads)
+        return HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={"device": "cpu"},
+            encode_kwargs={"normalize_embeddings": True},
+        )
+
+    model_path = resolve_onnx_file(model_name, backend == "onnx-int8", onnx_file, onnx_directory)
+    logger.info("Running embedding model from %s", model_path)
+    return OnnxEmbeddings(model_name, model_path, threads=threads)
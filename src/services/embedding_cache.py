@@ -0,0 +1,218 @@
+"""Persistent content-addressed cache of embedding vectors."""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingCache:
+    """
+    On-disk cache mapping (model name, text) to its embedding vector.
+
+    Vectors are stored one per row in a fixed-capacity float32 file that is
+    memory-mapped (`vectors.f32`). A JSON index (`index.json`) maps the sha256
+    key of each text to its row and keeps entries in LRU order; when the cache
+    is full the least recently used row is overwritten. Capacity is derived
+    from `max_bytes` once the vector dimension is known.
+
+    The index is only flushed every few seconds, so after a crash it can
+    point at rows that were reused since. Each row's key digest is therefore
+    written next to it (`keys.bin`), and entries whose row holds another key
+    are dropped.
+    """
+
+    FLUSH_INTERVAL_SECONDS = 5.0
+
+    def __init__(self, directory: str, model_name: str, max_bytes: int):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.directory = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._keys_path = os.path.join(self.directory, "keys.bin")
+        self._index_path = os.path.join(self.directory, "index.json")
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        self._dim: int | None = None
+        self._capacity = 0
+        self._vectors: np.memmap | None = None
+        self._keys: np.memmap | None = None  # sha256 digest of the key stored in each row
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self._free_slots: list[int] = []
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+        # Statistics
+        self._hits = 0
+        self._misses = 0
+        self._bytes_saved = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def key(self, text: str) -> str:
+        """Get the content address of a text for this model."""
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> List[List[float] | None]:
+        """Look up vectors for texts, returning None for each miss."""
+        results: List[List[float] | None] = []
+        with self._lock:
+            for text in texts:
+                key = self.key(text)
+                slot = self._index.get(key) if self._vectors is not None else None
+                if slot is not None and self._keys[slot].tobytes() != bytes.fromhex(key):
+                    del self._index[key]  # The row was reused by another key
+                    slot = None
+                if slot is None:
+                    self._misses += 1
+                    results.append(None)
+                    continue
+                self._index.move_to_end(key)
+                self._hits += 1
+                self._bytes_saved += len(text.encode("utf-8"))
+                results.append(self._vectors[slot].tolist())
+        return results
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]) -> None:
+        """Store vectors for texts, evicting least recently used entries if full."""
+        if not texts:
+            return
+        with self._lock:
+            if self._vectors is None:
+                self._open(len(vectors[0]))
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                slot = self._index.get(key)
+                if slot is None:
+                    slot = self._allocate_slot()
+                self._vectors[slot] = vector
+                self._keys[slot] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+                self._index[key] = slot
+                self._index.move_to_end(key)
+            self._dirty = True
+            flush_due = time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL_SECONDS
+        if flush_due:
+            self._flush(wait=False)
+
+    def flush(self) -> None:
+        """Persist the vector file and index to disk."""
+        self._flush(wait=True)
+
+    def stats(self) -> dict:
+        """Get hit rate, bytes saved and size of the cache."""
+        lookups = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self._bytes_saved,
+            "entries": len(self._index),
+            "capacity": self._capacity,
+            "size_bytes": self._capacity * (self._dim or 0) * 4,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _allocate_slot(self) -> int:
+        """Get a free row, evicting the least recently used entry if needed."""
+        if self._free_slots:
+            return self._free_slots.pop()
+        _, slot = self._index.popitem(last=False)
+        return slot
+
+    def _open(self, dim: int) -> None:
+        """Map the vector file for the given dimension, resizing it to the configured cap."""
+        self._dim = dim
+        self._capacity = max(1, self.max_bytes // (dim * 4))
+        size = self._capacity * dim * 4
+
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(size)
+        with open(self._keys_path, "ab") as f:
+            f.truncate(self._capacity * 32)
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=np.float32, mode="r+", shape=(self._capacity, dim)
+        )
+        self._keys = np.memmap(
+            self._keys_path, dtype=np.uint8, mode="r+", shape=(self._capacity, 32)
+        )
+
+        # Drop entries that no longer fit after the cap shrank or whose row was reused
+        for key in [
+            k for k, slot in self._index.items()
+            if slot >= self._capacity or self._keys[slot].tobytes() != bytes.fromhex(k)
+        ]:
+            del self._index[key]
+        used = set(self._index.values())
+        self._free_slots = [slot for slot in range(self._capacity - 1, -1, -1) if slot not in used]
+
+    def _load(self) -> None:
+        """Load the index and map the vector file written by a previous process."""
+        if not os.path.exists(self._index_path) or not os.path.exists(self._vectors_path):
+            return
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("model") != self.model_name or not data.get("dim"):
+            return
+
+        self._index = OrderedDict((key, slot) for key, slot in data.get("entries", []))
+        self._open(int(data["dim"]))
+
+    def _flush(self, wait: bool) -> None:
+        """Write a snapshot of the index atomically, serializing it outside the lock."""
+        if not self._flush_lock.acquire(blocking=wait):
+            return  # Another thread is flushing
+        try:
+            with self._lock:
+                if not self._dirty or self._vectors is None:
+                    return
+                entries = list(self._index.items())
+                self._dirty = False
+                self._last_flush = time.monotonic()
+            try:
+                self._vectors.flush()
+                self._keys.flush()
+                tmp_path = f"{self._index_path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model_name, "dim": self._dim, "entries": entries}, f)
+                os.replace(tmp_path, self._index_path)
+            except OSError:
+                self._dirty = True
+                raise
+        finally:
+            self._flush_lock.release()
+
+
+class CachedEmbeddings(Embeddings):
+    """Serve embeddings from an EmbeddingCache and only embed the misses."""
+
+    def __init__(self, model: Embeddings, cache: EmbeddingCache):
+        self.model = model
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, reusing cached vectors for identical content."""
+        vectors = self.cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # Embed each distinct missing text once
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            embedded = dict(zip(unique_texts, self.model.embed_documents(unique_texts)))
+            self.cache.put_many(unique_texts, [embedded[text] for text in unique_texts])
+            for i in missing:
+                vectors[i] = embedded[texts[i]]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, reusing a cached vector if the text was seen before."""
+        return self.embed_documents([text])[0]
@@ -0,0 +1,302 @@
+"""
+Shared embedding server for running several API worker processes.
+
+With `uvicorn --workers N`, each worker would load its own copy of the
+embedding model. Instead, run one server process next to the workers:
+
+    EMBEDDING_SERVER_SOCKET=/tmp/rag-embeddings.sock python -m src.services.embedding_server
+
+and give the workers the same `EMBEDDING_SERVER_SOCKET`. They then embed
+through `RemoteEmbeddings` and never load the model. Requests from all
+workers go into one BatchingEmbeddings, so they share forward passes.
+
+Protocol: frames of a 4-byte big-endian length followed by JSON, over a
+Unix socket. Each client creates a shared-memory buffer, and the server
+writes vectors into it as float32 rows. Only the texts and a row count cross
+the socket; the vectors are never serialized.
+"""
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct(">I")
+
+
+def _send(sock: socket.socket, message: dict) -> None:
+    """Send one JSON frame."""
+    payload = json.dumps(message).encode("utf-8")
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def _receive(sock: socket.socket) -> dict | None:
+    """Receive one JSON frame, or None if the peer closed the connection."""
+    header = _receive_exactly(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    payload = _receive_exactly(sock, FRAME_HEADER.unpack(header)[0])
+    if payload is None:
+        raise ConnectionError("Connection closed in the middle of a frame")
+    return json.loads(payload)
+
+
+def _receive_exactly(sock: socket.socket, size: int) -> bytes | None:
+    """Read exactly `size` bytes, or None on a clean close before the first byte."""
+    data = bytearray()
+    while len(data) < size:
+        piece = sock.recv(size - len(data))
+        if not piece:
+            if not data:
+                return None
+            raise ConnectionError("Connection closed in the middle of a frame")
+        data.extend(piece)
+    return bytes(data)
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to a client's shared-memory buffer without taking ownership of it."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    buffer = shared_memory.SharedMemory(name=name)
+    # Before 3.13 attaching also registers the buffer with our resource tracker, which would unlink it at exit
+    resource_tracker.unregister(buffer._name, "shared_memory")
+    return buffer
+
+
+class _ConnectionHandler(socketserver.BaseRequestHandler):
+    """Serve one API worker's connection until it disconnects."""
+
+    def handle(self):
+        server: "EmbeddingServer" = self.server
+        buffer: shared_memory.SharedMemory | None = None
+        rows = 0
+        try:
+            while (message := _receive(self.request)) is not None:
+                op = message.get("op")
+                if op == "hello":
+                    _send(self.request, {"dim": server.dimensions, "model": server.model_name})
+                elif op == "attach":
+                    if buffer is not None:
+                        buffer.close()
+                    buffer, rows = None, 0
+                    try:
+                        buffer = _attach(message["shm"])
+                    except (KeyError, ValueError, OSError) as e:
+                        _send(self.request, {"error": f"Cannot attach buffer: {e}"})
+                        continue
+                    requested = message.get("rows")
+                    if not isinstance(requested, int) or requested < 0 or (
+                        buffer.size < requested * server.dimensions * 4
+                    ):
+                        buffer.close()
+                        buffer = None
+                        _send(self.request, {
+                            "error": f"Buffer cannot hold {requested!r} rows of {server.dimensions} float32 values"
+                        })
+                        continue
+                    rows = requested
+                    _send(self.request, {"ok": True})
+                elif op == "embed":
+                    texts = message["texts"]
+                    if buffer is None or len(texts) > rows:
+                        _send(self.request, {"error": f"Send at most {rows} texts after attaching a buffer"})
+                        continue
+                    try:
+                        vectors = server.model.embed_documents(texts)
+                    except Exception as e:
+                        logger.exception("Embedding failed")
+                        _send(self.request, {"error": str(e)})
+                        continue
+                    out = np.ndarray((len(texts), server.dimensions), dtype=np.float32, buffer=buffer.buf)
+                    out[:] = vectors
+                    del out
+                    _send(self.request, {"rows": len(texts)})
+                elif op == "stats":
+                    _send(self.request, server.model.stats())
+                else:
+                    _send(self.request, {"error": f"Unknown op {op!r}"})
+        except (ConnectionError, OSError) as e:
+            logger.debug("Client connection ended: %s", e)
+        finally:
+            if buffer is not None:
+                buffer.close()
+
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Unix socket server embedding texts for many API workers.
+
+    Each connection is served by its own thread, and every thread feeds the
+    same micro-batcher, so concurrent requests from different workers are
+    embedded together.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, model, model_name: str):
+        self.model = model
+        self.model_name = model_name
+        self.dimensions = len(model.embed_query("warm up"))
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, _ConnectionHandler)
+        os.chmod(socket_path, 0o660)
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    Embeddings computed by an EmbeddingServer in another process.
+
+    Holds one connection and one shared-memory buffer of `max_rows` vectors.
+    Larger inputs are sent in pieces. If the server is not up yet, connecting
+    retries for up to `connect_timeout` seconds. A dropped connection is
+    re-established once per call, so a restarted server is picked up.
+    """
+
+    def __init__(self, socket_path: str, max_rows: int = 64, connect_timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.max_rows = max_rows
+        self.connect_timeout = connect_timeout
+        self._socket: socket.socket | None = None
+        self._buffer: shared_memory.SharedMemory | None = None
+        self._dimensions = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts."""
+        vectors = []
+        with self._lock:
+            for start in range(0, len(texts), self.max_rows):
+                vectors.extend(self._embed_piece(texts[start:start + self.max_rows]))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query."""
+        return self.embed_documents([text])[0]
+
+    def close(self) -> None:
+        """Close the connection and free the shared-memory buffer."""
+        with self._lock:
+            self._disconnect()
+
+    def _embed_piece(self, texts: List[str]) -> List[List[float]]:
+        """Embed at most `max_rows` texts, reconnecting once if the connection dropped."""
+        for attempt in range(2):
+            try:
+                if self._socket is None:
+                    self._connect()
+                _send(self._socket, {"op": "embed", "texts": texts})
+                reply = _receive(self._socket)
+                if reply is None:
+                    raise ConnectionError("Embedding server closed the connection")
+                break
+            except (ConnectionError, OSError):
+                self._disconnect()
+                if attempt:
+                    raise
+        if "error" in reply:
+            raise RuntimeError(f"Embedding server error: {reply['error']}")
+
+        vectors = np.ndarray((reply["rows"], self._dimensions), dtype=np.float32, buffer=self._buffer.buf)
+        result = vectors.tolist()
+        del vectors
+        return result
+
+    def _connect(self) -> None:
+        """Connect to the server, waiting for it to start, and share a result buffer."""
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                if time.monotonic() >= deadline:
+                    raise ConnectionError(f"No embedding server listening on {self.socket_path}")
+                time.sleep(0.2)
+
+        self._socket = sock
+        _send(sock, {"op": "hello"})
+        hello = _receive(sock)
+        if hello is None:
+            raise ConnectionError("Embedding server closed the connection")
+        self._dimensions = hello["dim"]
+        self._buffer = shared_memory.SharedMemory(create=True, size=self.max_rows * self._dimensions * 4)
+        _send(sock, {"op": "attach", "shm": self._buffer.name, "rows": self.max_rows})
+        reply = _receive(sock)
+        if reply is None:
+            raise ConnectionError("Embedding server closed the connection")
+        if "error" in reply:
+            self._disconnect()
+            raise RuntimeError(f"Embedding server error: {reply['error']}")
+        logger.info("Connected to embedding server at %s (%s)", self.socket_path, hello["model"])
+
+    def _disconnect(self) -> None:
+        """Drop the connection and its buffer."""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        if self._buffer is not None:
+            self._buffer.close()
+            self._buffer.unlink()
+            self._buffer = None
+
+
+def main():
+    """Load the configured model and serve it on EMBEDDING_SERVER_SOCKET."""
+    from src.services.embedding_backends import load_embedding_model
+    from src.services.embedding_service import BatchingEmbeddings
+
+    settings = get_settings()
+    logging.basicConfig(
+        level=settings.log_level.upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    if not settings.embedding_server_socket:
+        raise SystemExit("Set EMBEDDING_SERVER_SOCKET to the socket path to serve on")
+
+    logger.info("Loading embedding model: %s (%s backend)", settings.embedding_model, settings.embedding_backend)
+    model = BatchingEmbeddings(
+        load_embedding_model(
+            settings.embedding_model,
+            backend=settings.embedding_backend,
+            threads=settings.embedding_threads,
+            onnx_file=settings.embedding_onnx_file,
+            onnx_directory=settings.onnx_model_directory,
+        ),
+        max_batch_size=settings.embedding_max_batch_size,
+        max_wait_ms=settings.embedding_max_wait_ms,
+    )
+    server = EmbeddingServer(settings.embedding_server_socket, model, settings.embedding_model)
+    # shutdown() waits for serve_forever to return, so it must run off the main thread
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    logger.info("Embedding server listening on %s", settings.embedding_server_socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(settings.embedding_server_socket):
+            os.remove(settings.embedding_server_socket)
+        model.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Embedding service that micro-batches texts from concurrent callers."""
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from src.services.stats import RollingPercentiles
+
+
+@dataclass
+class _EmbeddingRequest:
+    """Texts from one caller waiting to be embedded."""
+    texts: List[str]
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Wrap an embeddings model so concurrent callers share forward passes.
+    
+    Calls from any thread are queued; a dispatcher thread collects up to
+    `max_batch_size` texts, waiting at most `max_wait_ms` after the first one
+    arrives, runs a single `embed_documents` call and fans the vectors back out.
+    Queries and document chunks share batches, so the wrapped model must embed
+    both the same way (true for sentence-transformers models without
+    instruction prefixes, such as the default MiniLM).
+    """
+    
+    def __init__(self, model: Embeddings, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue: queue.Queue[_EmbeddingRequest | None] = queue.Queue()
+        self._dispatcher: threading.Thread | None = None
+        self._lock = threading.Lock()
+        
+        # Statistics
+        self._started_at: float | None = None
+        self._batches = 0
+        self._texts = 0
+        self._forward_seconds = 0.0
+        self._request_latency = RollingPercentiles()
+        self._batch_latency = RollingPercentiles()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts, batched with other callers."""
+        if not texts:
+            return []
+        return self._collect([self._submit(part) for part in self._split(texts)])
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query, batched with other callers."""
+        return self._submit([text]).result()[0]
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts without blocking the event loop."""
+        if not texts:
+            return []
+        futures = [asyncio.wrap_future(self._submit(part)) for part in self._split(texts)]
+        return [vector for part in await asyncio.gather(*futures) for vector in part]
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        """Embed a single query without blocking the event loop."""
+        return (await asyncio.wrap_future(self._submit([text])))[0]
+    
+    def close(self) -> None:
+        """Stop the dispatcher thread after it finishes queued work, then close the model if it can be."""
+        with self._lock:
+            if self._dispatcher is not None:
+                self._queue.put(None)
+                self._dispatcher.join()
+                self._dispatcher = None
+        close_model = getattr(self.model, "close", None)
+        if close_model is not None:
+            close_model()
+    
+    def stats(self) -> dict:
+        """Get batching and latency statistics."""
+        elapsed = time.perf_counter() - self._started_at if self._started_at else 0.0
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self._batches,
+            "texts": self._texts,
+            "queue_depth": self._queue.qsize(),
+            "avg_batch_size": round(self._texts / self._batches, 2) if self._batches else 0.0,
+            "throughput_per_sec": round(self._texts / elapsed, 2) if elapsed else 0.0,
+            "model_throughput_per_sec": (
+                round(self._texts / self._forward_seconds, 2) if self._forward_seconds else 0.0
+            ),
+            "request_latency_ms": self._request_latency.summary(scale=1000),
+            "batch_latency_ms": self._batch_latency.summary(scale=1000),
+        }
+    
+    def _split(self, texts: List[str]) -> List[List[str]]:
+        """Split a large input into pieces no bigger than one batch."""
+        return [
+            texts[i:i + self.max_batch_size]
+            for i in range(0, len(texts), self.max_batch_size)
+        ]
+    
+    def _collect(self, futures: List[Future]) -> List[List[float]]:
+        """Wait for the pieces of a split request and join their vectors."""
+        return [vector for future in futures for vector in future.result()]
+    
+    def _submit(self, texts: List[str]) -> Future:
+        """Queue texts for the dispatcher, starting it on first use."""
+        self._ensure_dispatcher()
+        request = _EmbeddingRequest(texts=texts)
+        self._queue.put(request)
+        return request.future
+    
+    def _ensure_dispatcher(self) -> None:
+        """Start the dispatcher thread if it is not running."""
+        if self._dispatcher is not None:
+            return
+        with self._lock:
+            if self._dispatcher is None:
+                self._started_at = time.perf_counter()
+                self._dispatcher = threading.Thread(
+                    target=self._dispatch_loop, name="embedding-batcher", daemon=True
+                )
+                self._dispatcher.start()
+    
+    def _dispatch_loop(self) -> None:
+        """Gather requests into batches until the stop sentinel arrives."""
+        carry: _EmbeddingRequest | None = None
+        stopping = False
+        while not stopping:
+            first = carry if carry is not None else self._queue.get()
+            carry = None
+            if first is None:
+                break
+            
+            batch = [first]
+            size = len(first.texts)
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+            while size < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                if size + len(request.texts) > self.max_batch_size:
+                    carry = request
+                    break
+                batch.append(request)
+                size += len(request.texts)
+            
+            self._run_batch(batch)
+        
+        if carry is not None:
+            self._run_batch([carry])
+    
+    def _run_batch(self, batch: List[_EmbeddingRequest]) -> None:
+        """Run one forward pass for a batch and resolve each caller's future."""
+        texts = [text for request in batch for text in request.texts]
+        started = time.perf_counter()
+        try:
+            vectors = self.model.embed_documents(texts)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        finished = time.perf_counter()
+        
+        self._batches += 1
+        self._texts += len(texts)
+        self._forward_seconds += finished - started
+        self._batch_latency.record(finished - started)
+        
+        offset = 0
+        for request in batch:
+            count = len(request.texts)
+            request.future.set_result(vectors[offset:offset + count])
+            offset += count
+            self._request_latency.record(finished - request.enqueued_at)
@@ -0,0 +1,181 @@
+"""Background garbage collection and compaction of stored documents."""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from src.config import get_settings
+from src.database import SessionLocal, engine
+from src.models.history import DocumentContent
+from src.services.content_store import free_unreferenced_contents
+from src.services.ingestion import get_ingestion_service
+from src.services.vector_store import get_vector_store_service
+
+logger = logging.getLogger(__name__)
+
+
+def _directory_size(path: str) -> int:
+    """Get the total size of the files under a directory."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class GarbageCollector:
+    """
+    Reclaim space left behind by deleted and replaced documents.
+
+    A run frees contents no document references, deletes vectors whose
+    document no longer exists (left by crashes or interrupted re-indexing),
+    removes upload files nothing points to, compacts the lexical indexes and
+    the native vector files, and optionally vacuums the SQLite database. Ingestion is
+    paused for the whole run, because jobs briefly hold vectors and files the
+    database doesn't know yet; runs are skipped while a job is in progress.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._task: asyncio.Task | None = None
+        self._last_report: dict | None = None
+
+    async def start(self):
+        """Run collection periodically in the background."""
+        if self._task is None and self.settings.gc_interval_seconds > 0:
+            self._task = asyncio.create_task(self._run_periodically())
+
+    async def stop(self):
+        """Stop the periodic collection."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def last_report(self) -> dict | None:
+        """Get the report of the latest run."""
+        return self._last_report
+
+    async def _run_periodically(self):
+        """Collect every `gc_interval_seconds`."""
+        while True:
+            await asyncio.sleep(self.settings.gc_interval_seconds)
+            try:
+                await asyncio.to_thread(self.collect)
+            except Exception as e:
+                logger.error("Garbage collection failed: %s", e)
+
+    def collect(self) -> dict:
+        """Run one collection and compaction pass and report what it freed."""
+        started = time.perf_counter()
+        report = {
+            "ran_at": datetime.now(timezone.utc),
+            "skipped": None,
+            "contents_freed": 0,
+            "orphan_chunks_deleted": 0,
+            "orphan_files_deleted": 0,
+            "upload_bytes_freed": 0,
+            "database_bytes_freed": 0,
+            "vector_store_bytes_before": 0,
+            "vector_store_bytes_after": 0,
+            "duration_ms": 0.0,
+        }
+
+        with get_ingestion_service().paused() as quiet:
+            if not quiet:
+                report["skipped"] = "Ingestion in progress"
+            else:
+                vector_store = get_vector_store_service()
+                report["vector_store_bytes_before"] = _directory_size(vector_store.backend.directory)
+
+                db = SessionLocal()
+                try:
+                    report["contents_freed"] = free_unreferenced_contents(db)
+
+                    # Vectors are tagged with their content's vector_document_id
+                    live: dict[int, set[str]] = {}
+                    referenced_files = set()
+                    for user_id, vector_document_id, file_path in db.query(
+                        DocumentContent.user_id,
+                        DocumentContent.vector_document_id,
+                        DocumentContent.file_path,
+                    ):
+                        live.setdefault(user_id, set()).add(vector_document_id)
+                        referenced_files.add(os.path.abspath(file_path))
+                finally:
+                    db.close()
+
+                for user_id in vector_store.user_ids():
+                    report["orphan_chunks_deleted"] += vector_store.delete_orphans(
+                        user_id, live.get(user_id, set())
+                    )
+                vector_store.compact()
+
+                report["orphan_files_deleted"], report["upload_bytes_freed"] = (
+                    self._delete_orphan_files(referenced_files)
+                )
+                report["database_bytes_freed"] = self._vacuum_database()
+                report["vector_store_bytes_after"] = _directory_size(vector_store.backend.directory)
+
+        report["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        self._last_report = report
+        if report["skipped"]:
+            logger.info("Garbage collection skipped: %s", report["skipped"])
+        else:
+            logger.info(
+                "Garbage collection freed %d contents, %d orphan chunks, %d files and %d database bytes",
+                report["contents_freed"], report["orphan_chunks_deleted"],
+                report["orphan_files_deleted"], report["database_bytes_freed"],
+            )
+        return report
+
+    def _delete_orphan_files(self, referenced_files: set[str]) -> tuple[int, int]:
+        """Remove old upload files no content points to, returning their count and size."""
+        directory = self.settings.upload_directory
+        if not os.path.isdir(directory):
+            return 0, 0
+
+        # Files of uploads still being received are not in the database yet
+        cutoff = time.time() - self.settings.gc_grace_seconds
+        deleted, freed = 0, 0
+        for entry in os.scandir(directory):
+            if not entry.is_file() or os.path.abspath(entry.path) in referenced_files:
+                continue
+            stat = entry.stat()
+            if stat.st_mtime > cutoff:
+                continue
+            os.remove(entry.path)
+            deleted += 1
+            freed += stat.st_size
+        return deleted, freed
+
+    def _vacuum_database(self) -> int:
+        """Rebuild the SQLite database file to return free pages, returning the bytes saved."""
+        if not self.settings.gc_vacuum:
+            return 0
+        if engine.url.get_backend_name() != "sqlite" or not engine.url.database:
+            return 0
+        path = engine.url.database
+        if not os.path.exists(path):
+            return 0
+
+        before = os.path.getsize(path)
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql("VACUUM")
+        return max(0, before - os.path.getsize(path))
+
+
+# Global instance
+_garbage_collector = None
+
+
+def get_garbage_collector() -> GarbageCollector:
+    """Get singleton instance of garbage collector."""
+    global _garbage_collector
+    if _garbage_collector is None:
+        _garbage_collector = GarbageCollector()
+    return _garbage_collector
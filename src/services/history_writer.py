@@ -0,0 +1,133 @@
+"""Write-behind buffer for query history."""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+
+from src.config import get_settings
+from src.database import AsyncSessionLocal
+from src.models.history import QueryHistory
+from src.services.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+FLUSH_ATTEMPTS = 3  # Tries per batch before its rows are dropped
+
+
+class HistoryWriter:
+    """
+    Save query history in batches, off the request path.
+
+    Queries push their history row into a bounded in-process queue and return
+    without touching the database. A background task collects rows until
+    `history_flush_max_rows` are waiting or `history_flush_interval_ms` passed
+    since the first, then inserts them in one multi-row transaction, so many
+    queries share one commit instead of contending for the writer lock. When
+    the queue is full, queries wait for room rather than losing history.
+    Stopping drains every queued row before returning.
+
+    With write-behind disabled, or before the writer is started, rows are
+    written directly.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.metrics = get_metrics()
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        """Start flushing queued rows in the background."""
+        if self._task is not None or not self.settings.history_write_behind_enabled:
+            return
+        self._queue = asyncio.Queue(maxsize=self.settings.history_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush every queued row, then stop."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def record(self, user_id: int, query: str, answer: str, sources: list[dict]) -> None:
+        """Save a query's history row, queued for the next flush when the writer is running."""
+        row = {
+            "user_id": user_id,
+            "query": query,
+            "answer": answer,
+            "sources": sources,
+            # Stamped now, so the row keeps the time of the query and not of the flush
+            "created_at": datetime.now(timezone.utc),
+        }
+        if self._task is None:
+            await self._write([row])
+            return
+        await self._queue.put(row)
+
+    def queue_depth(self) -> int:
+        """Get the number of rows waiting to be flushed."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self):
+        """Collect rows into batches and flush them until stopped."""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is None:
+                break
+            batch = [row]
+            deadline = loop.time() + self.settings.history_flush_interval_ms / 1000
+            while len(batch) < self.settings.history_flush_max_rows:
+                timeout = deadline - loop.time()
+                try:
+                    row = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(
+                        self._queue.get(), timeout
+                    )
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[dict]) -> None:
+        """Insert a batch, retrying a failed transaction before giving up on its rows."""
+        for attempt in range(1, FLUSH_ATTEMPTS + 1):
+            try:
+                await self._write(batch)
+                return
+            except Exception as e:
+                if attempt == FLUSH_ATTEMPTS:
+                    logger.error("Dropped %d query history rows after %d attempts: %s", len(batch), attempt, e)
+                    self.metrics.history_rows.inc(len(batch), result="dropped")
+                    return
+                logger.warning("Query history flush failed, retrying: %s", e)
+                await asyncio.sleep(self.settings.history_flush_interval_ms / 1000 * attempt)
+
+    async def _write(self, rows: list[dict]) -> None:
+        """Insert rows in one transaction, timed as the "history_flush" stage."""
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(QueryHistory), rows)
+            await db.commit()
+        self.metrics.record_stage("history_flush", time.perf_counter() - started)
+        self.metrics.history_rows.inc(len(rows), result="written")
+
+
+# Global instance
+_history_writer = None
+
+
+def get_history_writer() -> HistoryWriter:
+    """Get singleton instance of history writer."""
+    global _history_writer
+    if _history_writer is None:
+        _history_writer = HistoryWriter()
+    return _history_writer
@@ -0,0 +1,468 @@
+"""Background ingestion pipeline for uploaded documents."""
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+from src.config import get_settings
+from src.database import SessionLocal
+from src.models.history import Document, DocumentContent, DocumentStatus
+from src.services.answer_cache import get_answer_cache
+from src.services.document_processor import chunk_file
+from src.services.registry import get_component_registry
+from src.services.vector_store import get_vector_store_service
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IngestionJob:
+    """Stored content waiting to be chunked and embedded."""
+    content_id: int
+    user_id: int  # Owner of the collection the chunks go into
+    document_id: str  # document_id to tag the chunks with
+    file_path: str
+    filename: str
+    retry: bool = False  # Clear vectors left by an earlier failed attempt
+    copy_from: tuple[int, str] | None = None  # (user_id, document_id) already holding these chunks
+    previous_content_id: int | None = None  # Earlier version of the document to diff against
+
+
+@dataclass
+class IngestionBatch:
+    """Many uploads of one user, chunked in parallel and embedded together."""
+    jobs: list[IngestionJob]
+
+
+class IngestionService:
+    """Chunk and embed uploads in a bounded worker pool fed by a queue."""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._queue: asyncio.Queue | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._process_pool: ProcessPoolExecutor | None = None
+        self._workers: list[asyncio.Task] = []
+        self._recovery: asyncio.Task | None = None
+        self._active_jobs = 0
+        # Held by garbage collection so no job writes vectors or files mid-run
+        self._fence = threading.Condition()
+        self._running_jobs = 0
+        self._paused = False
+
+    async def start(self):
+        """Start the worker pool and re-queue uploads interrupted by a restart."""
+        if self._workers:
+            return
+
+        self._queue = asyncio.Queue(maxsize=self.settings.ingestion_queue_size)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.settings.ingestion_workers,
+            thread_name_prefix="ingestion",
+        )
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(self.settings.ingestion_workers)
+        ]
+
+        jobs = self._recover_jobs()
+        if jobs:
+            self._recovery = asyncio.create_task(self._requeue(jobs))
+
+    async def stop(self):
+        """Stop the workers, letting jobs already running finish."""
+        if self._recovery is not None:
+            # Uploads not re-queued yet stay queued in the database for the next start
+            self._recovery.cancel()
+            await asyncio.gather(self._recovery, return_exceptions=True)
+            self._recovery = None
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=True)
+            self._process_pool = None
+
+    def submit(self, job: IngestionJob | IngestionBatch) -> None:
+        """
+        Queue a job or a batch of jobs for processing.
+
+        Raises asyncio.QueueFull when the backlog is at capacity.
+        """
+        if self._queue is None:
+            raise RuntimeError("Ingestion service is not running")
+        self._queue.put_nowait(job)
+
+    def queue_depth(self) -> int:
+        """Get the number of jobs waiting for a worker."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def is_idle(self) -> bool:
+        """Check whether no job is waiting or running."""
+        return self._active_jobs == 0 and self.queue_depth() == 0
+
+    @contextlib.contextmanager
+    def paused(self, timeout: float = 0):
+        """
+        Keep workers from starting jobs for the duration of the block.
+
+        Yields whether the jobs already running finished within `timeout`
+        seconds; if not, the block must not rely on ingestion being still.
+        """
+        with self._fence:
+            self._paused = True
+            quiet = self._fence.wait_for(lambda: self._running_jobs == 0, timeout)
+        try:
+            yield quiet
+        finally:
+            with self._fence:
+                self._paused = False
+                self._fence.notify_all()
+
+    def _run_fenced(self, process, job) -> None:
+        """Run a job once ingestion is not paused."""
+        with self._fence:
+            self._fence.wait_for(lambda: not self._paused)
+            self._running_jobs += 1
+        try:
+            process(job)
+        finally:
+            with self._fence:
+                self._running_jobs -= 1
+                self._fence.notify_all()
+
+    async def _requeue(self, jobs: list[IngestionJob]):
+        """Queue recovered uploads, waiting for room when there are more than the queue holds."""
+        for job in jobs:
+            await self._queue.put(job)
+        logger.info("Re-queued %d uploads interrupted by a restart", len(jobs))
+
+    async def _worker(self):
+        """Pull jobs off the queue and run them in the thread pool."""
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            self._active_jobs += 1
+            try:
+                process = self.process_batch if isinstance(job, IngestionBatch) else self.process_job
+                await loop.run_in_executor(self._executor, self._run_fenced, process, job)
+            finally:
+                self._active_jobs -= 1
+                self._queue.task_done()
+
+    def process_job(self, job: IngestionJob) -> None:
+        """Chunk, embed and index a single upload, recording progress in the database."""
+        db = SessionLocal()
+        from_scratch = False
+        try:
+            self._set_status(db, job.content_id, DocumentStatus.CHUNKING)
+
+            vector_store = get_vector_store_service()
+            if job.retry:
+                vector_store.delete_document(job.document_id, job.user_id)
+
+            if self._reindex(db, job) is None:
+                from_scratch = True
+                chunks_created = self._copy_chunks(db, job)
+                if chunks_created == 0:
+                    chunks_created = self._chunk_and_embed(db, job)
+                self._set_status(
+                    db, job.content_id, DocumentStatus.INDEXED, chunks_created=chunks_created
+                )
+            if job.retry:
+                get_answer_cache().invalidate_documents([job.document_id])
+        except Exception as e:
+            db.rollback()
+            if from_scratch:
+                # Don't leave the batches stored before the failure behind
+                try:
+                    get_vector_store_service().delete_document(job.document_id, job.user_id)
+                except Exception:
+                    logger.exception("Could not remove partial chunks of %s", job.filename)
+            self._set_status(db, job.content_id, DocumentStatus.FAILED, error=str(e))
+        finally:
+            db.close()
+
+    def process_batch(self, batch: IngestionBatch) -> None:
+        """
+        Index many uploads at once.
+
+        Files are chunked in a process pool across cores, and their chunks are
+        embedded and written to the vector store in shared batches of
+        `ingestion_batch_size`, with one database transaction per batch. A file
+        that fails is marked failed without affecting the others.
+        """
+        db = SessionLocal()
+        try:
+            self._set_statuses(db, {job.content_id: {} for job in batch.jobs}, DocumentStatus.CHUNKING)
+
+            vector_store = get_vector_store_service()
+            to_chunk = []
+            for job in batch.jobs:
+                try:
+                    if job.retry:
+                        vector_store.delete_document(job.document_id, job.user_id)
+                    if self._reindex(db, job) is not None:
+                        continue
+                    chunks_created = self._copy_chunks(db, job)
+                except Exception as e:
+                    db.rollback()
+                    self._set_status(db, job.content_id, DocumentStatus.FAILED, error=str(e))
+                    continue
+                if chunks_created:
+                    self._set_status(
+                        db, job.content_id, DocumentStatus.INDEXED, chunks_created=chunks_created
+                    )
+                else:
+                    to_chunk.append(job)
+
+            if to_chunk:
+                self._chunk_and_embed_batch(db, to_chunk)
+
+            retried = [job.document_id for job in batch.jobs if job.retry]
+            if retried:
+                get_answer_cache().invalidate_documents(retried)
+        except Exception as e:
+            db.rollback()
+            self._set_statuses(
+                db, {job.content_id: {} for job in batch.jobs}, DocumentStatus.FAILED,
+                error=str(e), only_unfinished=True,
+            )
+        finally:
+            db.close()
+
+    def _chunk_and_embed_batch(self, db, jobs: list[IngestionJob]) -> None:
+        """Chunk files in the process pool and store their chunks in shared batches."""
+        results = self._get_process_pool().map(
+            chunk_file,
+            [job.file_path for job in jobs],
+            [job.filename for job in jobs],
+            chunksize=8,
+        )
+
+        pending = []  # Chunks not yet written
+        waiting: dict[int, tuple[IngestionJob, int]] = {}  # Jobs with chunks in `pending`
+        for job, (chunks, error) in zip(jobs, results):
+            if error is not None:
+                self._set_status(db, job.content_id, DocumentStatus.FAILED, error=error)
+                continue
+
+            for chunk in chunks:
+                chunk.metadata["document_id"] = job.document_id
+            pending.extend(chunks)
+            waiting[job.content_id] = (job, len(chunks))
+
+            if len(pending) >= self.settings.ingestion_batch_size:
+                self._store_batch(db, pending, waiting)
+                pending, waiting = [], {}
+
+        if waiting:
+            self._store_batch(db, pending, waiting)
+
+    def _store_batch(self, db, chunks: list, waiting: dict[int, tuple[IngestionJob, int]]) -> None:
+        """Embed and store chunks of several files, then mark those files indexed together."""
+        vector_store = get_vector_store_service()
+        user_id = next(iter(waiting.values()))[0].user_id
+        self._set_statuses(db, {content_id: {} for content_id in waiting}, DocumentStatus.EMBEDDING)
+        try:
+            for start in range(0, len(chunks), self.settings.ingestion_batch_size):
+                vector_store.add_documents(
+                    chunks[start:start + self.settings.ingestion_batch_size], user_id
+                )
+        except Exception as e:
+            db.rollback()
+            # Don't leave part of a file's chunks behind
+            for job, _ in waiting.values():
+                vector_store.delete_document(job.document_id, job.user_id)
+            self._set_statuses(
+                db, {content_id: {} for content_id in waiting}, DocumentStatus.FAILED, error=str(e)
+            )
+            return
+
+        self._set_statuses(
+            db,
+            {content_id: {"chunks_created": count} for content_id, (_, count) in waiting.items()},
+            DocumentStatus.INDEXED,
+        )
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """Lazily start the process pool used to chunk batch uploads."""
+        if self._process_pool is None:
+            # Spawn rather than fork: this process runs threads (model batching, Chroma)
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.settings.chunking_processes or os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._process_pool
+
+    def _reindex(self, db, job: IngestionJob) -> int | None:
+        """
+        Index a new version of a document by diffing its chunks against the previous version.
+
+        Records the document as indexed and returns the number of chunks, or
+        returns None if there is no previous version to diff against and the
+        file has to be indexed from scratch.
+        """
+        if job.previous_content_id is None:
+            return None
+        previous = db.get(DocumentContent, job.previous_content_id)
+        if previous is None:
+            return None
+
+        # Once no document references the old version, its chunks can be taken over
+        move = previous.ref_count <= 0
+        old_document_id, old_file_path = previous.vector_document_id, previous.file_path
+
+        processor = get_component_registry().document_processor
+        chunks = []
+        for chunk in processor.iter_chunks(job.file_path, job.filename):
+            chunk.metadata["document_id"] = job.document_id
+            chunks.append(chunk)
+
+        self._set_status(db, job.content_id, DocumentStatus.EMBEDDING)
+        result = get_vector_store_service().replace_document(
+            job.user_id, old_document_id, job.document_id, chunks, move=move
+        )
+        logger.info(
+            "Re-indexed %s: %d chunks kept, %d embedded, %d removed",
+            job.filename, result["kept"], result["embedded"], result["removed"],
+        )
+
+        # The old version is only dropped once its chunks were taken over, together
+        # with the new version's status, so a failure above leaves it intact
+        if move:
+            db.delete(previous)
+        self._set_status(db, job.content_id, DocumentStatus.INDEXED, chunks_created=len(chunks))
+        if move:
+            get_answer_cache().invalidate_documents([old_document_id])
+            if os.path.exists(old_file_path):
+                os.remove(old_file_path)
+        return len(chunks)
+
+    def _copy_chunks(self, db, job: IngestionJob) -> int:
+        """Copy chunks another user already indexed from the same bytes, returning how many."""
+        if job.copy_from is None:
+            return 0
+        # Another user indexed the same bytes; reuse their chunks and embeddings
+        self._set_status(db, job.content_id, DocumentStatus.EMBEDDING)
+        source_user_id, source_document_id = job.copy_from
+        return get_vector_store_service().copy_document(
+            source_user_id,
+            source_document_id,
+            job.user_id,
+            job.document_id,
+            metadata={"filename": job.filename, "source": job.file_path},
+        )
+
+    def _chunk_and_embed(self, db, job: IngestionJob) -> int:
+        """Chunk a file and store its embeddings, returning the number of chunks."""
+        vector_store = get_vector_store_service()
+
+        # Chunk lazily and store in bounded batches so memory does not grow with file size
+        processor = get_component_registry().document_processor
+        chunks_created = 0
+        batch = []
+        for chunk in processor.iter_chunks(job.file_path, job.filename):
+            # Add document ID to metadata
+            chunk.metadata["document_id"] = job.document_id
+            batch.append(chunk)
+            if len(batch) >= self.settings.ingestion_batch_size:
+                if chunks_created == 0:
+                    self._set_status(db, job.content_id, DocumentStatus.EMBEDDING)
+                vector_store.add_documents(batch, job.user_id)
+                chunks_created += len(batch)
+                batch = []
+
+        if batch:
+            if chunks_created == 0:
+                self._set_status(db, job.content_id, DocumentStatus.EMBEDDING)
+            vector_store.add_documents(batch, job.user_id)
+            chunks_created += len(batch)
+
+        return chunks_created
+
+    def _set_status(self, db, content_id: int, status: DocumentStatus, **fields) -> None:
+        """Update the status (and any extra columns) of every document sharing the content."""
+        db.query(Document).filter(Document.content_id == content_id).update(
+            {"status": status.value, **fields}
+        )
+        db.commit()
+
+    def _set_statuses(
+        self,
+        db,
+        updates: dict[int, dict],
+        status: DocumentStatus,
+        only_unfinished: bool = False,
+        **fields,
+    ) -> None:
+        """
+        Update the status of many contents in one transaction.
+
+        `updates` maps each content id to extra columns for that content only.
+        With `only_unfinished`, documents already indexed or failed are left as is.
+        """
+        for content_id, content_fields in updates.items():
+            query = db.query(Document).filter(Document.content_id == content_id)
+            if only_unfinished:
+                query = query.filter(Document.status.notin_(
+                    [DocumentStatus.INDEXED.value, DocumentStatus.FAILED.value]
+                ))
+            query.update({"status": status.value, **fields, **content_fields})
+        db.commit()
+
+    def _recover_jobs(self) -> list[IngestionJob]:
+        """Find uploads left unfinished by a previous process."""
+        db = SessionLocal()
+        try:
+            # Work that was mid-flight is redone; retrying clears the vectors it wrote
+            db.query(Document).filter(
+                Document.status.in_([DocumentStatus.CHUNKING.value, DocumentStatus.EMBEDDING.value])
+            ).update({"status": DocumentStatus.QUEUED.value}, synchronize_session=False)
+            db.commit()
+
+            jobs = []
+            queued = db.query(DocumentContent).join(Document).filter(
+                Document.status == DocumentStatus.QUEUED.value
+            ).distinct().order_by(DocumentContent.created_at).all()
+            for content in queued:
+                if os.path.exists(content.file_path):
+                    jobs.append(IngestionJob(
+                        content.id,
+                        content.user_id,
+                        content.vector_document_id,
+                        content.file_path,
+                        content.documents[0].filename,
+                        retry=True,
+                    ))
+                else:
+                    self._set_status(
+                        db, content.id, DocumentStatus.FAILED, error="Uploaded file is missing"
+                    )
+            db.commit()
+            return jobs
+        finally:
+            db.close()
+
+
+# Global instance
+_ingestion_service = None
+
+
+def get_ingestion_service() -> IngestionService:
+    """Get singleton instance of ingestion service."""
+    global _ingestion_service
+    if _ingestion_service is None:
+        _ingestion_service = IngestionService()
+    return _ingestion_service
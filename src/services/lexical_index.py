@@ -0,0 +1,481 @@
+"""BM25 inverted index over chunks with a code-aware tokenizer."""
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from typing import Iterable, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+")
+CAMEL_CASE_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+CODE_IDENTIFIER_PATTERN = re.compile(
+    r"^`?[A-Za-z_][A-Za-z0-9_]*(?:(?:\.|::)[A-Za-z_][A-Za-z0-9_]*)*(?:\(\))?`?$"
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase search terms, code-aware.
+
+    Each identifier is kept whole and also split on snake_case and camelCase
+    boundaries, so `get_rag_engine` yields `get_rag_engine`, `get`, `rag` and
+    `engine`, and `chunkOverlap` yields `chunkoverlap`, `chunk` and `overlap`.
+    """
+    tokens = []
+    for identifier in IDENTIFIER_PATTERN.findall(text):
+        whole = identifier.lower()
+        parts = [
+            part.lower()
+            for piece in identifier.split("_") if piece
+            for part in CAMEL_CASE_PATTERN.findall(piece)
+        ]
+        if len(whole) > 1:
+            tokens.append(whole)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if len(part) > 1)
+    return tokens
+
+
+def is_identifier_query(query: str) -> bool:
+    """
+    Check whether a query is just code identifiers, like `get_rag_engine`.
+
+    Such queries are answered well by the lexical index alone, so they can
+    skip the embedding model. An identifier must look like code: contain an
+    underscore, a dot or `::`, or mixed case after the first letter.
+    """
+    words = query.split()
+    if not words or len(words) > 3:
+        return False
+    for word in words:
+        if not CODE_IDENTIFIER_PATTERN.match(word):
+            return False
+        bare = word.strip("`()")
+        if not ("_" in bare or "." in bare or "::" in bare or bare[1:] != bare[1:].lower()):
+            return False
+    return True
+
+
+def _join_strings(values: Iterable[str]) -> np.ndarray:
+    """Pack newline-free strings into a byte array for storage without pickling."""
+    return np.frombuffer("\n".join(values).encode("utf-8"), dtype=np.uint8)
+
+
+def _split_strings(data: np.ndarray) -> List[str]:
+    """Unpack strings stored by _join_strings."""
+    text = data.tobytes().decode("utf-8")
+    return text.split("\n") if text else []
+
+
+class LexicalIndex:
+    """
+    Okapi BM25 index over one user's chunks, persisted as compact postings arrays.
+
+    On disk the index is a `.npz` segment holding the vocabulary, an `offsets`
+    array giving each term's slice of the flat `postings` (chunk numbers) and
+    `frequencies` arrays, per-chunk lengths, and the chunk and document ids.
+    Additions and deletions since the segment was written are appended to a
+    journal (`.journal`) as they happen and replayed on load, so they survive a
+    crash. In memory, new chunks go to a small delta and deletions are
+    tombstones, found through maps from chunk and document ids.
+
+    Once the delta outgrows the segment, or on `flush`, both are merged into a
+    fresh segment. The merge builds it from a snapshot outside the lock, so
+    searches and writes only wait for the snapshot and the swap.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    MIN_MERGE_POSTINGS = 50_000  # Delta postings that trigger a merge however small the segment
+    MIN_MERGE_DELETED = 1_000  # Deleted chunks that trigger a merge however small the segment
+    MERGE_DELETED_RATIO = 0.5  # Merge once this share of the chunk numbers is deleted
+
+    def __init__(self, path: str):
+        self.path = path
+        self._journal_path = f"{os.path.splitext(path)[0]}.journal"
+        self._merging_journal_path = f"{self._journal_path}.merging"
+        self._lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+        self._dirty = False  # Changed since the segment was written
+
+        # Segment, as loaded from disk or last merged
+        self._vocab: dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._postings = np.zeros(0, dtype=np.int32)
+        self._frequencies = np.zeros(0, dtype=np.int32)
+
+        # Per-chunk data, indexed by chunk number
+        self._chunk_ids: List[str] = []
+        self._document_ids: List[str] = []
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._live_count = 0
+        self._live_length = 0
+        self._numbers: dict[str, int] = {}  # Chunk number of each live chunk
+        self._document_chunks: dict[str, set[str]] = {}  # Live chunk ids of each document
+
+        # Chunks added since the last merge: term -> [(chunk number, frequency)]
+        self._delta: dict[str, List[tuple[int, int]]] = {}
+        self._delta_postings = 0
+        self._merging = False
+        self._merging_delta: dict[str, List[tuple[int, int]]] = {}  # Delta being merged
+        self._deleted_while_merging: List[str] = []
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._load()
+        self._journal = open(self._journal_path, "a", encoding="utf-8")
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    def chunk_ids(self) -> set[str]:
+        """Get the ids of the indexed chunks."""
+        with self._lock:
+            return set(self._numbers)
+
+    def add(self, chunk_ids: List[str], texts: List[str], document_ids: List[str]) -> None:
+        """Index chunks by their vector store ids; chunks already indexed are skipped."""
+        with self._lock:
+            self._log("add", chunk_ids, document_ids, texts)
+            self._add_locked(chunk_ids, texts, document_ids)
+            merge = self._merge_due()
+        if merge:
+            self._merge(wait=False)
+
+    def delete_document(self, document_id: str) -> int:
+        """Remove every chunk of a document, returning how many were removed."""
+        with self._lock:
+            chunk_ids = list(self._document_chunks.get(document_id, ()))
+            if not chunk_ids:
+                return 0
+            self._log("delete", chunk_ids)
+            removed = self._delete_locked(chunk_ids)
+            merge = self._merge_due()
+        if merge:
+            self._merge(wait=False)
+        return removed
+
+    def delete_chunks(self, chunk_ids: Iterable[str]) -> int:
+        """Remove chunks by their vector store ids, returning how many were removed."""
+        with self._lock:
+            chunk_ids = [chunk_id for chunk_id in set(chunk_ids) if chunk_id in self._numbers]
+            if not chunk_ids:
+                return 0
+            self._log("delete", chunk_ids)
+            removed = self._delete_locked(chunk_ids)
+            merge = self._merge_due()
+        if merge:
+            self._merge(wait=False)
+        return removed
+
+    def search(self, query: str, k: int) -> List[tuple[str, float]]:
+        """Get the ids and BM25 scores of the top-k chunks for a query."""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or self._live_count == 0:
+                return []
+
+            total = len(self._chunk_ids)
+            average_length = self._live_length / self._live_count
+            scores = np.zeros(total, dtype=np.float32)
+
+            for term in terms:
+                numbers, frequencies = self._term_postings(term)
+                if len(numbers) == 0:
+                    continue
+                live = self._alive[numbers]
+                numbers, frequencies = numbers[live], frequencies[live]
+                if len(numbers) == 0:
+                    continue
+
+                document_frequency = len(numbers)
+                idf = np.log(1 + (self._live_count - document_frequency + 0.5) / (document_frequency + 0.5))
+                lengths = self._lengths[numbers]
+                weights = frequencies * (self.K1 + 1) / (
+                    frequencies + self.K1 * (1 - self.B + self.B * lengths / average_length)
+                )
+                np.add.at(scores, numbers, idf * weights)
+
+            candidates = np.flatnonzero(scores)
+            if len(candidates) == 0:
+                return []
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [(self._chunk_ids[i], float(scores[i])) for i in ranked]
+
+    def flush(self) -> None:
+        """Merge new chunks and deletions into a fresh segment and persist it."""
+        self._merge(wait=True)
+
+    def _term_postings(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        """Get chunk numbers and frequencies of a term; caller must hold the lock."""
+        return _segment_postings(
+            self._vocab, self._offsets, self._postings, self._frequencies,
+            [self._merging_delta, self._delta], term,
+        )
+
+    def _add_locked(self, chunk_ids: List[str], texts: List[str], document_ids: List[str]) -> None:
+        """Index chunks not indexed yet; caller must hold the lock."""
+        new = []
+        for chunk_id, text, document_id in zip(chunk_ids, texts, document_ids):
+            if chunk_id not in self._numbers:
+                self._numbers[chunk_id] = -1  # Reserved, so a repeated id in the batch is skipped
+                new.append((chunk_id, text, document_id))
+        if not new:
+            return
+
+        first = len(self._chunk_ids)
+        self._grow(first + len(new))
+        for number, (chunk_id, text, document_id) in enumerate(new, start=first):
+            terms = tokenize(text)
+            counts: dict[str, int] = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                self._delta.setdefault(term, []).append((number, count))
+            self._delta_postings += len(counts)
+
+            self._chunk_ids.append(chunk_id)
+            self._document_ids.append(document_id)
+            self._numbers[chunk_id] = number
+            self._document_chunks.setdefault(document_id, set()).add(chunk_id)
+            self._lengths[number] = len(terms)
+            self._alive[number] = True
+            self._live_count += 1
+            self._live_length += len(terms)
+        self._dirty = True
+
+    def _delete_locked(self, chunk_ids: List[str]) -> int:
+        """Tombstone live chunks by id; caller must hold the lock."""
+        removed = 0
+        for chunk_id in chunk_ids:
+            number = self._numbers.pop(chunk_id, None)
+            if number is None:
+                continue
+            document_chunks = self._document_chunks.get(self._document_ids[number])
+            if document_chunks is not None:
+                document_chunks.discard(chunk_id)
+                if not document_chunks:
+                    del self._document_chunks[self._document_ids[number]]
+            self._alive[number] = False
+            self._live_count -= 1
+            self._live_length -= int(self._lengths[number])
+            if self._merging:
+                self._deleted_while_merging.append(chunk_id)
+            removed += 1
+        if removed:
+            self._dirty = True
+        return removed
+
+    def _grow(self, size: int) -> None:
+        """Make room in the per-chunk arrays for `size` chunks."""
+        if size <= len(self._lengths):
+            return
+        capacity = max(size, 2 * len(self._lengths), 64)
+        self._lengths = np.resize(self._lengths, capacity)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive
+        self._alive = alive
+
+    def _log(self, operation: str, *arguments) -> None:
+        """Append an operation to the journal; caller must hold the lock."""
+        self._journal.write(json.dumps([operation, *arguments]) + "\n")
+        self._journal.flush()
+
+    def _merge_due(self) -> bool:
+        """Check whether the delta or tombstones outgrew the segment; caller must hold the lock."""
+        if self._delta_postings >= max(self.MIN_MERGE_POSTINGS, len(self._postings)):
+            return True
+        total = len(self._chunk_ids)
+        return total - self._live_count >= max(self.MIN_MERGE_DELETED, self.MERGE_DELETED_RATIO * total)
+
+    def _merge(self, wait: bool) -> None:
+        """Merge the delta and tombstones into a fresh segment, building it outside the lock."""
+        if not self._merge_lock.acquire(blocking=wait):
+            return  # Another thread is merging
+        try:
+            with self._lock:
+                if not self._dirty:
+                    return
+                count = len(self._chunk_ids)
+                segment = (self._vocab, self._offsets, self._postings, self._frequencies)
+                alive = self._alive[:count].copy()
+                chunk_ids = self._chunk_ids[:count]
+                document_ids = self._document_ids[:count]
+                lengths = self._lengths[:count].copy()
+                self._merging_delta, self._delta = self._delta, {}
+                self._delta_postings = 0
+                self._merging = True
+                self._deleted_while_merging = []
+                self._rotate_journal()
+                self._dirty = False
+
+            try:
+                live = np.flatnonzero(alive)
+                vocab, offsets, postings, frequencies = _build_segment(
+                    *segment, self._merging_delta, live, count
+                )
+                chunk_ids = [chunk_ids[i] for i in live]
+                document_ids = [document_ids[i] for i in live]
+                numbers = dict(zip(chunk_ids, range(len(live))))
+                self._write_segment(vocab, offsets, postings, frequencies, lengths[live], chunk_ids, document_ids)
+            except Exception:
+                with self._lock:
+                    # Keep serving the delta; the next merge retries it
+                    for term, entries in self._merging_delta.items():
+                        self._delta.setdefault(term, [])[:0] = entries
+                    self._merging_delta = {}
+                    self._delta_postings = sum(len(entries) for entries in self._delta.values())
+                    self._merging = False
+                    self._dirty = True
+                raise
+            os.remove(self._merging_journal_path)
+
+            with self._lock:
+                # Chunks added while merging follow the merged ones
+                added = np.arange(count, len(self._chunk_ids))
+                shift = len(live) - count
+                self._vocab, self._offsets, self._postings, self._frequencies = vocab, offsets, postings, frequencies
+                self._merging_delta = {}
+                self._delta = {
+                    term: [(number + shift, frequency) for number, frequency in entries]
+                    for term, entries in self._delta.items()
+                }
+                self._alive = np.concatenate([self._alive[live], self._alive[added]])
+                self._lengths = np.concatenate([lengths[live], self._lengths[added]]).astype(np.int32)
+                self._chunk_ids = chunk_ids + self._chunk_ids[count:]
+                self._document_ids = document_ids + self._document_ids[count:]
+                for chunk_id in self._deleted_while_merging:
+                    numbers.pop(chunk_id, None)
+                for chunk_id in self._chunk_ids[len(live):]:
+                    if chunk_id in self._numbers:
+                        numbers[chunk_id] = self._numbers[chunk_id] + shift
+                self._numbers = numbers
+                self._merging = False
+                self._deleted_while_merging = []
+        finally:
+            self._merge_lock.release()
+
+    def _rotate_journal(self) -> None:
+        """Set the journal aside for the merge and start a new one; caller must hold the lock."""
+        self._journal.close()
+        if os.path.exists(self._merging_journal_path):
+            # A failed merge left its journal; its operations are not in a segment yet
+            with open(self._merging_journal_path, "ab") as merging, open(self._journal_path, "rb") as journal:
+                shutil.copyfileobj(journal, merging)
+            os.remove(self._journal_path)
+        else:
+            os.replace(self._journal_path, self._merging_journal_path)
+        self._journal = open(self._journal_path, "a", encoding="utf-8")
+
+    def _write_segment(self, vocab, offsets, postings, frequencies, lengths, chunk_ids, document_ids) -> None:
+        """Write a segment atomically."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                vocab=_join_strings(vocab),
+                offsets=offsets,
+                postings=postings,
+                frequencies=frequencies,
+                lengths=lengths,
+                chunk_ids=_join_strings(chunk_ids),
+                document_ids=_join_strings(document_ids),
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _load(self) -> None:
+        """Load the segment written by a previous process and replay its journals."""
+        if os.path.exists(self.path):
+            with np.load(self.path) as data:
+                self._vocab = {term: row for row, term in enumerate(_split_strings(data["vocab"]))}
+                self._offsets = data["offsets"]
+                self._postings = data["postings"]
+                self._frequencies = data["frequencies"]
+                self._lengths = data["lengths"]
+                self._chunk_ids = _split_strings(data["chunk_ids"])
+                self._document_ids = _split_strings(data["document_ids"])
+            self._alive = np.ones(len(self._chunk_ids), dtype=bool)
+            self._live_count = len(self._chunk_ids)
+            self._live_length = int(self._lengths.sum())
+            self._numbers = dict(zip(self._chunk_ids, range(len(self._chunk_ids))))
+            for chunk_id, document_id in zip(self._chunk_ids, self._document_ids):
+                self._document_chunks.setdefault(document_id, set()).add(chunk_id)
+
+        # Operations of a merge that didn't finish come before the current journal
+        for path in (self._merging_journal_path, self._journal_path):
+            if os.path.exists(path):
+                self._replay(path)
+
+    def _replay(self, path: str) -> None:
+        """Apply the operations recorded in a journal, cutting off a line torn by a crash."""
+        with open(path, "r+b") as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                try:
+                    operation, *arguments = json.loads(line)
+                except ValueError:
+                    logger.warning("Truncating a torn line at the end of %s", path)
+                    f.truncate(offset)
+                    break
+                if operation == "add":
+                    chunk_ids, document_ids, texts = arguments
+                    self._add_locked(chunk_ids, texts, document_ids)
+                elif operation == "delete":
+                    self._delete_locked(arguments[0])
+
+
+def _segment_postings(vocab, offsets, postings, frequencies, deltas, term: str) -> tuple[np.ndarray, np.ndarray]:
+    """Get chunk numbers and frequencies of a term from a segment and deltas on top of it."""
+    row = vocab.get(term)
+    if row is not None:
+        start, end = offsets[row], offsets[row + 1]
+        numbers, counts = postings[start:end], frequencies[start:end]
+    else:
+        numbers = np.zeros(0, dtype=np.int32)
+        counts = np.zeros(0, dtype=np.int32)
+
+    for delta in deltas:
+        entries = delta.get(term)
+        if entries:
+            delta_array = np.asarray(entries, dtype=np.int32)
+            numbers = np.concatenate([numbers, delta_array[:, 0]])
+            counts = np.concatenate([counts, delta_array[:, 1]])
+    return numbers, counts
+
+
+def _build_segment(vocab, offsets, postings, frequencies, delta, live: np.ndarray, count: int):
+    """Build the postings arrays of the live chunks, numbered densely in their order."""
+    renumber = np.full(count, -1, dtype=np.int32)
+    renumber[live] = np.arange(len(live), dtype=np.int32)
+
+    new_offsets = [0]
+    new_postings, new_frequencies, new_vocab = [], [], []
+    for term in sorted(set(vocab) | set(delta)):
+        numbers, counts = _segment_postings(vocab, offsets, postings, frequencies, [delta], term)
+        mapped = renumber[numbers]
+        keep = mapped >= 0
+        if not keep.any():
+            continue
+        new_vocab.append(term)
+        new_postings.append(mapped[keep])
+        new_frequencies.append(counts[keep])
+        new_offsets.append(new_offsets[-1] + int(keep.sum()))
+
+    return (
+        {term: row for row, term in enumerate(new_vocab)},
+        np.asarray(new_offsets, dtype=np.int64),
+        np.concatenate(new_postings) if new_postings else np.zeros(0, dtype=np.int32),
+        np.concatenate(new_frequencies) if new_frequencies else np.zeros(0, dtype=np.int32),
+    )
@@ -0,0 +1,314 @@
+"""Prometheus metrics, per-stage timing spans and sampled slow-request traces."""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans range from sub-millisecond index lookups to multi-second LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Stage timings of the request being served, if it is traced
+_current_trace: ContextVar[List[tuple[str, float]] | None] = ContextVar("current_trace", default=None)
+
+
+@dataclass
+class MetricFamily:
+    """A metric and its samples, as reported by a collector at scrape time."""
+    name: str
+    type: str  # "counter" or "gauge"
+    documentation: str
+    samples: List[tuple[dict, float]] = field(default_factory=list)
+
+
+def _format_labels(labels: dict) -> str:
+    """Render labels in the Prometheus text format."""
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{key}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Render a sample value, using the spelling Prometheus expects for infinity."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing count, per label combination."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """Add to the count of a label combination."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        """Render the counter in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                labels = _format_labels(dict(zip(self.labelnames, key)))
+                lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, per label combination."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: dict[tuple, tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        """Record one observation for a label combination."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            total[0] += value
+
+    def render(self) -> List[str]:
+        """Render the histogram in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total[0])}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """
+    Process-wide metrics, exported in the Prometheus text format on `/metrics`.
+
+    Pipeline code wraps each stage (file save, read, split, embed, vector add,
+    retrieve, prompt build, LLM call) in `span`, which feeds
+    the `rag_stage_duration_seconds` histogram and, while a request is being
+    traced, that request's stage breakdown. Requests slower than
+    `slow_request_threshold_ms` keep their breakdown with probability
+    `slow_request_sample_rate`; the latest traces are kept for inspection and
+    logged. Traces hold timings only, never query text.
+    """
+
+    def __init__(self, slow_request_threshold_ms: float, slow_request_sample_rate: float, max_traces: int):
+        self.slow_request_threshold_ms = slow_request_threshold_ms
+        self.slow_request_sample_rate = slow_request_sample_rate
+        self._metrics: list = []
+        self._collectors: List[Callable[[], List[MetricFamily]]] = []
+        self._slow_requests: deque[dict] = deque(maxlen=max_traces)
+
+        self.stage_seconds = self.histogram(
+            "rag_stage_duration_seconds", "Time spent in each pipeline stage.", ("stage",)
+        )
+        self.request_seconds = self.histogram(
+            "rag_http_request_duration_seconds", "HTTP request latency.", ("method", "route", "status")
+        )
+        self.chunks_indexed = self.counter(
+            "rag_chunks_indexed_total", "Chunks written to the vector store.", ("source",)
+        )
+        self.llm_tokens = self.counter(
+            "rag_llm_tokens_total", "Tokens used by LLM calls.", ("type",)
+        )
+        self.history_rows = self.counter(
+            "rag_history_rows_total", "Query history rows flushed to the database, by result.", ("result",)
+        )
+        self.slow_requests_total = self.counter(
+            "rag_slow_requests_total", "Requests slower than the slow request threshold."
+        )
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        """Create and register a counter."""
+        counter = Counter(name, documentation, labelnames)
+        self._metrics.append(counter)
+        return counter
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Histogram:
+        """Create and register a histogram."""
+        histogram = Histogram(name, documentation, labelnames)
+        self._metrics.append(histogram)
+        return histogram
+
+    def register_collector(self, collector: Callable[[], List[MetricFamily]]) -> None:
+        """Add a function reporting metrics that are read from elsewhere at scrape time."""
+        self._collectors.append(collector)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Time a pipeline stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - started)
+
+    def record_stage(self, stage: str, seconds: float) -> None:
+        """Record the duration of a stage timed by the caller."""
+        self.stage_seconds.observe(seconds, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append((stage, seconds))
+
+    def record_llm_usage(self, usage: dict | None) -> None:
+        """Count the tokens reported in an LLM response's usage metadata."""
+        if not usage:
+            return
+        for kind in ("input", "output"):
+            tokens = usage.get(f"{kind}_tokens")
+            if tokens:
+                self.llm_tokens.inc(tokens, type=kind)
+
+    def start_trace(self):
+        """Start collecting stage timings for the current request."""
+        return _current_trace.set([])
+
+    def finish_trace(self, token, method: str, route: str, status: int, seconds: float) -> None:
+        """Record a finished request and keep its trace if it was slow and sampled."""
+        trace = _current_trace.get() or []
+        _current_trace.reset(token)
+        self.request_seconds.observe(seconds, method=method, route=route, status=status)
+
+        duration_ms = seconds * 1000
+        if duration_ms < self.slow_request_threshold_ms:
+            return
+        self.slow_requests_total.inc()
+        if random.random() >= self.slow_request_sample_rate:
+            return
+
+        stages: dict[str, float] = {}
+        for stage, stage_seconds in trace:
+            stages[stage] = stages.get(stage, 0.0) + stage_seconds * 1000
+        record = {
+            "at": datetime.now(timezone.utc),
+            "method": method,
+            "route": route,
+            "status": status,
+            "duration_ms": round(duration_ms, 2),
+            "stages_ms": {stage: round(value, 2) for stage, value in stages.items()},
+        }
+        self._slow_requests.append(record)
+        logger.warning(
+            "Slow request %s %s took %.0f ms: %s",
+            method, route, duration_ms,
+            ", ".join(f"{stage}={value:.0f}ms" for stage, value in record["stages_ms"].items()) or "no stages",
+        )
+
+    def slow_requests(self) -> List[dict]:
+        """Get the sampled slow-request traces, newest first."""
+        return list(reversed(self._slow_requests))
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.warning("Metrics collector failed: %s", e)
+                continue
+            for family in families:
+                lines.append(f"# HELP {family.name} {family.documentation}")
+                lines.append(f"# TYPE {family.name} {family.type}")
+                for labels, value in family.samples:
+                    lines.append(f"{family.name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request and tracing its stages.
+
+    Latency runs until the last body chunk is sent, so streamed responses
+    count in full. Requests are labelled by route template, not raw path, to
+    keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = get_metrics()
+        token = metrics.start_trace()
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            metrics.finish_trace(
+                token,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+                seconds=time.perf_counter() - started,
+            )
+
+
+# Global instance
+_metrics = None
+
+
+def get_metrics() -> Metrics:
+    """Get singleton instance of metrics."""
+    global _metrics
+    if _metrics is None:
+        settings = get_settings()
+        _metrics = Metrics(
+            slow_request_threshold_ms=settings.slow_request_threshold_ms,
+            slow_request_sample_rate=settings.slow_request_sample_rate,
+            max_traces=settings.slow_request_traces_max,
+        )
+    return _metrics
@@ -1,53 +1,22 @@
 """RAG engine for query processing."""
-from typing import List
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
+import contextlib
+import time
+from typing import TYPE_CHECKING, AsyncIterator, List
 from langchain_core.documents import Document
 
 from src.config import get_settings
+from src.services.answer_cache import get_answer_cache
+from src.services.lexical_index import is_identifier_query
+from src.services.metrics import get_metrics
+from src.services.registry import get_component_registry
 from src.services.vector_store import get_vector_store_service
 
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
 
-class RAGEngine:
-    """RAG engine for question answering."""
-    
-    def __init__(self):
-        self.settings = get_settings()
-        self.vector_store_service = get_vector_store_service()
-    
-    def _get_llm(self):
-        """Get LLM instance (requires Google API key)."""
-        if not self.settings.google_api_key:
-            raise ValueError(
-                "Google API key not configured. "
-                "Please set GOOGLE_API_KEY environment variable."
-            )
-        
-        return ChatGoogleGenerativeAI(
-            model=self.settings.llm_model,
-            temperature=self.settings.llm_temperature,
-            google_api_key=self.settings.google_api_key,
-        )
-    
-    def _format_docs(self, docs: List[Document]) -> str:
-        """Format documents into a single string."""
-        return "\n\n".join(doc.page_content for doc in docs)
-    
-    def query(self, query: str, k: int = 4) -> dict:
-        """Query the RAG system."""
-        try:
-            # Retrieve relevant documents
-            docs = self.vector_store_service.similarity_search(query, k=k)
-            
-            # Get LLM
-            llm = self._get_llm()
-            
-            # Format context from documents
-            context = self._format_docs(docs)
-            
-            # Create prompt
-            prompt_template = ChatPromptTemplate.from_template(
-                """You are a helpful AI assistant analyzing code and documents.
+
+PROMPT_TEMPLATE = """You are a helpful AI assistant analyzing code and documents.
 Use the following pieces of context to answer the question at the end.
 If you don't know the answer based on the context, just say so - don't make up an answer.
 
@@ -57,37 +26,311 @@ Context:
 Question: {question}
 
 Provide a clear and detailed answer based on the context above:"""
-            )
+
+NO_API_KEY_ANSWER = (
+    "⚠️ Google API key not configured. Showing relevant context only. "
+    "To get AI-generated answers, please set GOOGLE_API_KEY environment variable."
+)
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = 60) -> List[Document]:
+    """
+    Merge ranked lists of chunks by reciprocal rank fusion.
+    
+    Each chunk scores the sum of 1 / (k + rank) over the lists it appears in,
+    so chunks ranked well by several retrievers rise to the top without having
+    to compare BM25 scores with vector distances. The fused score replaces
+    `score` in each chunk's metadata.
+    """
+    scores: dict[str, float] = {}
+    chunks: dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            scores[doc.id] = scores.get(doc.id, 0.0) + 1.0 / (k + rank)
+            chunks.setdefault(doc.id, doc)
+    fused = []
+    for chunk_id in sorted(scores, key=scores.get, reverse=True):
+        doc = chunks[chunk_id]
+        doc.metadata["score"] = round(scores[chunk_id], 6)
+        fused.append(doc)
+    return fused
+
+
+class RAGEngine:
+    """RAG engine for question answering."""
+    
+    def __init__(self):
+        self.settings = get_settings()
+        self.vector_store_service = get_vector_store_service()
+        self.answer_cache = get_answer_cache()
+        self.registry = get_component_registry()
+        self.metrics = get_metrics()
+    
+    def _get_llm(self) -> "ChatGoogleGenerativeAI":
+        """Get the shared LLM client (requires Google API key)."""
+        return self.registry.llm
+    
+    def _build_messages(self, query: str, docs: List[Document]) -> tuple[list, dict]:
+        """Build the chat messages for a question and its retrieved context, and the packing stats."""
+        with self.metrics.span("prompt_build"):
+            # Merge overlapping chunks and fit them into the token budget
+            context = self.registry.context_builder.build(docs)
+            
+            # Get the parsed prompt
+            prompt_template = self.registry.prompt_template(PROMPT_TEMPLATE)
             
             # Format the prompt
             messages = prompt_template.format_messages(
-                context=context,
+                context=context.text,
                 question=query
             )
-            
-            # Get answer from LLM
-            response = llm.invoke(messages)
-            
+            return messages, context.stats
+    
+    def _retrieve(self, query: str, user_id: int, k: int) -> tuple[List[float] | None, List[Document]]:
+        """Retrieve the most relevant chunks, timed as the "retrieve" stage."""
+        with self.metrics.span("retrieve"):
+            return self._search(query, user_id, k)
+    
+    def _retrieve_many(
+        self, queries: List[tuple[str, int]], user_id: int
+    ) -> List[tuple[List[float] | None, List[Document]]]:
+        """Retrieve the most relevant chunks for several (query, k) pairs, timed as one "retrieve" stage."""
+        with self.metrics.span("retrieve"):
+            return self._search_many(queries, user_id)
+    
+    def _search(self, query: str, user_id: int, k: int) -> tuple[List[float] | None, List[Document]]:
+        """Retrieve the most relevant chunks from the user's documents."""
+        return self._search_many([(query, k)], user_id)[0]
+    
+    def _search_many(
+        self, queries: List[tuple[str, int]], user_id: int
+    ) -> List[tuple[List[float] | None, List[Document]]]:
+        """
+        Retrieve the most relevant chunks from the user's documents for (query, k) pairs.
+        
+        Queries that are only code identifiers are answered from the lexical
+        index without embedding (the returned embedding is then None). Other
+        queries fuse BM25 and vector results with reciprocal rank fusion. The
+        queries that need it are embedded together and searched in one
+        vector store call.
+        """
+        hybrid = self.settings.hybrid_search_enabled
+        results: List[tuple[List[float] | None, List[Document]] | None] = [None] * len(queries)
+        
+        # Exact identifier lookups don't need the embedding model
+        pending = []
+        for i, (query, k) in enumerate(queries):
+            if hybrid and is_identifier_query(query):
+                docs = self.vector_store_service.lexical_search(query, user_id, k=k)
+                if docs:
+                    results[i] = (None, docs)
+                    continue
+            pending.append(i)
+        if not pending:
+            return results
+        
+        candidate_ks = {
+            i: max(queries[i][1], self.settings.hybrid_candidate_k) if hybrid else queries[i][1]
+            for i in pending
+        }
+        embeddings = self.vector_store_service.embed_queries([queries[i][0] for i in pending])
+        vector_results = self.vector_store_service.similarity_search_by_vectors(
+            embeddings, user_id, k=max(candidate_ks.values())
+        )
+        for i, embedding, vector_docs in zip(pending, embeddings, vector_results):
+            query, k = queries[i]
+            vector_docs = vector_docs[:candidate_ks[i]]
+            if hybrid:
+                lexical_docs = self.vector_store_service.lexical_search(query, user_id, k=candidate_ks[i])
+                docs = reciprocal_rank_fusion([vector_docs, lexical_docs], k=self.settings.rrf_k)[:k]
+            else:
+                docs = vector_docs
+            results[i] = (embedding, docs)
+        return results
+    
+    def _document_ids(self, docs: List[Document]) -> set[str]:
+        """Get the ids of the documents the chunks came from."""
+        return {doc.metadata.get("document_id", "") for doc in docs}
+    
+    def _cached_answer(self, embedding: List[float] | None, document_ids: set[str]) -> str | None:
+        """Look up a cached answer; lexical-only retrievals have no embedding to match on."""
+        if embedding is None:
+            return None
+        return self.answer_cache.lookup(embedding, document_ids)
+    
+    def _cache_answer(self, embedding: List[float] | None, document_ids: set[str], answer: str) -> None:
+        """Cache an answer if the query was embedded."""
+        if embedding is not None:
+            self.answer_cache.store(embedding, document_ids, answer)
+    
+    def query(self, query: str, user_id: int, k: int = 4) -> dict:
+        """Query the RAG system over a user's documents."""
+        # Retrieve relevant documents
+        embedding, docs = self._retrieve(query, user_id, k)
+        
+        if not self.settings.google_api_key:
+            # Fallback: just return relevant documents without LLM
             return {
-                "answer": response.content,
-                "source_documents": docs
+                "answer": NO_API_KEY_ANSWER,
+                "source_documents": docs,
+                "cached": False,
+                "context": None
             }
         
-        except ValueError as e:
-            # Handle Google API key error
-            if "Google API key" in str(e):
-                # Fallback: just return relevant documents without LLM
-                docs = self.vector_store_service.similarity_search(query, k=k)
-                return {
-                    "answer": "⚠️ Google API key not configured. Showing relevant context only. "
-                             "To get AI-generated answers, please set GOOGLE_API_KEY environment variable.",
-                    "source_documents": docs
-                }
-            raise
-    
-    def query_without_llm(self, query: str, k: int = 4) -> List[Document]:
+        # Reuse the answer to a near-identical question over the same documents
+        document_ids = self._document_ids(docs)
+        cached_answer = self._cached_answer(embedding, document_ids)
+        if cached_answer is not None:
+            return {
+                "answer": cached_answer,
+                "source_documents": docs,
+                "cached": True,
+                "context": None
+            }
+        
+        # Get answer from LLM
+        messages, context_stats = self._build_messages(query, docs)
+        with self.metrics.span("llm"):
+            response = self._get_llm().invoke(messages)
+        self.metrics.record_llm_usage(response.usage_metadata)
+        self._cache_answer(embedding, document_ids, response.content)
+        
+        return {
+            "answer": response.content,
+            "source_documents": docs,
+            "cached": False,
+            "context": context_stats
+        }
+    
+    async def aquery(self, query: str, user_id: int, k: int = 4) -> dict:
+        """Query the RAG system over a user's documents without blocking the event loop."""
+        # Retrieval embeds the query on the CPU, so run it in a worker thread
+        embedding, docs = await asyncio.to_thread(self._retrieve, query, user_id, k)
+        return await self._aanswer(query, embedding, docs)
+    
+    async def aretrieve_many(
+        self, queries: List[tuple[str, int]], user_id: int
+    ) -> List[tuple[List[float] | None, List[Document]]]:
+        """Retrieve chunks for several (query, k) pairs, embedding the queries together, in a worker thread."""
+        return await asyncio.to_thread(self._retrieve_many, queries, user_id)
+    
+    async def aanswer_many(
+        self,
+        queries: List[str],
+        retrieved: List[tuple[List[float] | None, List[Document]]],
+    ) -> AsyncIterator[tuple[int, dict | Exception]]:
+        """
+        Answer several queries from their retrieved chunks concurrently.
+        
+        Yields (index, result) in completion order, where result is the dict
+        `aquery` returns or the exception that query failed with. At most
+        `query_batch_llm_concurrency` LLM calls run at once; cached answers
+        don't wait for them.
+        """
+        llm_slots = asyncio.Semaphore(self.settings.query_batch_llm_concurrency)
+        
+        async def answer(index: int) -> tuple[int, dict | Exception]:
+            embedding, docs = retrieved[index]
+            try:
+                return index, await self._aanswer(queries[index], embedding, docs, llm_slots)
+            except Exception as e:
+                return index, e
+        
+        tasks = [asyncio.create_task(answer(index)) for index in range(len(queries))]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # The client may disconnect before every answer is in
+            for task in tasks:
+                task.cancel()
+    
+    async def _aanswer(
+        self,
+        query: str,
+        embedding: List[float] | None,
+        docs: List[Document],
+        llm_slots: asyncio.Semaphore | None = None,
+    ) -> dict:
+        """Answer a query from its retrieved chunks, holding one of `llm_slots` during the LLM call."""
+        if not self.settings.google_api_key:
+            return {
+                "answer": NO_API_KEY_ANSWER,
+                "source_documents": docs,
+                "cached": False,
+                "context": None
+            }
+        
+        document_ids = self._document_ids(docs)
+        cached_answer = self._cached_answer(embedding, document_ids)
+        if cached_answer is not None:
+            return {
+                "answer": cached_answer,
+                "source_documents": docs,
+                "cached": True,
+                "context": None
+            }
+        
+        messages, context_stats = self._build_messages(query, docs)
+        async with llm_slots if llm_slots is not None else contextlib.nullcontext():
+            with self.metrics.span("llm"):
+                response = await self._get_llm().ainvoke(messages)
+        self.metrics.record_llm_usage(response.usage_metadata)
+        self._cache_answer(embedding, document_ids, response.content)
+        
+        return {
+            "answer": response.content,
+            "source_documents": docs,
+            "cached": False,
+            "context": context_stats
+        }
+    
+    async def astream(self, query: str, user_id: int, k: int = 4) -> AsyncIterator[tuple[str, object]]:
+        """
+        Stream a RAG answer over a user's documents as events.
+        
+        Yields ("sources", documents) once retrieval is done, ("cached", True)
+        if the answer comes from the answer cache or ("context", stats) once the
+        prompt is packed, then ("token", text) for each piece of the answer as
+        the LLM produces it.
+        """
+        embedding, docs = await asyncio.to_thread(self._retrieve, query, user_id, k)
+        yield "sources", docs
+        
+        if not self.settings.google_api_key:
+            yield "token", NO_API_KEY_ANSWER
+            return
+        
+        document_ids = self._document_ids(docs)
+        cached_answer = self._cached_answer(embedding, document_ids)
+        if cached_answer is not None:
+            yield "cached", True
+            yield "token", cached_answer
+            return
+        
+        answer_parts = []
+        messages, context_stats = self._build_messages(query, docs)
+        yield "context", context_stats
+        # Time only the model: the span must not include time spent waiting on the client
+        llm_seconds = 0.0
+        stream = self._get_llm().astream(messages)
+        while True:
+            started = time.perf_counter()
+            chunk = await anext(stream, None)
+            llm_seconds += time.perf_counter() - started
+            if chunk is None:
+                break
+            self.metrics.record_llm_usage(chunk.usage_metadata)
+            if chunk.content:
+                answer_parts.append(chunk.content)
+                yield "token", chunk.content
+        self.metrics.record_stage("llm", llm_seconds)
+        
+        self._cache_answer(embedding, document_ids, "".join(answer_parts))
+    
+    def query_without_llm(self, query: str, user_id: int, k: int = 4) -> List[Document]:
         """Query without LLM - just retrieve relevant documents."""
-        return self.vector_store_service.similarity_search(query, k=k)
+        return self._retrieve(query, user_id, k)[1]
 
 
 # Global instance
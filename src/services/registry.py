@@ -0,0 +1,97 @@
+"""Process-wide registry of components that are expensive to build."""
+import threading
+from typing import TYPE_CHECKING
+
+from src.config import get_settings
+from src.services.context_builder import ContextBuilder
+from src.services.document_processor import DocumentProcessor
+
+if TYPE_CHECKING:
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+
+class ComponentRegistry:
+    """
+    Build shared components once per process and hand out the same instances.
+    
+    The LLM client is reused across requests, so its underlying connection is
+    kept alive instead of being re-established for every query. Parsed prompt
+    templates are cached by template text, and the document processor caches
+    its text splitters per file extension. The context builder holds the
+    tiktoken encoding used to count prompt tokens.
+    """
+    
+    def __init__(self):
+        self.settings = get_settings()
+        self._lock = threading.Lock()
+        self._llm: "ChatGoogleGenerativeAI | None" = None
+        self._prompt_templates: dict[str, "ChatPromptTemplate"] = {}
+        self._document_processor: DocumentProcessor | None = None
+        self._context_builder: ContextBuilder | None = None
+    
+    @property
+    def llm(self) -> "ChatGoogleGenerativeAI":
+        """Get the shared LLM client (requires Google API key)."""
+        if self._llm is None:
+            if not self.settings.google_api_key:
+                raise ValueError(
+                    "Google API key not configured. "
+                    "Please set GOOGLE_API_KEY environment variable."
+                )
+            with self._lock:
+                if self._llm is None:
+                    # Deferred: the Gemini SDK takes over a second to import
+                    from langchain_google_genai import ChatGoogleGenerativeAI
+                    
+                    self._llm = ChatGoogleGenerativeAI(
+                        model=self.settings.llm_model,
+                        temperature=self.settings.llm_temperature,
+                        google_api_key=self.settings.google_api_key,
+                    )
+        return self._llm
+    
+    @property
+    def document_processor(self) -> DocumentProcessor:
+        """Get the shared document processor."""
+        if self._document_processor is None:
+            with self._lock:
+                if self._document_processor is None:
+                    self._document_processor = DocumentProcessor()
+        return self._document_processor
+    
+    @property
+    def context_builder(self) -> ContextBuilder:
+        """Get the shared context builder."""
+        if self._context_builder is None:
+            with self._lock:
+                if self._context_builder is None:
+                    self._context_builder = ContextBuilder(
+                        token_budget=self.settings.context_token_budget,
+                        encoding_name=self.settings.context_encoding,
+                        dedup_threshold=self.settings.context_dedup_threshold,
+                        max_overlap_chars=self.settings.chunk_overlap,
+                    )
+        return self._context_builder
+    
+    def prompt_template(self, template: str) -> "ChatPromptTemplate":
+        """Get a parsed chat prompt template for the given template text."""
+        prompt = self._prompt_templates.get(template)
+        if prompt is None:
+            from langchain_core.prompts import ChatPromptTemplate
+            
+            prompt = ChatPromptTemplate.from_template(template)
+            self._prompt_templates[template] = prompt
+        return prompt
+
+
+# Global instance
+_component_registry = None
+
+
+def get_component_registry() -> ComponentRegistry:
+    """Get singleton instance of component registry."""
+    global _component_registry
+    if _component_registry is None:
+        _component_registry = ComponentRegistry()
+    return _component_registry
@@ -1,26 +1,43 @@
 """Security utilities for authentication."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Annotated
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
 
 from src.config import get_settings
-from src.database import get_db
+from src.database import get_async_db
 from src.models.user import User
 from src.models.auth_schemas import TokenData
+from src.services.token_cache import get_token_cache
 
 settings = get_settings()
 
 # Password hashing context
 pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
 
+# Hashing takes thousands of rounds, so it runs on a few dedicated threads
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers,
+    thread_name_prefix="password-hash",
+)
+
 def get_password_hash(password: str) -> str:
     """Hash a password using bcrypt."""
     return pwd_context.hash(password)
 
+
+async def aget_password_hash(password: str) -> str:
+    """Hash a password on the password thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, get_password_hash, password)
+
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
@@ -30,6 +47,14 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the password thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _password_executor, verify_password, plain_password, hashed_password
+    )
+
+
 
 
 
@@ -47,24 +72,25 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     return encoded_jwt
 
 
-def get_user_by_email(db: Session, email: str) -> User | None:
+async def get_user_by_email(db: AsyncSession, email: str) -> User | None:
     """Get user by email from database."""
-    return db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
 
 
-def authenticate_user(db: Session, email: str, password: str) -> User | None:
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> User | None:
     """Authenticate a user by email and password."""
-    user = get_user_by_email(db, email)
+    user = await get_user_by_email(db, email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await averify_password(password, user.hashed_password):
         return None
     return user
 
 
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[AsyncSession, Depends(get_async_db)]
 ) -> User:
     """Get the current authenticated user from JWT token."""
     credentials_exception = HTTPException(
@@ -73,6 +99,11 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    token_cache = get_token_cache()
+    cached_user = token_cache.lookup(token)
+    if cached_user is not None:
+        return cached_user
+    
     try:
         payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
         email: str = payload.get("sub")
@@ -82,10 +113,11 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = get_user_by_email(db, email=token_data.email)
+    user = await get_user_by_email(db, email=token_data.email)
     if user is None:
         raise credentials_exception
     
+    token_cache.store(token, user.id, _detached_copy(user), payload["exp"])
     return user
 
 
@@ -96,3 +128,30 @@ async def get_current_active_user(
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+
+def _detached_copy(user: User) -> User:
+    """Copy a user's columns into an instance no session owns, so requests can share it."""
+    copy = User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+    make_transient_to_detached(copy)
+    return copy
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _mark_user_changed(mapper, connection, target: User):
+    """Remember users changed in a session, e.g. deactivated, until it commits."""
+    object_session(target).info.setdefault("changed_user_ids", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session):
+    """Drop cached tokens of users whose change was just committed."""
+    for user_id in session.info.pop("changed_user_ids", ()):
+        get_token_cache().invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session: Session):
+    """Discard user changes that were rolled back."""
+    session.info.pop("changed_user_ids", None)
@@ -0,0 +1,32 @@
+"""Lightweight in-process statistics helpers."""
+import threading
+from collections import deque
+
+
+class RollingPercentiles:
+    """Keep the most recent samples and report percentiles over them."""
+    
+    def __init__(self, window: int = 1000):
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def record(self, value: float) -> None:
+        """Add a sample to the window."""
+        with self._lock:
+            self._samples.append(value)
+    
+    def percentile(self, pct: float) -> float:
+        """Get the given percentile (0-100) of the current window, or 0.0 if empty."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+    
+    def summary(self, scale: float = 1.0) -> dict:
+        """Get p50/p99 of the window, multiplied by `scale` (e.g. 1000 for ms)."""
+        return {
+            "p50": round(self.percentile(50) * scale, 3),
+            "p99": round(self.percentile(99) * scale, 3),
+        }
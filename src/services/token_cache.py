@@ -0,0 +1,133 @@
+"""Short-lived cache of users authenticated by access token."""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from src.config import get_settings
+
+
+@dataclass
+class _TokenEntry:
+    """A validated token and the user it belongs to."""
+    user_id: int
+    principal: Any
+    expires_at: float  # Wall-clock time, so it can honour the token's own expiry
+
+
+class TokenCache:
+    """
+    Cache the user behind each validated access token for a short TTL.
+
+    Lets authenticated requests skip decoding the JWT and loading the user
+    from the database. An entry lives for at most `ttl_seconds` and never past
+    its token's expiry. Entries are evicted in LRU order beyond `max_entries`
+    and dropped as soon as their user changes (e.g. is deactivated).
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, _TokenEntry] = OrderedDict()
+        self._by_user: dict[int, set[str]] = {}
+        self._lock = threading.Lock()
+
+        # Statistics
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._expirations = 0
+        self._evictions = 0
+
+    def lookup(self, token: str) -> Any | None:
+        """Get the cached user of a token."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry.expires_at <= time.time():
+                self._remove(token)
+                self._expirations += 1
+                self._misses += 1
+                return None
+
+            self._hits += 1
+            self._entries.move_to_end(token)
+            return entry.principal
+
+    def store(self, token: str, user_id: int, principal: Any, token_expires_at: float) -> None:
+        """Cache the user of a validated token that expires at `token_expires_at`."""
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        entry = _TokenEntry(
+            user_id=user_id,
+            principal=principal,
+            expires_at=min(time.time() + self.ttl_seconds, token_expires_at),
+        )
+
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = entry
+            self._by_user.setdefault(user_id, set()).add(token)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def invalidate_user(self, user_id: int) -> int:
+        """Drop every cached token of a user."""
+        with self._lock:
+            tokens = list(self._by_user.get(user_id, ()))
+            for token in tokens:
+                self._remove(token)
+            self._invalidations += len(tokens)
+            return len(tokens)
+
+    def clear(self) -> None:
+        """Drop all cached tokens."""
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> dict:
+        """Get hit/miss and eviction statistics."""
+        lookups = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "invalidations": self._invalidations,
+            "expirations": self._expirations,
+            "evictions": self._evictions,
+        }
+
+    def _remove(self, token: str) -> None:
+        """Remove an entry from all indexes; caller must hold the lock."""
+        entry = self._entries.pop(token)
+        tokens = self._by_user.get(entry.user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[entry.user_id]
+
+
+# Global instance
+_token_cache = None
+
+
+def get_token_cache() -> TokenCache:
+    """Get singleton instance of token cache."""
+    global _token_cache
+    if _token_cache is None:
+        settings = get_settings()
+        _token_cache = TokenCache(
+            max_entries=settings.auth_cache_max_entries if settings.auth_cache_enabled else 0,
+            ttl_seconds=settings.auth_cache_ttl_seconds,
+        )
+    return _token_cache
@@ -0,0 +1,744 @@
+"""
+Vector index backends holding each user's chunks.
+
+`chroma` stores chunks in ChromaDB collections, one per user. `native`
+stores them in process: each user's vectors are rows of a memory-mapped
+float32 file, searched with a NumPy dot product, and an SQLite side table maps
+chunk ids to rows, texts and metadata. Above `native_hnsw_threshold` chunks
+the native backend searches an HNSW graph instead, if `hnswlib` (the `hnsw`
+extra) is installed.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterator, List
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import chromadb
+
+logger = logging.getLogger(__name__)
+
+VECTOR_BACKENDS = ("chroma", "native")
+
+
+@dataclass
+class ChunkRecords:
+    """Chunks read from a backend, as parallel lists."""
+    ids: List[str] = field(default_factory=list)
+    texts: List[str] = field(default_factory=list)
+    metadatas: List[dict] = field(default_factory=list)
+    embeddings: List[List[float]] | None = None  # Only when asked for
+    scores: List[float] | None = None  # Cosine similarity to the query, for search results
+
+
+class VectorBackend(ABC):
+    """
+    Storage and search of per-user chunk vectors.
+
+    Every operation is scoped to one user's chunks, so a search only walks
+    that user's vectors. Chunks carry their `document_id` in their metadata.
+    """
+
+    directory: str  # Where the backend keeps its files
+
+    def open(self) -> None:
+        """Open the store, so the first request doesn't pay for it."""
+
+    @abstractmethod
+    def add(
+        self, user_id: int, ids: List[str], embeddings: List[List[float]], texts: List[str], metadatas: List[dict]
+    ) -> None:
+        """Store chunks with their vectors."""
+
+    @abstractmethod
+    def get(self, user_id: int, ids: List[str]) -> ChunkRecords:
+        """Get chunks by id, in no particular order; missing ids are left out."""
+
+    @abstractmethod
+    def get_document(self, user_id: int, document_id: str, include_embeddings: bool = False) -> ChunkRecords:
+        """Get every chunk of a document."""
+
+    @abstractmethod
+    def scan(self, user_id: int, batch_size: int = 1000) -> Iterator[ChunkRecords]:
+        """Iterate over all of a user's chunks in batches."""
+
+    @abstractmethod
+    def update_metadata(self, user_id: int, ids: List[str], metadatas: List[dict]) -> None:
+        """Replace the metadata of chunks."""
+
+    @abstractmethod
+    def delete(self, user_id: int, ids: List[str]) -> None:
+        """Delete chunks by id."""
+
+    @abstractmethod
+    def delete_document(self, user_id: int, document_id: str) -> None:
+        """Delete every chunk of a document."""
+
+    @abstractmethod
+    def query(self, user_id: int, embedding: List[float], k: int) -> ChunkRecords:
+        """Get the k chunks most similar to a vector, best first, with their scores."""
+
+    def query_many(self, user_id: int, embeddings: List[List[float]], k: int) -> List[ChunkRecords]:
+        """Get the k chunks most similar to each of several vectors."""
+        return [self.query(user_id, embedding, k) for embedding in embeddings]
+
+    @abstractmethod
+    def count(self, user_id: int) -> int:
+        """Get the number of a user's chunks."""
+
+    @abstractmethod
+    def user_ids(self) -> List[int]:
+        """Get the ids of the users that have chunks stored."""
+
+    @abstractmethod
+    def drop(self, user_id: int) -> None:
+        """Delete all of a user's chunks and their storage."""
+
+    def compact(self) -> None:
+        """Reclaim the space of deleted chunks."""
+
+    def close(self) -> None:
+        """Persist pending writes and release files."""
+
+
+class ChromaBackend(VectorBackend):
+    """Chunks in a persistent ChromaDB client, one collection per user."""
+
+    def __init__(self, directory: str, collection_prefix: str):
+        self.directory = directory
+        self.collection_prefix = collection_prefix
+        self._client = None
+        self._collections: dict[int, "chromadb.Collection"] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def client(self) -> "chromadb.ClientAPI":
+        """Lazy load the persistent Chroma client shared by all collections."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import chromadb
+                    from chromadb.config import Settings as ChromaSettings
+
+                    self._client = chromadb.PersistentClient(
+                        path=self.directory,
+                        settings=ChromaSettings(anonymized_telemetry=False),
+                    )
+        return self._client
+
+    def open(self) -> None:
+        """Load the Chroma client."""
+        self.client
+
+    def collection_name(self, user_id: int) -> str:
+        """Get the name of a user's collection."""
+        return f"{self.collection_prefix}_user_{user_id}"
+
+    def collection(self, user_id: int) -> "chromadb.Collection":
+        """Get a user's Chroma collection, created on first use."""
+        collection = self._collections.get(user_id)
+        if collection is None:
+            collection = self.client.get_or_create_collection(
+                self.collection_name(user_id), embedding_function=None
+            )
+            self._collections[user_id] = collection
+        return collection
+
+    def add(self, user_id, ids, embeddings, texts, metadatas):
+        """Store chunks with their vectors."""
+        self.collection(user_id).add(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=texts)
+
+    def get(self, user_id, ids):
+        """Get chunks by id."""
+        return self._records(self.collection(user_id).get(ids=ids, include=["documents", "metadatas"]))
+
+    def get_document(self, user_id, document_id, include_embeddings=False):
+        """Get every chunk of a document."""
+        include = ["documents", "metadatas", "embeddings"] if include_embeddings else ["documents", "metadatas"]
+        return self._records(self.collection(user_id).get(where={"document_id": document_id}, include=include))
+
+    def scan(self, user_id, batch_size=1000):
+        """Iterate over all of a user's chunks in batches."""
+        collection = self.collection(user_id)
+        total = collection.count()
+        for offset in range(0, total, batch_size):
+            yield self._records(
+                collection.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+            )
+
+    def update_metadata(self, user_id, ids, metadatas):
+        """Replace the metadata of chunks."""
+        self.collection(user_id).update(ids=ids, metadatas=metadatas)
+
+    def delete(self, user_id, ids):
+        """Delete chunks by id."""
+        self.collection(user_id).delete(ids=ids)
+
+    def delete_document(self, user_id, document_id):
+        """Delete every chunk of a document."""
+        self.collection(user_id).delete(where={"document_id": document_id})
+
+    def query(self, user_id, embedding, k):
+        """Get the k chunks nearest to a vector."""
+        return self.query_many(user_id, [embedding], k)[0]
+
+    def query_many(self, user_id, embeddings, k):
+        """Get the k chunks nearest to each of several vectors, in one Chroma query."""
+        result = self.collection(user_id).query(
+            query_embeddings=embeddings,
+            n_results=k,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            ChunkRecords(
+                ids=ids,
+                texts=texts,
+                metadatas=[metadata or {} for metadata in metadatas],
+                # Squared L2 distance between normalized vectors is 2 - 2 * cosine
+                scores=[1.0 - distance / 2.0 for distance in distances],
+            )
+            for ids, texts, metadatas, distances in zip(
+                result["ids"], result["documents"], result["metadatas"], result["distances"]
+            )
+        ]
+
+    def count(self, user_id):
+        """Get the number of chunks in a user's collection."""
+        return self.collection(user_id).count()
+
+    def user_ids(self):
+        """Get the ids of the users that have a collection."""
+        prefix = f"{self.collection_prefix}_user_"
+        user_ids = []
+        for collection in self.client.list_collections():
+            name = collection if isinstance(collection, str) else collection.name
+            if name.startswith(prefix) and name[len(prefix):].isdigit():
+                user_ids.append(int(name[len(prefix):]))
+        return user_ids
+
+    def drop(self, user_id):
+        """Delete a user's collection."""
+        self.client.delete_collection(self.collection_name(user_id))
+        self._collections.pop(user_id, None)
+
+    def _records(self, result: dict) -> ChunkRecords:
+        """Convert a Chroma get result."""
+        embeddings = result.get("embeddings")
+        return ChunkRecords(
+            ids=result["ids"],
+            texts=result["documents"],
+            metadatas=[metadata or {} for metadata in result["metadatas"]],
+            embeddings=np.asarray(embeddings).tolist() if embeddings is not None else None,
+        )
+
+
+class NativeCollection:
+    """
+    One user's chunks: a memory-mapped vector file and an SQLite side table.
+
+    Vectors are rows of `vectors.f32`, which grows by doubling. `chunks.db`
+    maps each chunk id to its row, text and metadata, and is the source of
+    truth for which rows are live; deleted rows stay in the vector file as
+    tombstones until `compact` writes a new vector file for the next
+    generation and switches to it in the same transaction that renumbers the
+    rows, so a crash leaves either generation intact. Chunk ids, row liveness and vector
+    norms are kept in memory, so a search touches SQLite only to read its k
+    results. Searches snapshot those arrays under the lock and score outside
+    it, so they don't wait for each other.
+    """
+
+    MIN_CAPACITY = 1024
+    QUERY_BLOCK_SIZE = 64  # Queries scored per matrix product; bounds the score matrix
+    COMPACT_RATIO = 0.5  # Compact when at least this share of rows is deleted
+
+    def __init__(self, directory: str, hnsw_threshold: int, hnsw_ef_search: int):
+        self.directory = directory
+        self.hnsw_threshold = hnsw_threshold
+        self.hnsw_ef_search = hnsw_ef_search
+        self._generation = 0  # Bumped by each compaction, which writes a new vector file
+        self._vectors_path = self._vectors_file(0)
+        self._lock = threading.Lock()
+
+        self._dim: int | None = None
+        self._capacity = 0
+        self._size = 0  # Rows used, live or deleted
+        self._vectors: np.memmap | None = None
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids: List[str | None] = []
+        self._rows: dict[str, int] = {}
+        self._graph = None  # HNSW index over the rows, built on the first search above the threshold
+
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "chunks.db"), check_same_thread=False)
+        self._db.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL,
+                document_id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_chunks_document_id ON chunks (document_id);
+            CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, ids: List[str], embeddings: List[List[float]], texts: List[str], metadatas: List[dict]) -> None:
+        """Append chunks to the vector file and the side table."""
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                self._db.execute("INSERT INTO settings VALUES ('dim', ?)", (str(self._dim),))
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Vectors have {vectors.shape[1]} dimensions, the store holds {self._dim}")
+
+            first = self._size
+            self._grow(first + len(ids))
+            self._vectors[first:first + len(ids)] = vectors
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO chunks (id, row, document_id, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (chunk_id, first + offset, (metadata or {}).get("document_id", ""), text, json.dumps(metadata or {}))
+                        for offset, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas))
+                    ],
+                )
+            rows = np.arange(first, first + len(ids))
+            self._norms[rows] = np.linalg.norm(vectors, axis=1)
+            self._alive[rows] = True
+            self._ids.extend(ids)
+            self._rows.update(zip(ids, rows.tolist()))
+            self._size += len(ids)
+            if self._graph is not None:
+                self._graph_add(rows)
+
+    def get(self, ids: List[str]) -> ChunkRecords:
+        """Get chunks by id."""
+        if not ids:
+            return ChunkRecords()
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, text, metadata FROM chunks WHERE id IN ({placeholders})", ids
+            ).fetchall()
+        return ChunkRecords(
+            ids=[row[0] for row in rows],
+            texts=[row[1] for row in rows],
+            metadatas=[json.loads(row[2]) for row in rows],
+        )
+
+    def get_document(self, document_id: str, include_embeddings: bool = False) -> ChunkRecords:
+        """Get every chunk of a document, in the order they were added."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, text, metadata, row FROM chunks WHERE document_id = ? ORDER BY row", (document_id,)
+            ).fetchall()
+            embeddings = None
+            if include_embeddings:
+                embeddings = self._vectors[[row[3] for row in rows]].tolist() if rows else []
+        return ChunkRecords(
+            ids=[row[0] for row in rows],
+            texts=[row[1] for row in rows],
+            metadatas=[json.loads(row[2]) for row in rows],
+            embeddings=embeddings,
+        )
+
+    def scan(self, batch_size: int) -> Iterator[ChunkRecords]:
+        """Iterate over the chunks in batches, in row order."""
+        last_row = -1
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, text, metadata, row FROM chunks WHERE row > ? ORDER BY row LIMIT ?",
+                    (last_row, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            last_row = rows[-1][3]
+            yield ChunkRecords(
+                ids=[row[0] for row in rows],
+                texts=[row[1] for row in rows],
+                metadatas=[json.loads(row[2]) for row in rows],
+            )
+
+    def update_metadata(self, ids: List[str], metadatas: List[dict]) -> None:
+        """Replace the metadata of chunks."""
+        with self._lock, self._db:
+            self._db.executemany(
+                "UPDATE chunks SET metadata = ?, document_id = ? WHERE id = ?",
+                [
+                    (json.dumps(metadata), metadata.get("document_id", ""), chunk_id)
+                    for chunk_id, metadata in zip(ids, metadatas)
+                ],
+            )
+
+    def delete(self, ids: List[str]) -> None:
+        """Delete chunks by id, leaving their rows as tombstones."""
+        with self._lock:
+            ids = [chunk_id for chunk_id in ids if chunk_id in self._rows]
+            if not ids:
+                return
+            with self._db:
+                self._db.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in ids])
+            self._tombstone(ids)
+
+    def delete_document(self, document_id: str) -> None:
+        """Delete every chunk of a document."""
+        with self._lock:
+            ids = [row[0] for row in self._db.execute("SELECT id FROM chunks WHERE document_id = ?", (document_id,))]
+            if not ids:
+                return
+            with self._db:
+                self._db.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+            self._tombstone(ids)
+
+    def query(self, embedding: List[float], k: int) -> ChunkRecords:
+        """Get the k chunks with the highest cosine similarity to a vector."""
+        return self.query_many([embedding], k)[0]
+
+    def query_many(self, embeddings: List[List[float]], k: int) -> List[ChunkRecords]:
+        """
+        Get the k chunks with the highest cosine similarity to each of several vectors.
+
+        Exhaustive search scores blocks of queries with one matrix product, so
+        the vector file is read once per block rather than once per query.
+        """
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        with self._lock:
+            if not self._rows or len(queries) == 0:
+                return [ChunkRecords(scores=[]) for _ in embeddings]
+            k = min(k, len(self._rows))
+            ids = self._ids  # Compaction replaces the list rather than changing it
+            if self.hnsw_threshold and len(self._rows) >= self.hnsw_threshold and self._load_graph():
+                labels, distances = self._graph.knn_query(queries, k=k)
+                rows, scores = labels.astype(np.int64), 1.0 - distances
+            else:
+                vectors = self._vectors[:self._size]
+                norms = self._norms[:self._size]
+                alive = self._alive[:self._size].copy()
+                rows = None
+
+        if rows is None:
+            # Outside the lock: the snapshot stays valid while others append or compact
+            rows, scores = self._exhaustive_search(queries, vectors, norms, alive, k)
+
+        hits = [
+            [(ids[row], score) for row, score in zip(query_rows, query_scores) if ids[row] is not None]
+            for query_rows, query_scores in zip(rows.tolist(), scores.tolist())
+        ]
+        found = self.get(list({chunk_id for query_hits in hits for chunk_id, _ in query_hits}))
+        by_id = {chunk_id: (text, metadata) for chunk_id, text, metadata in zip(found.ids, found.texts, found.metadatas)}
+        results = []
+        for query_hits in hits:
+            result = ChunkRecords(scores=[])
+            for chunk_id, score in query_hits:
+                if chunk_id in by_id:  # Not deleted since the search
+                    result.ids.append(chunk_id)
+                    result.texts.append(by_id[chunk_id][0])
+                    result.metadatas.append(by_id[chunk_id][1])
+                    result.scores.append(score)
+            results.append(result)
+        return results
+
+    def _exhaustive_search(
+        self, queries: np.ndarray, vectors: np.ndarray, norms: np.ndarray, alive: np.ndarray, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Get the rows and cosine similarities of the top-k live vectors for each query, best first."""
+        query_norms = np.linalg.norm(queries, axis=1)
+        all_rows, all_scores = [], []
+        for start in range(0, len(queries), self.QUERY_BLOCK_SIZE):
+            block = slice(start, start + self.QUERY_BLOCK_SIZE)
+            scores = queries[block] @ vectors.T
+            scores /= np.maximum(np.outer(query_norms[block], norms), 1e-12)
+            scores[:, ~alive] = -np.inf
+            if scores.shape[1] > k:
+                rows = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                rows = np.tile(np.arange(scores.shape[1]), (len(scores), 1))
+            top = np.take_along_axis(scores, rows, axis=1)
+            order = np.argsort(-top, axis=1, kind="stable")
+            all_rows.append(np.take_along_axis(rows, order, axis=1))
+            all_scores.append(np.take_along_axis(top, order, axis=1))
+        return np.concatenate(all_rows), np.concatenate(all_scores)
+
+    def compact(self) -> None:
+        """Rewrite the vector file without deleted rows, if enough of them piled up."""
+        with self._lock:
+            dead = self._size - len(self._rows)
+            if dead == 0 or dead < self.COMPACT_RATIO * self._size:
+                return
+            live = np.flatnonzero(self._alive[:self._size])
+            vectors = np.array(self._vectors[live])
+            ids = [self._ids[row] for row in live]
+
+            capacity = max(self.MIN_CAPACITY, len(ids))
+            generation = self._generation + 1
+            path = self._vectors_file(generation)
+            with open(path, "wb") as f:
+                f.write(vectors.tobytes())
+                f.truncate(capacity * self._dim * 4)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # Renumbering the rows and switching files commit together
+            with self._db:
+                self._db.executemany(
+                    "UPDATE chunks SET row = ? WHERE id = ?",
+                    [(row, chunk_id) for row, chunk_id in enumerate(ids)],
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO settings VALUES ('generation', ?)", (str(generation),)
+                )
+
+            previous_path = self._vectors_path
+            self._generation = generation
+            self._vectors_path = path
+            self._map(capacity)
+            os.remove(previous_path)  # Searches still reading the old mapping keep it until they finish
+            self._norms = np.zeros(capacity, dtype=np.float32)
+            self._norms[:len(ids)] = np.linalg.norm(vectors, axis=1)
+            self._alive = np.zeros(capacity, dtype=bool)
+            self._alive[:len(ids)] = True
+            self._ids = ids
+            self._rows = {chunk_id: row for row, chunk_id in enumerate(ids)}
+            self._size = len(ids)
+            self._graph = None  # Rows were renumbered
+            logger.info("Compacted %s: dropped %d deleted rows", self.directory, dead)
+
+    def close(self) -> None:
+        """Flush the vector file and close the side table."""
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            self._db.close()
+
+    def _tombstone(self, ids: List[str]) -> None:
+        """Mark the rows of deleted chunks dead; caller must hold the lock."""
+        for chunk_id in ids:
+            row = self._rows.pop(chunk_id)
+            self._alive[row] = False
+            self._ids[row] = None
+            if self._graph is not None:
+                self._graph.mark_deleted(row)
+
+    def _grow(self, size: int) -> None:
+        """Make room in the vector file for `size` rows; caller must hold the lock."""
+        if size <= self._capacity:
+            return
+        capacity = max(size, 2 * self._capacity, self.MIN_CAPACITY)
+        if self._vectors is not None:
+            self._vectors.flush()
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self._dim * 4)
+        self._map(capacity)
+        self._norms = np.resize(self._norms, capacity)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive
+        self._alive = alive
+
+    def _vectors_file(self, generation: int) -> str:
+        """Get the path of the vector file of a compaction generation."""
+        name = "vectors.f32" if generation == 0 else f"vectors.{generation}.f32"
+        return os.path.join(self.directory, name)
+
+    def _map(self, capacity: int) -> None:
+        """Memory-map the vector file with room for `capacity` rows."""
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self._dim))
+        self._capacity = capacity
+
+    def _load_graph(self) -> bool:
+        """Build the HNSW graph over the live rows if needed; False if hnswlib isn't installed."""
+        if self._graph is not None:
+            return True
+        try:
+            import hnswlib
+        except ImportError:
+            logger.warning(
+                "hnswlib is not installed, searching %s exhaustively; install the hnsw extra", self.directory
+            )
+            self.hnsw_threshold = 0
+            return False
+
+        live = np.flatnonzero(self._alive[:self._size])
+        graph = hnswlib.Index(space="cosine", dim=self._dim)
+        graph.init_index(max_elements=self._capacity)
+        graph.add_items(np.asarray(self._vectors[live]), live)
+        graph.set_ef(self.hnsw_ef_search)
+        self._graph = graph
+        logger.info("Built an HNSW graph of %d vectors for %s", len(live), self.directory)
+        return True
+
+    def _graph_add(self, rows: np.ndarray) -> None:
+        """Add new rows to the HNSW graph; caller must hold the lock."""
+        if self._capacity > self._graph.get_max_elements():
+            self._graph.resize_index(self._capacity)
+        self._graph.add_items(np.asarray(self._vectors[rows]), rows)
+
+    def _load(self) -> None:
+        """Read the row map from the side table and map the vector file."""
+        setting = self._db.execute("SELECT value FROM settings WHERE key = 'dim'").fetchone()
+        if setting is None:
+            return
+        self._dim = int(setting[0])
+        generation = self._db.execute("SELECT value FROM settings WHERE key = 'generation'").fetchone()
+        self._generation = int(generation[0]) if generation is not None else 0
+        self._vectors_path = self._vectors_file(self._generation)
+
+        # Remove vector files of a compaction that crashed before or after switching
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if re.fullmatch(r"vectors(\.\d+)?\.f32(\.tmp)?", name) and path != self._vectors_path:
+                os.remove(path)
+
+        rows = self._db.execute("SELECT id, row FROM chunks").fetchall()
+        if not os.path.exists(self._vectors_path):
+            if rows:
+                logger.error(
+                    "Vector file of %s is missing; dropping its %d chunks, whose documents must be re-uploaded",
+                    self.directory, len(rows),
+                )
+                with self._db:
+                    self._db.execute("DELETE FROM chunks")
+            return  # The file is created when chunks are added
+        self._size = max((row for _, row in rows), default=-1) + 1
+        capacity = max(os.path.getsize(self._vectors_path) // (self._dim * 4), self._size)
+        self._map(capacity)
+        self._ids = [None] * self._size
+        self._alive = np.zeros(capacity, dtype=bool)
+        for chunk_id, row in rows:
+            self._ids[row] = chunk_id
+            self._rows[chunk_id] = row
+            self._alive[row] = True
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        self._norms[:self._size] = np.linalg.norm(self._vectors[:self._size], axis=1)
+
+
+class NativeBackend(VectorBackend):
+    """Chunks in per-user memory-mapped vector files, searched in process."""
+
+    def __init__(self, directory: str, hnsw_threshold: int = 0, hnsw_ef_search: int = 64):
+        self.directory = directory
+        self.hnsw_threshold = hnsw_threshold
+        self.hnsw_ef_search = hnsw_ef_search
+        self._collections: dict[int, NativeCollection] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def collection(self, user_id: int) -> NativeCollection:
+        """Get a user's collection, opening it on first use."""
+        collection = self._collections.get(user_id)
+        if collection is None:
+            with self._lock:
+                collection = self._collections.get(user_id)
+                if collection is None:
+                    collection = NativeCollection(
+                        os.path.join(self.directory, f"user_{user_id}"),
+                        self.hnsw_threshold,
+                        self.hnsw_ef_search,
+                    )
+                    self._collections[user_id] = collection
+        return collection
+
+    def add(self, user_id, ids, embeddings, texts, metadatas):
+        """Store chunks with their vectors."""
+        self.collection(user_id).add(ids, embeddings, texts, metadatas)
+
+    def get(self, user_id, ids):
+        """Get chunks by id."""
+        return self.collection(user_id).get(ids)
+
+    def get_document(self, user_id, document_id, include_embeddings=False):
+        """Get every chunk of a document."""
+        return self.collection(user_id).get_document(document_id, include_embeddings)
+
+    def scan(self, user_id, batch_size=1000):
+        """Iterate over all of a user's chunks in batches."""
+        return self.collection(user_id).scan(batch_size)
+
+    def update_metadata(self, user_id, ids, metadatas):
+        """Replace the metadata of chunks."""
+        self.collection(user_id).update_metadata(ids, metadatas)
+
+    def delete(self, user_id, ids):
+        """Delete chunks by id."""
+        self.collection(user_id).delete(ids)
+
+    def delete_document(self, user_id, document_id):
+        """Delete every chunk of a document."""
+        self.collection(user_id).delete_document(document_id)
+
+    def query(self, user_id, embedding, k):
+        """Get the k chunks with the highest cosine similarity to a vector."""
+        return self.collection(user_id).query(embedding, k)
+
+    def query_many(self, user_id, embeddings, k):
+        """Get the k chunks with the highest cosine similarity to each of several vectors."""
+        return self.collection(user_id).query_many(embeddings, k)
+
+    def count(self, user_id):
+        """Get the number of a user's chunks."""
+        return len(self.collection(user_id))
+
+    def user_ids(self):
+        """Get the ids of the users that have a collection directory."""
+        return [
+            int(match.group(1))
+            for name in os.listdir(self.directory)
+            if (match := re.fullmatch(r"user_(\d+)", name))
+        ]
+
+    def drop(self, user_id):
+        """Delete a user's collection directory."""
+        with self._lock:
+            collection = self._collections.pop(user_id, None)
+            if collection is not None:
+                collection.close()
+            shutil.rmtree(os.path.join(self.directory, f"user_{user_id}"), ignore_errors=True)
+
+    def compact(self):
+        """Compact every open collection with enough deleted rows."""
+        for collection in list(self._collections.values()):
+            collection.compact()
+
+    def close(self):
+        """Flush and close every open collection."""
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
+
+
+def create_vector_backend(
+    backend: str,
+    chroma_directory: str,
+    collection_prefix: str,
+    native_directory: str,
+    hnsw_threshold: int = 0,
+    hnsw_ef_search: int = 64,
+) -> VectorBackend:
+    """Create the configured vector index backend."""
+    if backend == "chroma":
+        return ChromaBackend(chroma_directory, collection_prefix)
+    if backend == "native":
+        return NativeBackend(native_directory, hnsw_threshold, hnsw_ef_search)
+    raise ValueError(f"Unknown vector backend {backend!r}; use one of {', '.join(VECTOR_BACKENDS)}")
@@ -1,84 +1,430 @@
-"""Vector store service using ChromaDB."""
+"""
+Vector store service over a pluggable vector index backend.
+
+chromadb and the LangChain integrations are imported where they are first
+used rather than at module level, so importing the app stays fast and the
+server binds its port before they load.
+"""
+import hashlib
+import logging
 import os
+import threading
+import uuid
 from typing import List
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
 
 from src.config import get_settings
+from src.services.embedding_backends import load_embedding_model
+from src.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+from src.services.embedding_server import RemoteEmbeddings
+from src.services.embedding_service import BatchingEmbeddings
+from src.services.lexical_index import LexicalIndex
+from src.services.metrics import get_metrics
+from src.services.vector_backends import ChunkRecords, VectorBackend, create_vector_backend
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TEXT = "def warm_up(): return 'ready'"  # Embedded once at startup, bypassing the cache
 
 
 class VectorStoreService:
-    """Manage vector store operations with ChromaDB."""
+    """
+    Manage vector store operations over the configured backend.
+    
+    Chunks live in the `vector_backend` chosen in settings: ChromaDB, or the
+    native memory-mapped index. Each user has their own collection, so a
+    search only walks that user's vectors and its cost scales with their
+    corpus rather than everyone's.
+    """
     
     def __init__(self):
         self.settings = get_settings()
         self._embeddings = None
-        self._vector_store = None
-        
-        # Ensure persistence directory exists
-        os.makedirs(self.settings.chroma_persist_directory, exist_ok=True)
+        self._batcher: BatchingEmbeddings | None = None
+        self._embedding_cache: EmbeddingCache | None = None
+        self._lexical_indexes: dict[int, LexicalIndex] = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # Guards loading the model
+        self.backend: VectorBackend = create_vector_backend(
+            self.settings.vector_backend,
+            chroma_directory=self.settings.chroma_persist_directory,
+            collection_prefix=self.settings.collection_name,
+            native_directory=self.settings.native_vector_directory,
+            hnsw_threshold=self.settings.native_hnsw_threshold,
+            hnsw_ef_search=self.settings.native_hnsw_ef_search,
+        )
     
     @property
-    def embeddings(self):
-        """Lazy load embeddings model."""
+    def embeddings(self) -> Embeddings:
+        """Lazy load embeddings model behind the cache and micro-batching layers."""
         if self._embeddings is None:
-            print(f"Loading embedding model: {self.settings.embedding_model}")
-            self._embeddings = HuggingFaceEmbeddings(
-                model_name=self.settings.embedding_model,
-                model_kwargs={"device": "cpu"},
-                encode_kwargs={"normalize_embeddings": True},
-            )
+            with self._load_lock:
+                if self._embeddings is None:
+                    model = self._load_embedding_model()
+                    self._batcher = BatchingEmbeddings(
+                        model,
+                        max_batch_size=self.settings.embedding_max_batch_size,
+                        max_wait_ms=self.settings.embedding_max_wait_ms,
+                    )
+                    if self.settings.embedding_cache_enabled:
+                        self._embedding_cache = EmbeddingCache(
+                            directory=self.settings.embedding_cache_directory,
+                            model_name=self._embedding_cache_key(),
+                            max_bytes=self.settings.embedding_cache_max_bytes,
+                        )
+                        self._embeddings = CachedEmbeddings(self._batcher, self._embedding_cache)
+                    else:
+                        self._embeddings = self._batcher
         return self._embeddings
     
-    @property
-    def vector_store(self) -> Chroma:
-        """Lazy load vector store."""
-        if self._vector_store is None:
-            self._vector_store = Chroma(
-                collection_name=self.settings.collection_name,
-                embedding_function=self.embeddings,
-                persist_directory=self.settings.chroma_persist_directory,
+    def _load_embedding_model(self) -> Embeddings:
+        """Load the embedding model itself, with the configured backend, or connect to the embedding server."""
+        if self.settings.embedding_server_socket:
+            logger.info("Embedding through the server at %s", self.settings.embedding_server_socket)
+            return RemoteEmbeddings(
+                self.settings.embedding_server_socket,
+                max_rows=self.settings.embedding_max_batch_size,
+                connect_timeout=self.settings.embedding_server_connect_timeout,
             )
-        return self._vector_store
+        
+        logger.info(
+            "Loading embedding model: %s (%s backend)",
+            self.settings.embedding_model, self.settings.embedding_backend,
+        )
+        return load_embedding_model(
+            self.settings.embedding_model,
+            backend=self.settings.embedding_backend,
+            threads=self.settings.embedding_threads,
+            onnx_file=self.settings.embedding_onnx_file,
+            onnx_directory=self.settings.onnx_model_directory,
+        )
+    
+    def _embedding_cache_key(self) -> str:
+        """Name cached vectors by model and backend, since backends' vectors differ slightly."""
+        if self.settings.embedding_backend == "torch":
+            return self.settings.embedding_model
+        return f"{self.settings.embedding_model}@{self.settings.embedding_backend}"
+    
+    def embedding_stats(self) -> dict | None:
+        """Get micro-batching statistics, or None if the model is not loaded yet."""
+        if self._batcher is None:
+            return None
+        return self._batcher.stats()
+    
+    def embedding_cache_stats(self) -> dict | None:
+        """Get embedding cache statistics, or None if the cache is not open."""
+        if self._embedding_cache is None:
+            return None
+        return self._embedding_cache.stats()
+    
+    def warm_up(self) -> None:
+        """Load the embedding model and run one inference through it."""
+        self.embeddings
+        # Straight to the model: a cache hit would leave the first real batch cold
+        self._batcher.embed_documents([WARMUP_TEXT])
     
-    def add_documents(self, documents: List[Document]) -> List[str]:
-        """Add documents to vector store."""
-        print(f"Adding {len(documents)} documents to vector store")
-        ids = self.vector_store.add_documents(documents)
+    def close(self):
+        """Flush the embedding cache, lexical indexes and vector backend and stop the batching thread."""
+        self.flush_lexical_indexes()
+        self.backend.close()
+        if self._embedding_cache is not None:
+            self._embedding_cache.flush()
+        if self._batcher is not None:
+            self._batcher.close()
+    
+    def user_ids(self) -> List[int]:
+        """Get the ids of the users that have a collection."""
+        return self.backend.user_ids()
+    
+    def lexical_index(self, user_id: int) -> LexicalIndex:
+        """
+        Get the BM25 index over a user's chunks.
+        
+        When the index doesn't hold as many chunks as the collection (the user was
+        indexed before the lexical index existed, or its files were lost), it is
+        reconciled with the collection on load.
+        """
+        index = self._lexical_indexes.get(user_id)
+        if index is None:
+            with self._lock:
+                index = self._lexical_indexes.get(user_id)
+                if index is None:
+                    index = LexicalIndex(os.path.join(
+                        self.settings.lexical_index_directory, f"user_{user_id}.npz"
+                    ))
+                    if len(index) != self.backend.count(user_id):
+                        self._reconcile_lexical_index(index, user_id)
+                    self._lexical_indexes[user_id] = index
+        return index
+    
+    def _reconcile_lexical_index(self, index: LexicalIndex, user_id: int, batch_size: int = 1000):
+        """Index the chunks of a user's collection the index lacks and drop those the collection lost."""
+        stored = set()
+        for batch in self.backend.scan(user_id, batch_size):
+            index.add(
+                batch.ids,
+                batch.texts,
+                [metadata.get("document_id", "") for metadata in batch.metadatas],
+            )
+            stored.update(batch.ids)
+        index.delete_chunks(index.chunk_ids() - stored)
+        index.flush()
+        logger.info("Reconciled the lexical index of user %d with %d chunks", user_id, len(stored))
+    
+    def add_documents(self, documents: List[Document], user_id: int) -> List[str]:
+        """Add a user's documents to their vector store, tagging each chunk with its owner."""
+        if not documents:
+            return []
+        metrics = get_metrics()
+        texts = [document.page_content for document in documents]
+        for document in documents:
+            document.metadata["user_id"] = user_id
+        
+        with metrics.span("embed"):
+            embeddings = self.embeddings.embed_documents(texts)
+        
+        # Load the lexical index first so reconciling it can't pick up these chunks too
+        lexical_index = self.lexical_index(user_id)
+        ids = [str(uuid.uuid4()) for _ in documents]
+        with metrics.span("vector_add"):
+            self.backend.add(user_id, ids, embeddings, texts, [document.metadata for document in documents])
+            lexical_index.add(
+                ids,
+                texts,
+                [document.metadata.get("document_id", "") for document in documents],
+            )
+        metrics.chunks_indexed.inc(len(ids), source="embedded")
+        logger.debug("Added %d chunks to the collection of user %d", len(ids), user_id)
         return ids
     
-    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
-        """Search for similar documents."""
-        print(f"Searching for: {query} (k={k})")
-        results = self.vector_store.similarity_search(query, k=k)
+    def copy_document(
+        self,
+        source_user_id: int,
+        source_document_id: str,
+        user_id: int,
+        document_id: str,
+        metadata: dict | None = None,
+    ) -> int:
+        """
+        Copy a document's chunks and their embeddings into another user's store.
+        
+        Used when a user uploads bytes another user already indexed, so the
+        chunks are reused without chunking or embedding them again. `metadata`
+        overrides fields such as the filename on every copied chunk.
+        Returns the number of chunks copied.
+        """
+        source = self.backend.get_document(source_user_id, source_document_id, include_embeddings=True)
+        if not source.ids:
+            return 0
+        
+        metadatas = [
+            {**chunk_metadata, **(metadata or {}), "document_id": document_id, "user_id": user_id}
+            for chunk_metadata in source.metadatas
+        ]
+        ids = [str(uuid.uuid4()) for _ in source.ids]
+        lexical_index = self.lexical_index(user_id)
+        with get_metrics().span("vector_add"):
+            self.backend.add(user_id, ids, source.embeddings, source.texts, metadatas)
+            lexical_index.add(ids, source.texts, [document_id] * len(ids))
+        get_metrics().chunks_indexed.inc(len(ids), source="copied")
+        return len(ids)
+    
+    def replace_document(
+        self,
+        user_id: int,
+        old_document_id: str,
+        document_id: str,
+        documents: List[Document],
+        move: bool,
+    ) -> dict:
+        """
+        Store a new version of a document, embedding only the chunks that changed.
+        
+        Chunks are matched with the old version's by a hash of their text, so
+        unchanged chunks keep their stored embeddings. With `move` the old
+        version is no longer needed: unchanged chunks are retagged in place and
+        chunks that disappeared are deleted. Otherwise the embeddings of
+        unchanged chunks are copied. Returns how many chunks were kept, embedded
+        and removed.
+        """
+        lexical_index = self.lexical_index(user_id)
+        old = self.backend.get_document(user_id, old_document_id, include_embeddings=not move)
+        
+        old_rows: dict[str, list[int]] = {}
+        for row, text in enumerate(old.texts):
+            old_rows.setdefault(_chunk_hash(text), []).append(row)
+        
+        kept_rows, kept, changed = [], [], []
+        for document in documents:
+            document.metadata["user_id"] = user_id
+            rows = old_rows.get(_chunk_hash(document.page_content))
+            if rows:
+                kept_rows.append(rows.pop())
+                kept.append(document)
+            else:
+                changed.append(document)
+        
+        if kept:
+            texts = [document.page_content for document in kept]
+            metadatas = [document.metadata for document in kept]
+            if move:
+                ids = [old.ids[row] for row in kept_rows]
+                self.backend.update_metadata(user_id, ids, metadatas)
+                lexical_index.delete_chunks(ids)
+            else:
+                ids = [str(uuid.uuid4()) for _ in kept]
+                self.backend.add(user_id, ids, [old.embeddings[row] for row in kept_rows], texts, metadatas)
+                get_metrics().chunks_indexed.inc(len(ids), source="copied")
+            lexical_index.add(ids, texts, [document_id] * len(ids))
+        
+        batch_size = self.settings.ingestion_batch_size
+        for start in range(0, len(changed), batch_size):
+            self.add_documents(changed[start:start + batch_size], user_id)
+        
+        removed = 0
+        if move:
+            kept_set = set(kept_rows)
+            stale = [chunk_id for row, chunk_id in enumerate(old.ids) if row not in kept_set]
+            if stale:
+                self.backend.delete(user_id, stale)
+                lexical_index.delete_chunks(stale)
+            removed = len(stale)
+        
+        return {"kept": len(kept), "embedded": len(changed), "removed": removed}
+    
+    def delete_orphans(self, user_id: int, document_ids: set[str], batch_size: int = 1000) -> int:
+        """
+        Delete a user's chunks whose document_id is not in `document_ids`.
+        
+        Returns the number of chunks deleted.
+        """
+        total = self.backend.count(user_id)
+        orphans = set()
+        for batch in self.backend.scan(user_id, batch_size):
+            for metadata in batch.metadatas:
+                document_id = metadata.get("document_id", "")
+                if document_id not in document_ids:
+                    orphans.add(document_id)
+        
+        for document_id in orphans:
+            self.delete_document(document_id, user_id)
+        return total - self.backend.count(user_id)
+    
+    def flush_lexical_indexes(self) -> None:
+        """Persist the lexical indexes, compacting away deleted chunks."""
+        for index in list(self._lexical_indexes.values()):
+            index.flush()
+    
+    def compact(self) -> None:
+        """Compact the lexical indexes and reclaim the space of deleted vectors."""
+        self.flush_lexical_indexes()
+        self.backend.compact()
+    
+    def delete_document(self, document_id: str, user_id: int):
+        """Delete all chunks belonging to a user's document."""
+        self.backend.delete_document(user_id, document_id)
+        self.lexical_index(user_id).delete_document(document_id)
+    
+    def similarity_search(self, query: str, user_id: int, k: int = 4) -> List[Document]:
+        """Search a user's documents for chunks similar to the query."""
+        return self.similarity_search_by_vector(self.embed_query(query), user_id, k=k)
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query with the same model used for documents."""
+        with get_metrics().span("embed_query"):
+            return self.embeddings.embed_query(query)
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed several queries together, in as few model forward passes as the batch size allows."""
+        with get_metrics().span("embed_query"):
+            return self.embeddings.embed_documents(queries)
+    
+    def similarity_search_by_vector(
+        self, embedding: List[float], user_id: int, k: int = 4
+    ) -> List[Document]:
+        """
+        Search a user's documents for chunks similar to an already embedded query.
+        
+        Each chunk's metadata gets its cosine similarity to the query as `score`.
+        """
+        return self.similarity_search_by_vectors([embedding], user_id, k=k)[0]
+    
+    def similarity_search_by_vectors(
+        self, embeddings: List[List[float]], user_id: int, k: int = 4
+    ) -> List[List[Document]]:
+        """Search a user's documents for the chunks similar to each of several embedded queries at once."""
+        results = []
+        for records in self.backend.query_many(user_id, embeddings, k):
+            docs = self._to_documents(records)
+            for doc, score in zip(docs, records.scores):
+                doc.metadata["score"] = round(score, 6)
+            results.append(docs)
         return results
     
-    def get_retriever(self, k: int = 4):
-        """Get a retriever for RAG."""
-        return self.vector_store.as_retriever(
-            search_kwargs={"k": k}
-        )
+    def lexical_search(self, query: str, user_id: int, k: int = 4) -> List[Document]:
+        """Search a user's documents with BM25, without touching the embedding model; `score` is the BM25 score."""
+        hits = dict(self.lexical_index(user_id).search(query, k))
+        docs = self.get_documents(list(hits), user_id)
+        for doc in docs:
+            doc.metadata["score"] = round(hits[doc.id], 6)
+        return docs
+    
+    def get_documents(self, ids: List[str], user_id: int) -> List[Document]:
+        """Get a user's chunks by id, in the order given."""
+        if not ids:
+            return []
+        docs = {doc.id: doc for doc in self._to_documents(self.backend.get(user_id, ids))}
+        return [docs[chunk_id] for chunk_id in ids if chunk_id in docs]
+    
+    def _to_documents(self, records: ChunkRecords) -> List[Document]:
+        """Build LangChain documents carrying their vector store ids."""
+        return [
+            Document(id=chunk_id, page_content=text, metadata=metadata or {})
+            for chunk_id, text, metadata in zip(records.ids, records.texts, records.metadatas)
+        ]
     
-    def delete_collection(self):
-        """Delete the entire collection."""
+    def get_retriever(self, user_id: int, k: int = 4) -> BaseRetriever:
+        """Get a retriever over a user's documents for RAG."""
+        return _UserRetriever(service=self, user_id=user_id, k=k)
+    
+    def delete_collection(self, user_id: int):
+        """Delete a user's entire collection."""
         try:
-            self.vector_store.delete_collection()
-            self._vector_store = None
-            print("Collection deleted successfully")
+            self.backend.drop(user_id)
+            logger.info("Deleted the collection of user %d", user_id)
         except Exception as e:
-            print(f"Error deleting collection: {e}")
+            logger.error("Error deleting the collection of user %d: %s", user_id, e)
     
-    def get_collection_count(self) -> int:
-        """Get the number of documents in the collection."""
+    def get_collection_count(self, user_id: int) -> int:
+        """Get the number of chunks in a user's collection."""
         try:
-            return self.vector_store._collection.count()
+            return self.backend.count(user_id)
         except Exception:
             return 0
 
 
+class _UserRetriever(BaseRetriever):
+    """LangChain retriever over one user's chunks."""
+    
+    service: VectorStoreService
+    user_id: int
+    k: int = 4
+    
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        """Get the k chunks most similar to the query."""
+        return self.service.similarity_search(query, self.user_id, k=self.k)
+
+
+def _chunk_hash(text: str) -> str:
+    """Get the hash chunks are matched by when re-indexing."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
 # Global instance
 _vector_store_service = None
 
@@ -0,0 +1,115 @@
+"""Background warm-up of the components the first requests would otherwise wait for."""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from src.config import get_settings
+from src.services.registry import get_component_registry
+from src.services.vector_store import get_vector_store_service
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupService:
+    """
+    Load the embedding model, open Chroma and run a warm-up inference after startup.
+
+    Warm-up runs in a background thread so the server accepts connections at
+    once; `/ready` reports ready only after it finished, so a load balancer or
+    orchestrator routes traffic in once the first query no longer pays for
+    model loading. With warm-up disabled the service is ready immediately and
+    components load lazily on first use.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._task: asyncio.Task | None = None
+        self._state = "pending"
+        self._error: str | None = None
+        self._started_at: datetime | None = None
+        self._duration_ms: float | None = None
+        self._steps_ms: dict[str, float] = {}
+
+    async def start(self):
+        """Start warming up in the background."""
+        if self._task is not None:
+            return
+        if not self.settings.warmup_enabled:
+            self._state = "ready"
+            return
+
+        self._state = "warming"
+        self._started_at = datetime.now(timezone.utc)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop waiting for warm-up; a step already running finishes in its thread."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def is_ready(self) -> bool:
+        """Check whether warm-up finished successfully."""
+        return self._state == "ready"
+
+    def status(self) -> dict:
+        """Get the warm-up state and how long each step took."""
+        return {
+            "ready": self.is_ready(),
+            "state": self._state,
+            "started_at": self._started_at,
+            "duration_ms": self._duration_ms,
+            "steps_ms": dict(self._steps_ms),
+            "error": self._error,
+        }
+
+    async def _run(self):
+        """Run the warm-up steps in order, recording the time of each."""
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._warm_up)
+        except Exception as e:
+            logger.exception("Warm-up failed")
+            self._error = str(e)
+            self._state = "failed"
+        else:
+            self._state = "ready"
+            logger.info("Warm-up finished in %.0f ms", (time.perf_counter() - started) * 1000)
+        finally:
+            self._duration_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    def _warm_up(self):
+        """Load each component, in a worker thread."""
+        vector_store_service = get_vector_store_service()
+        registry = get_component_registry()
+
+        self._step("vector_store", vector_store_service.backend.open)
+        self._step("embedding_model", vector_store_service.warm_up)
+        self._step("document_processor", lambda: registry.document_processor.get_text_splitter(".py"))
+        if self.settings.google_api_key:
+            self._step("llm_client", lambda: registry.llm)
+            self._step("tokenizer", lambda: registry.context_builder.encoding)
+
+    def _step(self, name: str, load):
+        """Run one warm-up step and record its duration."""
+        started = time.perf_counter()
+        load()
+        self._steps_ms[name] = round((time.perf_counter() - started) * 1000, 2)
+
+
+# Global instance
+_warmup_service = None
+
+
+def get_warmup_service() -> WarmupService:
+    """Get singleton instance of warm-up service."""
+    global _warmup_service
+    if _warmup_service is None:
+        _warmup_service = WarmupService()
+    return _warmup_service
@@ -251,15 +251,23 @@ async function handleFileUpload(file) {
         }
 
         const data = await response.json();
-        uploadStatus.className = 'upload-status success';
-        uploadStatus.innerHTML = `
-            ✅ <strong>${data.filename}</strong> uploaded successfully!<br>
-            Created ${data.chunks_created} chunks for processing.
-        `;
+        uploadStatus.innerHTML = `⏳ <strong>${data.filename}</strong> uploaded, processing...`;
 
         // Clear file input
         document.getElementById('file-input').value = '';
 
+        // Wait for background chunking and embedding to finish
+        const result = await waitForIndexing(data.document_id);
+        if (result.status === 'failed') {
+            throw new Error(result.error || 'Processing failed');
+        }
+
+        uploadStatus.className = 'upload-status success';
+        uploadStatus.innerHTML = `
+            ✅ <strong>${result.filename}</strong> uploaded successfully!<br>
+            Created ${result.chunks_created} chunks for processing.
+        `;
+
         // Reload documents list
         loadDocuments();
     } catch (error) {
@@ -268,6 +276,27 @@ async function handleFileUpload(file) {
     }
 }
 
+async function waitForIndexing(documentId) {
+    while (true) {
+        const response = await fetch(`${API_BASE}/upload/${documentId}/status`, {
+            headers: {
+                'Authorization': `Bearer ${authToken}`
+            }
+        });
+
+        if (!response.ok) {
+            throw new Error('Failed to fetch upload status');
+        }
+
+        const data = await response.json();
+        if (data.status === 'indexed' || data.status === 'failed') {
+            return data;
+        }
+
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
 // Query functions
 async function handleQuery(e) {
     e.preventDefault();
@@ -295,7 +324,7 @@ async function handleQuery(e) {
     addMessage('assistant', '⏳ Thinking...', loadingId);
 
     try {
-        const response = await fetch(`${API_BASE}/query`, {
+        const response = await fetch(`${API_BASE}/query/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -309,13 +338,27 @@ async function handleQuery(e) {
             throw new Error(error.detail || 'Query failed');
         }
 
-        const data = await response.json();
+        let sources = [];
+        let answer = '';
+        const loadingContent = document.querySelector(`#${loadingId} .message-content`);
+
+        await readEventStream(response, (event, data) => {
+            if (event === 'sources') {
+                sources = data;
+            } else if (event === 'token') {
+                // Show the answer as it is generated
+                answer += data.text;
+                loadingContent.textContent = answer;
+            } else if (event === 'error') {
+                throw new Error(data.detail);
+            }
+        });
 
         // Remove loading message
         document.getElementById(loadingId)?.remove();
 
         // Add assistant response
-        addMessage('assistant', data.answer, null, data.sources);
+        addMessage('assistant', answer, null, sources);
     } catch (error) {
         // Remove loading message
         document.getElementById(loadingId)?.remove();
@@ -325,6 +368,31 @@ async function handleQuery(e) {
     }
 }
 
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const messages = buffer.split('\n\n');
+        buffer = messages.pop();
+
+        for (const message of messages) {
+            let event = 'message';
+            let data = '';
+            for (const line of message.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
 function addMessage(role, content, id = null, sources = null) {
     const chatContainer = document.getElementById('chat-container');
 
@@ -368,9 +436,14 @@ function escapeHtml(text) {
 }
 
 // Document history functions
-async function loadDocuments() {
+let documentsCursor = null;
+
+async function loadDocuments(more = false) {
     try {
-        const response = await fetch(`${API_BASE}/history/documents`, {
+        const url = more
+            ? `${API_BASE}/history/documents?paginated=true&cursor=${encodeURIComponent(documentsCursor)}`
+            : `${API_BASE}/history/documents?paginated=true`;
+        const response = await fetch(url, {
             headers: {
                 'Authorization': `Bearer ${authToken}`
             }
@@ -380,22 +453,23 @@ async function loadDocuments() {
             throw new Error('Failed to load documents');
         }
 
-        const documents = await response.json();
-        displayDocuments(documents);
+        const page = await response.json();
+        documentsCursor = page.next_cursor;
+        displayDocuments(page.items, more);
     } catch (error) {
         console.error('Error loading documents:', error);
     }
 }
 
-function displayDocuments(documents) {
+function displayDocuments(documents, append = false) {
     const documentsList = document.getElementById('documents-list');
 
-    if (documents.length === 0) {
+    if (!append && documents.length === 0) {
         documentsList.innerHTML = '<div class="empty-state">No documents uploaded yet</div>';
         return;
     }
 
-    documentsList.innerHTML = documents.map(doc => {
+    const items = documents.map(doc => {
         const date = new Date(doc.uploaded_at).toLocaleDateString();
         const size = doc.file_size ? `${(doc.file_size / 1024).toFixed(1)} KB` : 'N/A';
 
@@ -406,4 +480,19 @@ function displayDocuments(documents) {
             </div>
         `;
     }).join('');
+
+    documentsList.querySelector('.load-more')?.remove();
+    if (append) {
+        documentsList.insertAdjacentHTML('beforeend', items);
+    } else {
+        documentsList.innerHTML = items;
+    }
+
+    if (documentsCursor) {
+        const button = document.createElement('button');
+        button.className = 'btn btn-secondary load-more';
+        button.textContent = 'Load more';
+        button.addEventListener('click', () => loadDocuments(true));
+        documentsList.appendChild(button);
+    }
 }